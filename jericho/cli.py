@@ -1,4 +1,5 @@
 import os
+import asyncio
 import typing
 import json
 import logging
@@ -9,6 +10,8 @@ from aiohttp import ClientSession
 from jericho.models import JerichoEndpoints
 from jericho.repositories.endpoints_lookup import EndpointsLookup
 from jericho.repositories.result_lookup import ResultLookup
+from jericho.plugin.request_tracer import summarize_traces
+from jericho.plugin.bench import VirtualHostFarm, Bench
 from jericho.version import version
 
 
@@ -93,3 +96,35 @@ async def pull_dns_servers() -> typing.Optional[list]:
             list_bytes = await response.read()
             list_str = list_bytes.decode("utf-8", "ignore")
             return [server for server in list_str.split("\n") if not server == ""]
+
+
+def trace_summary(filepath: str) -> None:
+    """This prints out where the time of the traced requests in a workload went"""
+    if not os.path.exists(filepath):
+        print(f"There are no traces in {filepath}")
+        return
+
+    summary = summarize_traces(filepath)
+    print(f"{summary['traces']} traced requests")
+
+    print("\nphase\tp50 ms\tp99 ms\tmax ms\ttotal ms")
+    for phase, stats in summary["phases"].items():
+        print(f"{phase}\t{stats['p50']}\t{stats['p99']}\t{stats['max']}\t{round(stats['total'], 1)}")
+
+    print("\nhost\trequests\taverage ms\tslowest phase")
+    for host in summary["worst_hosts"]:
+        print(f"{host['host']}\t{host['requests']}\t{round(host['average'], 1)}\t{host['slowest_phase']}")
+
+    if summary["errors"]:
+        print("\nerror\trequests")
+        for error, requests in summary["errors"].items():
+            print(f"{error}\t{requests}")
+
+
+def bench(settings: dict, hosts: int, endpoints: int, latency: float) -> None:
+    """This prints out how fast the scan engine is against local virtual hosts"""
+    farm = VirtualHostFarm(hosts=hosts, latency=latency)
+    report = asyncio.run(Bench(farm, settings, endpoints=endpoints).run())
+
+    for name, value in report.items():
+        print(f"{name}\t{value}")
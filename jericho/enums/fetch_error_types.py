@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class FetchErrorType(Enum):
+    DNS = "dns"
+    CONNECT = "connect"
+    TLS = "tls"
+    TIMEOUT = "timeout"
+    OVERSIZE = "oversize"
+    OTHER = "other"
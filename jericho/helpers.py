@@ -1,3 +1,4 @@
+import ipaddress
 import logging
 import typing
 import yaml
@@ -5,6 +6,8 @@ import math
 import os
 import pwd
 from urllib.parse import urlparse
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 
 
 def load_yaml_file(path: str) -> dict:
@@ -45,6 +48,23 @@ def add_missing_schemes_to_domain(domain: str) -> str:
     return domain
 
 
+def get_hostname(url: str) -> typing.Optional[str]:
+    """Get the host of a url or a domain, None when it can't be parsed"""
+    try:
+        return urlparse(add_missing_schemes_to_domain(url)).hostname
+    except ValueError:
+        return None
+
+
+def is_ip_address(host: str) -> bool:
+    """Check if a host is an ip address, those don't need a lookup"""
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
 def get_domain_from_endpoint(url: str) -> str:
     """Get the domain from a url"""
     url_parts = url.split("/")
@@ -60,23 +80,25 @@ def chunks(lst: list, size: int) -> typing.Iterable:
             yield lst[i : i + size]
 
 
-def merge_domains_with_endpoints(endpoints: list, domains: list) -> typing.Iterable:
-    responses = []
-    """Take a list of domains and endpoints and convert it to one iterable"""
+def merge_domains_with_endpoints(endpoints: list, domains: list) -> typing.Iterator[dict]:
+    """
+    Lazily pair every domain with every endpoint. Items are produced on demand so memory
+    stays flat no matter how many domains there are. We iterate endpoint first so one
+    web server isn't hit with all of its endpoints at once, unless there are fewer domains than endpoints.
+    Every item has the index of its domain so per domain state can be kept in a flat array
+    """
     if len(endpoints) > len(domains):
-        for domain in domains:
-            for endpoint in endpoints:
-                responses.append(
-                    {'endpoint': f'{domain}{endpoint.get("endpoint")}', 'pattern': endpoint.get("pattern"), 'raw_endpoint': endpoint.get("endpoint")}
-                )
+        pairs = ((index, domain, endpoint) for index, domain in enumerate(domains) for endpoint in endpoints)
     else:
-        for endpoint in endpoints:
-            for domain in domains:
-                responses.append(
-                    {'endpoint': f'{domain}{endpoint.get("endpoint")}', 'pattern': endpoint.get("pattern"), "raw_endpoint": endpoint.get("endpoint")}
-                )
+        pairs = ((index, domain, endpoint) for endpoint in endpoints for index, domain in enumerate(domains))
 
-    return responses
+    for domain_index, domain, endpoint in pairs:
+        yield {
+            'endpoint': f'{domain}{endpoint.get("endpoint")}',
+            'pattern': endpoint.get("pattern"),
+            'raw_endpoint': endpoint.get("endpoint"),
+            'domain_index': domain_index,
+        }
 
 
 def split_array_by(
@@ -111,4 +133,44 @@ def permutate_url_paths(rows):
         permutated_result = url_analyzed.scheme + "://" + url_analyzed.netloc + "/".join(paths) + permutated_result
         result_domains.append(permutated_result)
 
-    return result_domains
\ No newline at end of file
+    return result_domains
+
+
+def get_sqlite_path(database_url: str) -> typing.Optional[str]:
+    """Get the file of a sqlite:/// database url, None when it is another kind of database or in memory"""
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+
+    return url.database
+
+
+def get_sqlite_pragmas(settings: dict) -> typing.List[str]:
+    """
+    The PRAGMAs every connection to the sqlite database runs. WAL lets the readers and the writers of a scan work
+    at the same time and synchronous=NORMAL only syncs at checkpoints, busy_timeout is first so the others wait
+    for a lock instead of failing
+    """
+    return [
+        f"PRAGMA busy_timeout={int(settings.get('sqlite_busy_timeout', 5000))}",
+        f"PRAGMA journal_mode={settings.get('sqlite_journal_mode', 'wal')}",
+        f"PRAGMA synchronous={settings.get('sqlite_synchronous', 'normal')}",
+        f"PRAGMA mmap_size={int(settings.get('sqlite_mmap_size', 268435456))}",
+        f"PRAGMA cache_size={int(settings.get('sqlite_cache_size', -65536))}",
+    ]
+
+
+def create_database_engine(database_url: str, sqlite_pragmas: typing.List[str]) -> Engine:
+    """Create an engine whose connections run the sqlite PRAGMAs, other databases are left as they are"""
+    engine = create_engine(database_url)
+    if make_url(database_url).get_backend_name() != "sqlite":
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
@@ -28,19 +28,24 @@ from pathlib import Path
 from os import path
 import os
 import argparse
-import sqlalchemy
 import uuid
 import asyncio
 import json
-import aiosqlite
+import aiohttp
 import uvloop
 import base64
 import shutil
 import sys
 from urllib.parse import urlparse
 from threading import Thread
+from multiprocessing import Process
 from sqlalchemy.orm import sessionmaker
 from jericho.plugin.async_engine import AsyncEngine
+from jericho.plugin.pipeline import Pipeline
+from jericho.plugin.database_writer import DatabaseWriter
+from jericho.plugin.metrics import Metrics
+from jericho.plugin.request_tracer import RequestTracer
+from jericho.plugin.rate_limiter import RateLimiter, SharedTokenBucket, TokenBucket
 from jericho.plugin.investigate import Investigate
 from jericho.plugin.diff import Diff
 from jericho.plugin.output_verifier import OutputVerifier
@@ -57,9 +62,8 @@ from jericho.repositories.endpoints_lookup import EndpointsLookup
 from jericho.repositories.html_lookup import HtmlLookup
 from jericho.repositories.dns_server_lookup import DnsServerLookup
 from jericho.repositories.workload_lookup import WorkloadLookup
-from jericho.repositories.dns_cache_lookup import DnsCacheLookup
 
-from jericho.models import Base
+from jericho.models import Base, add_missing_columns
 
 from jericho.enums.cluster_roles import ClusterRole
 from jericho.enums.http_codes import HttpStatusCode
@@ -73,7 +77,9 @@ from jericho.cli import (
     delete_endpoints,
     get_endpoints,
     upgrade,
-    pull_dns_servers
+    pull_dns_servers,
+    trace_summary,
+    bench
 )
 
 from jericho.helpers import (
@@ -81,7 +87,11 @@ from jericho.helpers import (
     logger_convert,
     merge_domains_with_endpoints,
     get_domain_from_endpoint,
-    permutate_url_paths
+    permutate_url_paths,
+    split_array_by,
+    get_sqlite_path,
+    get_sqlite_pragmas,
+    create_database_engine,
 )
 from jericho.repositories.server_lookup import ServerLookup
 
@@ -171,12 +181,50 @@ parser.add_argument(
     help="This is mostly good for benchmarking and testing, by giving a file with domain:ip format per line Jericho will inject this to the internal DNS cache and use it through out the program",
 )
 
+parser.add_argument(
+    "--offline",
+    action="store_true",
+    help="Don't download the DNS server list, use the one that is saved even if it is older than dns_servers_max_age",
+)
+
 parser.add_argument(
     "--max-requests",
     type=int,
     help="The maximum requests per second that the program will send, default 10,000",
 )
 
+parser.add_argument(
+    "--processes",
+    type=int,
+    help="Split the domains across this many local processes that each run their own scan loop, default 1",
+)
+
+parser.add_argument(
+    "--trace-summary",
+    type=str,
+    help="Show the slowest hosts and request phases of a workload uuid that was scanned with trace_sample_rate in the configuration",
+)
+
+parser.add_argument(
+    "--bench",
+    type=int,
+    help="Benchmark the scan engine against this many local virtual hosts, no network or Docker is needed",
+)
+
+parser.add_argument(
+    "--bench-endpoints",
+    type=int,
+    default=20,
+    help="The amount of endpoints every virtual host is scanned for in --bench, default 20",
+)
+
+parser.add_argument(
+    "--bench-latency",
+    type=float,
+    default=0,
+    help="The milliseconds every virtual host in --bench waits before it answers, default 0",
+)
+
 parser.add_argument(
     "--setup-linodes",
     type=int,
@@ -260,22 +308,57 @@ jericho_database: sqlite:///{HOME}/jericho/jericho.db
 log_level: info
 max_result_and_404_percent_diff: 60
 max_head_timeout: 5
+head_prefilter: false
 max_get_timeout: 10
-ignore_multimedia: true"""
+ignore_multimedia: true
+keep_alive: true
+max_connections_per_host: 6
+keepalive_timeout: 15
+workers: 100
+min_workers: 10
+max_workers: 1000
+adaptive_concurrency: true
+liveness_check: true
+dns_timeout: 0.5
+dns_max_attempts: 5
+dns_negative_ttl: 60
+dns_cache_persist: true
+dns_servers_max_age: 86400
+db_batch_size: 500
+db_flush_interval: 500
+sqlite_journal_mode: wal
+sqlite_synchronous: normal
+sqlite_mmap_size: 268435456
+sqlite_cache_size: -65536
+sqlite_busy_timeout: 5000
+sqlite_checkpoint_interval: 60
+offline: false
+dns_prefetch: true
+dns_prefetch_concurrency: 500
+dns_prefetch_lookahead: 5000
+dns_prefetch_output: true
+response_queue_max_bytes: 32000000
+pipeline_queue_max_bytes: 16000000
+metrics_host: 127.0.0.1
+metrics_port: 9737
+metrics_textfile: {HOME}/jericho/metrics.prom
+trace_sample_rate: 0"""
     f = open(f"{HOME}/jericho/configuration.yml", "w")
     f.write(default_configuration)
     f.close()
 
 configuration = load_yaml_file(f"{HOME}/jericho/configuration.yml")
 
-engine = sqlalchemy.create_engine(configuration["jericho_database"])
+SQLITE_PRAGMAS = get_sqlite_pragmas(configuration)
+
+engine = create_database_engine(configuration["jericho_database"], SQLITE_PRAGMAS)
 Base.metadata.create_all(engine)
+add_missing_columns(engine)
 Session = sessionmaker(bind=engine)
 session = Session()
 
 
 server_lookup = ServerLookup(session)
-dns_cache_lookup = DnsCacheLookup()
 
 args = parser.parse_args()
 
@@ -328,7 +411,7 @@ root.addHandler(handler)
 
 NAMESERVERS = []
 DNS_CACHE = {}
-MAX_REQUESTS = 100
+MAX_REQUESTS = 10000
 
 if args.max_requests:
     MAX_REQUESTS = args.max_requests
@@ -367,117 +450,323 @@ if args.input:
     input = args.input
 
 
+def get_engine_settings(dns_cache: typing.List) -> dict:
+    """The settings every AsyncEngine in a scan is created with"""
+    return {
+        "status": HttpStatusCode.OK.value,
+        "timeout": configuration.get("max_get_timeout"),
+        "ignore_multimedia": configuration.get("ignore_multimedia"),
+        "dns_cache": dns_cache,
+        "keep_alive": configuration.get("keep_alive", True),
+        "max_connections_per_host": configuration.get("max_connections_per_host", 6),
+        "keepalive_timeout": configuration.get("keepalive_timeout", 15),
+        "workers": configuration.get("workers", 100),
+        "min_workers": configuration.get("min_workers", 10),
+        "max_workers": configuration.get("max_workers", 1000),
+        "adaptive_concurrency": configuration.get("adaptive_concurrency", True),
+        "liveness_check": configuration.get("liveness_check", True),
+        "liveness_timeout": configuration.get("liveness_timeout", 5),
+        "liveness_concurrency": configuration.get("liveness_concurrency", 500),
+        "dns_timeout": configuration.get("dns_timeout", 0.5),
+        "dns_max_attempts": configuration.get("dns_max_attempts", 5),
+        "dns_negative_ttl": configuration.get("dns_negative_ttl", 60),
+        "dns_cache_persist": configuration.get("dns_cache_persist", True),
+        "database": get_sqlite_path(configuration["jericho_database"]),
+        "sqlite_pragmas": SQLITE_PRAGMAS,
+        "dns_prefetch": configuration.get("dns_prefetch", True),
+        "dns_prefetch_concurrency": configuration.get("dns_prefetch_concurrency", 500),
+        "dns_prefetch_lookahead": configuration.get("dns_prefetch_lookahead", 5000),
+        "dns_prefetch_timeout": configuration.get("dns_prefetch_timeout", 10),
+        "circuit_breaker_threshold": configuration.get("circuit_breaker_threshold", 5),
+        "circuit_breaker_cooldown": configuration.get("circuit_breaker_cooldown", 300),
+        "max_requests": MAX_REQUESTS,
+        "max_requests_per_host": configuration.get("max_requests_per_host", 0),
+        "head_prefilter": configuration.get("head_prefilter", False),
+        "head_timeout": configuration.get("max_head_timeout", 5),
+        "max_redirects": configuration.get("max_redirects", 5),
+        "response_queue_max_bytes": configuration.get("response_queue_max_bytes", 32000000),
+        "pipeline_queue_max_bytes": configuration.get("pipeline_queue_max_bytes", 16000000),
+    }
+
+
+def update_dns_servers(lookup: DnsServerLookup) -> bool:
+    """Download the massdns resolver list and replace the saved one, the saved list is kept if the download fails"""
+    try:
+        dns_servers = asyncio.run(pull_dns_servers())
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as err:
+        logging.warning("Could not download the DNS server list because of error %s", err)
+        return False
+
+    if not dns_servers:
+        logging.warning("The downloaded DNS server list is empty, keeping the saved list")
+        return False
+
+    logging.info("Saving %s DNS servers", len(dns_servers))
+    return lookup.replace_all(dns_servers)
+
+
+def update_dns_servers_process():
+    """Update the DNS server list while the scan runs, the next scan gets the new list"""
+    process_engine = create_database_engine(configuration["jericho_database"], SQLITE_PRAGMAS)
+    process_session = sessionmaker(bind=process_engine)()
+    update_dns_servers(DnsServerLookup(process_session))
+    process_session.close()
+
+
+def get_dns_servers() -> typing.List[str]:
+    """
+    The saved DNS server list. It is only downloaded before the scan when nothing is saved yet, when the list
+    is older than dns_servers_max_age it is downloaded in the background instead
+    """
+    dns_servers = dns_server_lookup.get_all()
+    if args.offline or configuration.get("offline"):
+        return dns_servers
+
+    if not dns_servers:
+        logging.info("There are no saved DNS servers, downloading the list")
+        update_dns_servers(dns_server_lookup)
+        return dns_server_lookup.get_all()
+
+    age = dns_server_lookup.get_age()
+    if age is None or age > configuration.get("dns_servers_max_age", 86400):
+        logging.info("The DNS server list is out of date, updating it in the background")
+        # A process instead of a thread so no lock is held by another thread when the scan processes are forked
+        Process(target=update_dns_servers_process).start()
+
+    return dns_servers
+
+
+def forward_result(workload_uuid: str, endpoint: str):
+    """Send a result from a replica to the source"""
+    logging.info("Sending endpoint %s to source", endpoint)
+    cluster.send_zmq_message(
+        json.dumps(
+            {
+                "type": ClusterResponseType.RESULT.value,
+                "workload_uuid": workload_uuid,
+                "endpoint": endpoint,
+                "content": "",
+            }
+        )
+    )
+
+
+async def start_metrics_server(metrics: Metrics, port_offset: int):
+    """Serve the metrics of a scan, a busy port shouldn't stop the scan"""
+    port = configuration.get("metrics_port", 9737)
+    if not port:
+        return None
+
+    try:
+        return await metrics.serve(configuration.get("metrics_host", "127.0.0.1"), port + port_offset)
+    except OSError as err:
+        logging.warning("Could not serve metrics on port %s because of error: %s", port + port_offset, err)
+        return None
+
+
 async def start_aiohttp_loop(
     send_domains: typing.List,
     endpoints: typing.List,
     settings: dict,
     nameservers: typing.List[str],
     dns_cache: typing.List,
+    global_bucket: TokenBucket = None,
+    db_session=None,
 ):
-    async_engine = AsyncEngine(
-        nameservers=nameservers,
-        settings={
-            "status": HttpStatusCode.OK.value,
-            "timeout": configuration.get("max_get_timeout"),
-            "ignore_multimedia": configuration.get("ignore_multimedia"),
-            "dns_cache": dns_cache
-        }
+    """
+    Run the scan as a pipeline, candidates are verified, saved and notified while the scan is running.
+    A scan process passes its own db_session since it can't share the connection of its parent
+    """
+    database = get_sqlite_path(configuration["jericho_database"])
+    if database is None:
+        raise ValueError(
+            f"The scan results are written to a sqlite file, jericho_database {configuration['jericho_database']} is not one"
+        )
+
+    # One rate budget for both the scan and the 404 pages
+    engine_settings = get_engine_settings(dns_cache)
+    scan_dns_server_lookup = DnsServerLookup(db_session) if db_session else dns_server_lookup
+    engine_settings["nameserver_scores"] = scan_dns_server_lookup.get_scores()
+    rate_limiter = RateLimiter(
+        engine_settings["max_requests"],
+        engine_settings["max_requests_per_host"],
+        global_bucket=global_bucket,
     )
 
-    workload_uuid = settings.get("workload_uuid")
-    logging.debug("Starting async loop")
-    async for url, html, headers, pattern in async_engine.run(
-        send_domains,
-        endpoints,
-    ):
-        if url is None:
-            continue
+    # Every scan process has its own metrics, they are told apart by a label, a port and a textfile
+    process = settings.get("process")
+    metrics = Metrics({"process": str(process)} if process is not None else None)
+    metrics_server = await start_metrics_server(metrics, process or 0)
 
-        while True:
-            try:
-                logging.info("Saving output for %s", url)
+    workload_uuid = settings.get("workload_uuid")
 
-                logging.debug(
-                    "Accessing database sqlite:///%s/jericho/jericho.db", HOME
-                )
-                db = await aiosqlite.connect(f"/{HOME}/jericho/jericho.db")
+    tracer = None
+    if configuration.get("trace_sample_rate"):
+        os.makedirs(f"{HOME}/jericho/traces", exist_ok=True)
+        tracer = RequestTracer(
+            f"{HOME}/jericho/traces/{workload_uuid}.jsonl",
+            sample_rate=configuration["trace_sample_rate"],
+        )
 
-                # Using aiosqlite for inserts because we are in an event loop right now and should therefore optimize the speed
-                cursor = await db.execute(
-                    "INSERT OR IGNORE INTO jericho_html(workload_uuid, endpoint, content, pattern, headers) VALUES(?, ?, ?, ?, ?)",
-                    (workload_uuid, url, html, pattern,json.dumps(dict(headers))),
-                )
-                await db.commit()
-                await cursor.close()
-
-                break
-            except Exception as err:
-                logging.exception(
-                    "Could not save %s to database tables because of error: %s",
-                    url,
-                    err,
-                )
-                await db.rollback()
-            finally:
-                await db.close()
-
-    # Get the results so we can permutate them and check for false positives
-    result_urls = []
-    db = await aiosqlite.connect(f"/{HOME}/jericho/jericho.db")
-    async with db.execute("SELECT * FROM jericho_html WHERE workload_uuid=?", (workload_uuid, )) as cursor:
-        rows = await cursor.fetchall()
-        for row in rows:
-            result_urls.append(row[1])
-    await db.close()
+    if configuration.get("dns_prefetch_output", True):
+        os.makedirs(f"{HOME}/jericho/dns", exist_ok=True)
+        engine_settings["dns_prefetch_output"] = f"{HOME}/jericho/dns/{workload_uuid}.jsonl"
 
     async_engine = AsyncEngine(
         nameservers=nameservers,
-        settings={
-            "status": HttpStatusCode.OK.value,
-            "timeout": configuration.get("max_get_timeout"),
-            "ignore_multimedia": configuration.get("ignore_multimedia"),
-            "dns_cache": dns_cache
-        }
+        settings=engine_settings,
+        rate_limiter=rate_limiter,
+        metrics=metrics,
+        tracer=tracer
     )
-    # Save the non-existant urls for comparison
-    async for url, html, headers in async_engine.run(
-        permutate_url_paths(result_urls)
-    ):
-        if url is None:
-            continue
 
-        while True:
-            try:
-                logging.info("Saving output for %s", url)
+    scan_result_lookup = ResultLookup(db_session) if db_session else result_lookup
+    # A forked scan process can't use the zmq socket of its parent, the parent forwards its results
+    forward_results = cluster_role == ClusterRole.REPLICA and db_session is None
 
-                logging.debug(
-                    "Accessing database sqlite:///%s/jericho/jericho.db", HOME
-                )
-                db = await aiosqlite.connect(f"/{HOME}/jericho/jericho.db")
+    result_relevant = ResultRelevant(
+        investigate=investigate,
+        result_lookup=scan_result_lookup,
+        cache_lookup=cache_lookup,
+        diff=diff,
+        output_verifier=output_verifier,
+        configuration=settings.get("configuration", configuration),
+        workload_uuid=workload_uuid,
+    )
 
-                cursor = await db.execute(
-                    "INSERT OR IGNORE INTO jericho_404_caches(url, url_original, content) VALUES(?, ?, ?)",
-                    (url, url.replace('nonexistant404', ''), html),
-                )
+    # One connection writes the candidates and their 404 pages in batches for the whole scan
+    database_writer = DatabaseWriter(
+        database,
+        batch_size=configuration.get("db_batch_size", 500),
+        flush_interval=configuration.get("db_flush_interval", 500) / 1000,
+        pragmas=SQLITE_PRAGMAS,
+        checkpoint_interval=configuration.get("sqlite_checkpoint_interval", 60),
+        metrics=metrics,
+    )
+    await database_writer.start()
 
-                await db.commit()
-                await cursor.close()
+    async def save_candidate(candidate: dict):
+        logging.info("Saving output for %s", candidate["url"])
+        await database_writer.write(
+            "INSERT OR IGNORE INTO jericho_html(workload_uuid, endpoint, content, pattern, headers) VALUES(?, ?, ?, ?, ?)",
+            (workload_uuid, candidate["url"], candidate["content"], candidate["pattern"], json.dumps(dict(candidate["headers"]))),
+        )
 
-                break
-            except Exception as err:
-                logging.exception(
-                    "Could not save %s to database tables because of error: %s",
-                    url,
-                    err,
-                )
-                await db.rollback()
-            finally:
-                await db.close()
+        if candidate["not_found_content"]:
+            await database_writer.write(
+                "INSERT OR IGNORE INTO jericho_404_caches(url, url_original, content) VALUES(?, ?, ?)",
+                (candidate["not_found_url"], candidate["url"], candidate["not_found_content"]),
+            )
+
+    def save_result(candidate: dict) -> bool:
+        logging.debug("Saving result..")
+        if forward_results:
+            forward_result(workload_uuid, candidate["url"])
+            return True
+
+        if (
+            cluster_role == ClusterRole.SOURCE and not args.use_servers
+        ) or cluster_role == ClusterRole.DISABLED or db_session is not None:
+            return scan_result_lookup.save(workload_uuid, candidate["url"], candidate["content"])
+
+        return True
+
+    pipeline = Pipeline(
+        async_engine=async_engine,
+        result_relevant=result_relevant,
+        on_candidate=save_candidate,
+        on_result=save_result,
+        notifications=settings.get("notifications"),
+        settings=engine_settings,
+    )
+
+    logging.debug("Starting async loop")
+    try:
+        await pipeline.run(send_domains, endpoints)
+    finally:
+        await database_writer.close()
+        database_writer.report()
+        scan_dns_server_lookup.save_scores(async_engine.nameserver_health.get_scores())
+
+        if metrics_server:
+            await metrics_server.cleanup()
+
+        if tracer:
+            tracer.close()
+
+        metrics_textfile = configuration.get("metrics_textfile", f"{HOME}/jericho/metrics.prom")
+        if metrics_textfile:
+            textfile, extension = os.path.splitext(metrics_textfile)
+            metrics.write_textfile(
+                f"{textfile}.{process}{extension}" if process is not None else metrics_textfile
+            )
+
+        rate_limiter.report()
+
+
+def scan_process(
+    domains: typing.List[str],
+    endpoints: typing.List,
+    settings: dict,
+    nameservers: typing.List[str],
+    dns_cache: typing.List,
+    global_bucket: SharedTokenBucket,
+):
+    """The entry point of a --processes worker, it scans its share of the domains in its own event loop"""
+    process_engine = create_database_engine(configuration["jericho_database"], SQLITE_PRAGMAS)
+    process_session = sessionmaker(bind=process_engine)()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(
+            start_aiohttp_loop(
+                domains,
+                endpoints,
+                settings=settings,
+                nameservers=nameservers,
+                dns_cache=dns_cache,
+                global_bucket=global_bucket,
+                db_session=process_session,
+            )
+        )
+    finally:
+        loop.close()
+        process_session.close()
 
 
+def start_scan_processes(
+    domains: typing.List[str],
+    endpoints: typing.List,
+    settings: dict,
+    nameservers: typing.List[str],
+    dns_cache: typing.List,
+    processes: int,
+):
+    """Shard the domains across local processes, they save to the same workload"""
+    global_bucket = SharedTokenBucket(get_engine_settings(dns_cache)["max_requests"])
+
+    scan_processes = []
+    for index, domain_chunk in enumerate(split_array_by(domains, processes)):
+        if len(domain_chunk) == 0:
+            continue
+
+        proc = Process(
+            target=scan_process,
+            args=(domain_chunk, endpoints, {**settings, "process": index}, nameservers, dns_cache, global_bucket),
+        )
+        proc.start()
+        scan_processes.append(proc)
+
+    logging.info("Started %s scan processes", len(scan_processes))
+    for proc in scan_processes:
+        proc.join()
+        if proc.exitcode != 0:
+            logging.error("A scan process exited with code %s", proc.exitcode)
+
 
 def receiver(cluster: Cluster):
-    engine = sqlalchemy.create_engine(configuration["jericho_database"])
+    engine = create_database_engine(configuration["jericho_database"], SQLITE_PRAGMAS)
     Base.metadata.create_all(engine)
     Session = sessionmaker(bind=engine)
     session = Session()
@@ -510,16 +799,6 @@ def execute(
 
     notifications_configuration = configuration.get("notifications")
 
-    result_relevant = ResultRelevant(
-        investigate=investigate,
-        result_lookup=result_lookup,
-        cache_lookup=cache_lookup,
-        diff=diff,
-        output_verifier=output_verifier,
-        configuration=configuration,
-        workload_uuid=workload_uuid,
-    )
-
     # The class is instantiated here because the payload contain the
     # relevant notifications settings
 
@@ -530,49 +809,44 @@ def execute(
     total_sites = len(domains)
     logging.info("Got %s amount of domains", total_sites)
 
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(
-        start_aiohttp_loop(
+    scan_settings = {
+        "workload_uuid": workload_uuid,
+        "notifications": notifications,
+        "configuration": configuration,
+    }
+
+    if args.processes and args.processes > 1:
+        start_scan_processes(
             domains,
             endpoints,
-            settings={
-                "workload_uuid": workload_uuid,
-                "notifications": notifications,
-            },
+            settings=scan_settings,
             nameservers=nameservers,
             dns_cache=dns_cache,
+            processes=args.processes,
         )
-    )
 
-    logging.info("The loop is finished. Workload UUID: %s", workload_uuid)
-
-    for record_chunk in html_lookup.get_all(workload_uuid):
-        for record in record_chunk:
-            if not result_relevant.check(record.endpoint, record.content, record.pattern):
-                continue
-
-            if notifications:
-                logging.debug("Sending the notifications..")
-                asyncio.run(notifications.run_all(record.url))
-
-            logging.debug("Saving result..")
-            if (
-                cluster_role == ClusterRole.SOURCE and not args.use_servers
-            ) or cluster_role == ClusterRole.DISABLED:
-                result_lookup.save(workload_uuid, record.endpoint, record.content)
-
-            if cluster_role == ClusterRole.REPLICA:
-                logging.info("Sending endpoint %s to source", record.endpoint)
-                cluster.send_zmq_message(
-                    json.dumps(
-                        {
-                            "type": ClusterResponseType.RESULT.value,
-                            "workload_uuid": workload_uuid,
-                            "endpoint": record.endpoint,
-                            "content": "",
-                        }
-                    )
+        # The scan processes saved their results locally, a replica still has to send them to the source
+        if cluster_role == ClusterRole.REPLICA:
+            for endpoint, _ in result_lookup.get(workload_uuid):
+                forward_result(workload_uuid, endpoint)
+    else:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(
+                start_aiohttp_loop(
+                    domains,
+                    endpoints,
+                    settings=scan_settings,
+                    nameservers=nameservers,
+                    dns_cache=dns_cache,
                 )
+            )
+        finally:
+            # A long running replica executes one job after another, every job has its own loop
+            loop.close()
+
+    logging.info("The loop is finished. Workload UUID: %s", workload_uuid)
 
     if cluster_role == ClusterRole.REPLICA:
         cluster.send_zmq_message(ClusterResponseType.FINISHED.value)
@@ -588,16 +862,18 @@ def run() -> None:
     """This initializes the business logic"""
     global NAMESERVERS
 
-    # TODO: This updates every time now..
-    if not args.nameservers and not args.resolve_list:
-        logging.info("Updating DNS servers if there is a new update")
-        dns_servers = asyncio.run(pull_dns_servers())
-        dns_server_lookup.delete_all()
-        for server in dns_servers:
-            dns_server_lookup.save(server)
-        dns_server_lookup.commit()
+    if get_sqlite_path(configuration["jericho_database"]) is None:
+        logging.error(
+            "The scan results can only be saved to a sqlite file, set jericho_database to sqlite:///<path> instead of %s",
+            configuration["jericho_database"],
+        )
+        return None
 
-        NAMESERVERS = dns_server_lookup.get_all()
+    if not args.nameservers and not args.resolve_list:
+        NAMESERVERS = get_dns_servers()
+        if not NAMESERVERS:
+            logging.error("There are no saved DNS servers, run Jericho without --offline to download them or use --nameservers")
+            return None
 
         logging.info("Got %s dns servers", len(NAMESERVERS))
 
@@ -678,6 +954,17 @@ def main() -> typing.Any:
     if args.get_records:
         get_records(result_lookup)
 
+    if args.bench:
+        bench(
+            get_engine_settings({}),
+            hosts=args.bench,
+            endpoints=args.bench_endpoints,
+            latency=args.bench_latency / 1000,
+        )
+
+    if args.trace_summary:
+        trace_summary(f"{HOME}/jericho/traces/{args.trace_summary}.jsonl")
+
     if args.delete_records:
         delete_records(result_lookup)
 
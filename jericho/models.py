@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text
+from sqlalchemy import Column, String, Integer, Float, DateTime, Text, inspect
 from sqlalchemy.sql import func
 
 from sqlalchemy.ext.declarative import declarative_base
@@ -66,6 +66,11 @@ class JerichoDnsServers(Base):
     __tablename__ = "jericho_dns_servers"
 
     server = Column(String(255))
+    latency = Column(Float)
+    queries = Column(Integer, default=0)
+    timeouts = Column(Integer, default=0)
+    bogus = Column(Integer, default=0)
+    time_checked = Column(DateTime(timezone=True))
     time_created = Column(DateTime(timezone=True), server_default=func.now())
     id = Column(Integer, autoincrement=True, primary_key=True)
 
@@ -89,7 +94,28 @@ class JerichoWorkload(Base):
 class JerichoDnsCacheLookup(Base):
     __tablename__ = "jericho_dns_cache_lookup"
 
-    domain     = Column(String(255))
+    domain     = Column(String(255), index=True)
+    record_type = Column(Integer, default=1)
     ip_address = Column(String(255))
+    ttl = Column(Integer)
+    expires_at = Column(Float)
     time_created = Column(DateTime(timezone=True), server_default=func.now())
-    id = Column(Integer, autoincrement=True, primary_key=True)
\ No newline at end of file
+    id = Column(Integer, autoincrement=True, primary_key=True)
+
+
+def add_missing_columns(engine):
+    """create_all() doesn't touch tables that exist, so columns and indexes added to a model are added here"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = [column["name"] for column in inspector.get_columns(table.name)]
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(engine.dialect)
+                    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
@@ -7,16 +7,26 @@ import typing
 import aiodns
 import random
 import sys
+import time
 from enum import Enum
 from aiohttp import ClientSession
 from aiohttp.client_reqrep import ClientResponse
 from urllib.parse import urlparse
-from jericho.helpers import merge_domains_with_endpoints
+from jericho.helpers import merge_domains_with_endpoints, get_endpoint, get_hostname
 from jericho.plugin.async_fetch import AsyncFetch
-
-class WorkerStatus(Enum):
-    WORKING  = 'working'
-    IDLE     = 'idle'
+from jericho.plugin.session_pool import SessionPool
+from jericho.plugin.rate_limiter import RateLimiter
+from jericho.plugin.concurrency_controller import ConcurrencyController
+from jericho.plugin.liveness import Liveness
+from jericho.plugin.circuit_breaker import CircuitBreaker
+from jericho.plugin.metrics import Metrics
+from jericho.plugin.request_tracer import RequestTracer
+from jericho.plugin.byte_queue import ByteQueue
+from jericho.plugin.dns_cache import DnsCache
+from jericho.plugin.dns_prefetch import DnsPrefetch
+from jericho.plugin.nameserver_health import NameserverHealth
+from jericho.repositories.dns_cache_lookup import DnsCacheLookup
+from jericho.enums.fetch_error_types import FetchErrorType
 
 class WorkerMessage(Enum):
     DIE  = 'DIE'
@@ -25,11 +35,11 @@ class WorkerMessage(Enum):
 class AsyncEngine():
     def __init__(self,
         nameservers: list,
-        settings: dict
+        settings: dict,
+        rate_limiter: RateLimiter = None,
+        metrics: Metrics = None,
+        tracer: RequestTracer = None
         ):
-        self.workers = 100
-        self.response_queue: asyncio.Queue = asyncio.Queue()
-
         self.max_content_length: int = 1000000  # 1Mb
         self.max_retries: int = 1
         self.responses: dict = {}
@@ -40,17 +50,60 @@ class AsyncEngine():
         self.user_agent: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/74.0.3729.169 Safari/537.36"
         self.domain_list_size: int = 0
         self.finished_requests: int = 0
-        self.http_requests: int = 0
-        self.dns_requests: int = 0
-        self.dns_responses: int = 0
-        self.timeouts: int = 0
-        self.workers_status: dict = {}
+        self.nxdomain_skipped: int = 0
+        self.metrics = metrics or Metrics()
+        self.tracer = tracer
         self.settings = self._parse_settings(settings)
-        self.async_fetch = AsyncFetch(self.settings)
-        self.lock: asyncio.Lock = asyncio.Lock()
-        self.queues = []
-        self.finish_queues = []
-        self.finished_requests = 0
+        # Bounded by the size of the bodies so a slow consumer can't make us run out of memory
+        self.response_queue = ByteQueue(self.settings["response_queue_max_bytes"])
+        self.metrics.add_gauge(
+            "response_queue_bytes",
+            "Bytes of response bodies waiting for the consumer",
+            lambda: self.response_queue.bytes,
+        )
+        # One file descriptor budget for the connections, the liveness checks, the prefetch lookups and the 404 pages
+        self.fd_budget = ConcurrencyController.split_fd_budget(
+            ConcurrencyController.fd_budget(),
+            liveness=self.settings["liveness_concurrency"] if self.settings["liveness_check"] else 0,
+            prefetch=self.settings["dns_prefetch_concurrency"] if self.settings["dns_prefetch"] else 0,
+            baseline=self.settings["baseline_workers"],
+        )
+        self.settings["max_connections"] = min(
+            self.settings.get("max_connections") or self.fd_budget["connections"], self.fd_budget["connections"]
+        )
+        self.concurrency = ConcurrencyController(
+            initial=self.settings["workers"],
+            minimum=self.settings["min_workers"],
+            maximum=min(self.settings["max_workers"], self.fd_budget["connections"]),
+            adaptive=self.settings["adaptive_concurrency"],
+        )
+        # Enough workers for the ceiling, the controller decides how many may fetch at once
+        self.workers: int = self.concurrency.maximum
+        self.work_queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        # Seeded with --resolve-list and the answers of earlier scans, every resolver of the engine (and the pipeline) shares it
+        self.dns_cache = DnsCache(
+            self.settings.get("dns_cache"),
+            negative_ttl=self.settings["dns_negative_ttl"],
+            dns_cache_lookup=self._get_dns_cache_lookup(),
+        )
+        # Scored with what the last run learned about the nameservers, saved again when the scan is done
+        self.nameserver_health = NameserverHealth(
+            self.settings["nameservers"],
+            self.settings.get("nameserver_scores"),
+            timeout=self.settings["dns_timeout"],
+            max_attempts=self.settings["dns_max_attempts"],
+        )
+        self.session_pool = SessionPool(self.settings, self.metrics, self.tracer, self.dns_cache, self.nameserver_health)
+        self.rate_limiter = rate_limiter or RateLimiter(
+            self.settings["max_requests"], self.settings["max_requests_per_host"]
+        )
+        self.async_fetch = AsyncFetch(self.settings, self.session_pool, self.rate_limiter, self.metrics, self.tracer)
+        self.liveness: typing.Optional[Liveness] = None
+        self.dns_prefetch: typing.Optional[DnsPrefetch] = None
+        self.circuit_breaker = CircuitBreaker(
+            threshold=self.settings["circuit_breaker_threshold"],
+            cooldown=self.settings["circuit_breaker_cooldown"],
+        )
 
 
     def _parse_settings(self, settings: dict) -> dict:
@@ -67,105 +120,255 @@ class AsyncEngine():
         if not settings.get("nameservers"):
             settings["nameservers"] = self.nameservers
 
-        return settings
+        if not settings.get("workers"):
+            settings["workers"] = 100
 
-    async def run(self, links: typing.List[str], endpoints: list = None):
-        loop = asyncio.get_running_loop()
+        if not settings.get("min_workers"):
+            settings["min_workers"] = 10
 
-        await self.async_fetch.init()
+        if not settings.get("max_workers"):
+            settings["max_workers"] = 1000
 
-        asd = []
-        for workerID in range(0, self.workers-1):
-            q: asyncio.Queue = asyncio.Queue()
-            finish_queue: asyncio.Queue = asyncio.Queue()
+        if settings.get("adaptive_concurrency") is None:
+            settings["adaptive_concurrency"] = True
 
-            logging.info("Saving Starting worker %s", workerID)
-            asd.append(loop.create_task(self.worker(q, finish_queue, workerID)))
-            self.workers_status[workerID] = WorkerStatus.IDLE
-            self.queues.append(q)
-            self.finish_queues.append(finish_queue)
+        if settings.get("liveness_check") is None:
+            settings["liveness_check"] = True
 
-        if endpoints:
-            links = merge_domains_with_endpoints(endpoints, links)
+        if not settings.get("liveness_timeout"):
+            settings["liveness_timeout"] = 5
 
-        while True:
-            async with self.lock:
-                logging.info("Finished requests: %s", self.finished_requests)
-            active_workers = 0
-            for worker_id in range(0, self.workers-1):
-                if self.workers_status[worker_id] == WorkerStatus.WORKING:
-                    active_workers = active_workers + 1
+        if not settings.get("liveness_concurrency"):
+            settings["liveness_concurrency"] = 500
 
-            if len(links) == 0 and active_workers == 0 and self.response_queue.qsize() == 0:
-                for worker_id in range(0, self.workers-1):
-                    await self.queues[worker_id].put(WorkerMessage.DIE)
+        if not settings.get("baseline_workers"):
+            settings["baseline_workers"] = 20
 
-                for worker_id in range(0, self.workers-1):
-                    await self.finish_queues[worker_id].get()
+        if not settings.get("circuit_breaker_threshold"):
+            settings["circuit_breaker_threshold"] = 5
 
-                await self.async_fetch.close()
-                break
+        if settings.get("circuit_breaker_cooldown") is None:
+            settings["circuit_breaker_cooldown"] = 300
 
-            for workerID in range(0, self.workers-1):
-                batch:list = []
+        if not settings.get("max_requests"):
+            settings["max_requests"] = 0
 
-                if self.queues[workerID].qsize() > 0:
-                    continue
+        if not settings.get("max_requests_per_host"):
+            settings["max_requests_per_host"] = 0
 
-                for _ in range(0,2):
-                    if len(links) == 0:
-                        continue
+        if settings.get("response_queue_max_bytes") is None:
+            settings["response_queue_max_bytes"] = 32000000
 
-                    batch.append(links.pop())
+        if not settings.get("dns_timeout"):
+            settings["dns_timeout"] = 0.5
 
-                if len(batch) > 0:
-                    logging.debug("Queue Sending batch with %s of size", len(batch))
-                    await self.queues[workerID].put(batch)
+        if not settings.get("dns_max_attempts"):
+            settings["dns_max_attempts"] = 5
 
-            if self.response_queue.qsize() > 0:
-                for _ in range(0, self.response_queue.qsize()):
-                    if self.response_queue.qsize() != 0:
-                        job_response = await self.response_queue.get()
+        if settings.get("dns_negative_ttl") is None:
+            settings["dns_negative_ttl"] = 60
 
-                        if endpoints:
-                            response = job_response.get("result")
-                            pattern = job_response.get("pattern")
+        if settings.get("dns_cache_persist") is None:
+            settings["dns_cache_persist"] = True
 
-                            if response:
-                                yield response['url'], response['content'], response['headers'], pattern
-                        else:
-                            if job_response:
-                                yield job_response['url'], job_response['content'], job_response['headers']
+        if settings.get("dns_prefetch") is None:
+            settings["dns_prefetch"] = True
 
-            await asyncio.sleep(0.1)
+        if not settings.get("dns_prefetch_concurrency"):
+            settings["dns_prefetch_concurrency"] = 500
 
-    async def worker(self, q, finish_queue,  workerID):
-        while True:
-            urls = await q.get()
+        if settings.get("dns_prefetch_lookahead") is None:
+            settings["dns_prefetch_lookahead"] = 5000
 
-            if urls == WorkerMessage.DIE:
-                await finish_queue.put(WorkerMessage.DEAD)
-                return False
+        if not settings.get("dns_prefetch_timeout"):
+            settings["dns_prefetch_timeout"] = 10
+
+        return settings
+
+    def _get_dns_cache_lookup(self) -> typing.Optional[DnsCacheLookup]:
+        """The answers are only kept between runs when there is a sqlite database to keep them in"""
+        if not self.settings["dns_cache_persist"] or not self.settings.get("database"):
+            return None
+
+        return DnsCacheLookup(self.settings["database"], pragmas=self.settings.get("sqlite_pragmas"))
+
+    def _to_work_item(self, link: typing.Union[str, dict]) -> dict:
+        """Plain urls (e.g the 404 permutations) are wrapped so the workers only handle one shape"""
+        if isinstance(link, dict):
+            return link
+
+        return {"endpoint": link, "pattern": None, "raw_endpoint": get_endpoint(link)}
 
-            for url in urls:
-                async with self.lock:
-                    self.workers_status[workerID] = WorkerStatus.WORKING
-                try:
-                    fetch_result = await self.async_fetch.fetch(url.get("endpoint"))
+    def _skip_if_missing(self, url: str) -> bool:
+        """Drop the requests to a domain that was confirmed to not exist, they would only fail the same way"""
+        if not self.dns_cache.nxdomain:
+            return False
 
-                    if not fetch_result:
-                        continue
-                
-                    # This is for checking if the final redirected url contains the desired endpoint that we look for.
-                    # E.g /security.txt exists in test.com/security.txt. But /security.txt does not exist in test.com/?redirect=security.txt
-                    if url.get("raw_endpoint") not in fetch_result.get("url"):
-                        logging.debug("Endpoint %s does not exist in %s", url.get("raw_endpoint"), fetch_result.get("endpoint"))
+        if get_hostname(url) not in self.dns_cache.nxdomain:
+            return False
 
-                    await self.response_queue.put({"result": fetch_result, "pattern": url.get("pattern")})
+        self.nxdomain_skipped = self.nxdomain_skipped + 1
+        self.metrics.inc("skipped", labels={"reason": "nxdomain"})
+        return True
 
-                except Exception as e:
-                    logging.error("Fetch caused an error: %s", e)
-                self.workers_status[workerID] = WorkerStatus.IDLE
+    async def producer(self, links: typing.Iterable):
+        """Feed the work queue, it blocks when the queue is full so the workers set the pace"""
+        for link in links:
+            work_item = self._to_work_item(link)
+            if self.dns_prefetch and work_item.get("domain_index") is not None:
+                self.dns_prefetch.seen(work_item["domain_index"])
+
+            if self._skip_if_missing(work_item.get("endpoint")):
+                continue
+
+            await self.work_queue.put(work_item)
+
+        for _ in range(0, self.workers):
+            await self.work_queue.put(WorkerMessage.DIE)
+
+    async def _signal_when_done(self, worker_tasks: typing.List[asyncio.Task]):
+        """Wake up the consumer once every worker has exited"""
+        await asyncio.gather(*worker_tasks, return_exceptions=True)
+        await self.response_queue.put(WorkerMessage.DEAD)
+
+    async def run(self, links: typing.List[str], endpoints: list = None):
+        loop = asyncio.get_running_loop()
+
+        await self.dns_cache.load()
+
+        prefetch_tasks = []
+        if endpoints:
+            # Resolve the domains ahead of the workers so they never wait on DNS when they connect
+            if self.settings["dns_prefetch"]:
+                self.dns_prefetch = DnsPrefetch(
+                    self.session_pool.get_resolver,
+                    concurrency=self.fd_budget["prefetch"],
+                    lookahead=self.settings["dns_prefetch_lookahead"],
+                    timeout=self.settings["dns_prefetch_timeout"],
+                    output=self.settings.get("dns_prefetch_output"),
+                )
+                prefetch_tasks.append(loop.create_task(self.dns_prefetch.run(links)))
+
+            domains = len(links)
+            links = merge_domains_with_endpoints(endpoints, links)
+
+            # Only the scan needs it, the 404 pass only goes to hosts that already answered
+            if self.settings["liveness_check"]:
+                self.liveness = Liveness(
+                    self.session_pool.get_resolver,
+                    timeout=self.settings["liveness_timeout"],
+                    concurrency=self.fd_budget["liveness"],
+                    domains=domains,
+                )
+
+        logging.info("Starting %s workers", self.workers)
+        worker_tasks = [
+            loop.create_task(self.worker(worker_id))
+            for worker_id in range(0, self.workers)
+        ]
+        tasks = [
+            loop.create_task(self.producer(links)),
+            loop.create_task(self._signal_when_done(worker_tasks)),
+        ] + worker_tasks + prefetch_tasks
+
+        try:
+            while True:
+                job_response = await self.response_queue.get()
+
+                if job_response == WorkerMessage.DEAD:
+                    break
+
+                response = job_response.get("result")
+                if endpoints:
+                    yield response['url'], response['content'], response['headers'], job_response.get("pattern")
+                else:
+                    yield response['url'], response['content'], response['headers']
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            logging.info(
+                "Finished requests: %s (concurrency %s, response queue peaked at %s bytes)",
+                self.finished_requests,
+                self.concurrency.limit,
+                self.response_queue.peak_bytes,
+            )
+            if self.liveness:
+                await self.liveness.close()
+                self.liveness.report()
+            if self.dns_prefetch:
+                self.dns_prefetch.report()
+            self.circuit_breaker.report()
+            self.dns_cache.report()
+            if self.nxdomain_skipped:
+                logging.info(
+                    "Skipped %s requests to %s domains that do not exist",
+                    self.nxdomain_skipped,
+                    len(self.dns_cache.nxdomain),
+                )
+            self.nameserver_health.report()
+            await self.dns_cache.close()
+            await self.async_fetch.close()
+
+    async def _fetch(self, url: dict):
+        """Fetch one work item unless its domain doesn't exist, its host is dead or its circuit is open"""
+        if self._skip_if_missing(url.get("endpoint")):
+            return
+
+        if self.liveness and not await self.liveness.is_alive(url.get("endpoint"), url.get("domain_index")):
+            return
+
+        host = urlparse(url.get("endpoint")).netloc
+        if self.circuit_breaker.is_open(host):
+            return
+
+        await self.concurrency.acquire()
+        started = time.monotonic()
+        error_type = None
+        try:
+            fetch_result, error_type = await self.async_fetch.fetch_with_error(url.get("endpoint"))
+
+            if fetch_result:
+                # This is for checking if the final redirected url contains the desired endpoint that we look for.
+                # E.g /security.txt exists in test.com/security.txt. But /security.txt does not exist in test.com/?redirect=security.txt
+                if url.get("raw_endpoint") not in fetch_result.get("url"):
+                    logging.debug("Endpoint %s does not exist in %s", url.get("raw_endpoint"), fetch_result.get("endpoint"))
+
+                await self.response_queue.put(
+                    {"result": fetch_result, "pattern": url.get("pattern")},
+                    len(fetch_result.get("content", "")),
+                )
+        finally:
+            latency = time.monotonic() - started
+            self.metrics.inc("requests")
+            self.metrics.observe("total_seconds", latency)
+            if error_type is not None:
+                self.metrics.error(error_type.value)
+
+            connection_failed = error_type in (FetchErrorType.TIMEOUT, FetchErrorType.CONNECT)
+            self.circuit_breaker.record(host, connection_failed)
+            await self.concurrency.release(latency, connection_failed)
+
+    async def worker(self, worker_id: int):
+        while True:
+            url = await self.work_queue.get()
+
+            if url == WorkerMessage.DIE:
+                logging.debug("Worker %s is done", worker_id)
+                return False
 
-            async with self.lock:
-                self.finished_requests = self.finished_requests + len(urls)
\ No newline at end of file
+            # One bad url (e.g a malformed host) must never take the worker down with it
+            try:
+                await self._fetch(url)
+            except Exception as e:
+                logging.error("Fetching %s caused an error: %s", url.get("endpoint"), e)
+
+            self.finished_requests = self.finished_requests + 1
+            if self.finished_requests % 1000 == 0:
+                logging.info(
+                    "Finished requests: %s (concurrency %s, %.1f requests/s)",
+                    self.finished_requests,
+                    self.concurrency.limit,
+                    self.metrics.requests_per_second(),
+                )
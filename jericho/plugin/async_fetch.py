@@ -7,20 +7,16 @@ import aiodns
 import asyncio
 import random
 import validators
-from async_retrying import retry
-from async_retrying import RetryError
-from aiodnsresolver import Resolver, ResolverLoggerAdapter
-from aiodnsresolver import (
-    TYPES,
-    Resolver,
-    DnsError,
-    DnsRecordDoesNotExist,
-)
-from aiohttp.client_reqrep import ClientResponse
 from aiohttp import ClientSession
-from urllib.parse import urlparse
-from jericho.repositories.dns_cache_lookup import DnsCacheLookup
-from jericho.helpers import chunks
+from aiohttp.client_reqrep import ClientResponse
+from urllib.parse import urlparse, urljoin
+from jericho.enums.fetch_error_types import FetchErrorType
+from jericho.plugin.dns_resolver import AioHttpDnsResolver, DnsResolveError
+from jericho.plugin.session_pool import SessionPool
+from jericho.plugin.rate_limiter import RateLimiter
+from jericho.plugin.redirect_cache import RedirectCache
+from jericho.plugin.metrics import Metrics
+from jericho.plugin.request_tracer import RequestTracer
 
 class EmptyDNSResolve(Exception):
     pass
@@ -28,59 +24,20 @@ class EmptyDNSResolve(Exception):
 class HTTPError(Exception):
     pass
 
-logging.getLogger("aiodnsresolver").setLevel(logging.CRITICAL)
-
-
-class AioHttpDnsResolver(aiohttp.abc.AbstractResolver):
-    def __init__(self, nameservers):
-        super().__init__()
-        self.resolver, self.clear_cache = Resolver(get_nameservers=self.get_nameservers)
-        self.nameservers = nameservers
-
-    async def get_nameservers(self, _, __):
-        domain_list_chunk = chunks(self.nameservers, 10)
-        for nameserver_chunk_raw in domain_list_chunk:
-            nameserver_list = [0.5]
-            for nameserver in nameserver_chunk_raw:
-                nameserver_list.append((nameserver, 53))
-
-            nameserver_chunk = tuple(nameserver_list)
-            yield nameserver_chunk
-
-    async def resolve(self, host, port=0, family=socket.AF_INET):
-        # Use ipv4 unless requested otherwise
-        # This is consistent with the default aiohttp + aiodns AsyncResolver
-        record_type = \
-            TYPES.AAAA if family == socket.AF_INET6 else \
-            TYPES.A
-
-        try:
-            ip_addresses = await self.resolver(host, record_type)
-        except DnsRecordDoesNotExist as does_not_exist:
-            raise OSError(0, '{} does not exist'.format(host)) from does_not_exist
-        except DnsError as dns_error:
-            raise OSError(0, '{} failed to resolve'.format(host)) from dns_error
-
-        return [{
-            'hostname': host,
-            'host': str(ip_address),
-            'port': port,
-            'family': family,
-            'proto': socket.IPPROTO_TCP,
-            'flags': socket.AI_NUMERICHOST,
-        } for ip_address in ip_addresses]
-
-    async def close(self):
-        await self.clear_cache()
 
 class AsyncFetch():
-    def __init__(self, settings = {}):
+    def __init__(
+        self,
+        settings = {},
+        session_pool: SessionPool = None,
+        rate_limiter: RateLimiter = None,
+        metrics: Metrics = None,
+        tracer: RequestTracer = None
+    ):
         self.settings = settings
         self.multimedia_content_types: list = ["audio", "image", "video", "font"]
+        self.chunk_size: int = 65536
         self.lock: asyncio.Lock = asyncio.Lock()
-        self.dns_cache_lookup = DnsCacheLookup()
-        self.dns_requests: int = 0
-        self.dns_responses: int = 0
         self.nameserver = ''
 
         if 'user_agent' not in settings:
@@ -101,11 +58,23 @@ class AsyncFetch():
         if 'dns_cache' not in settings:
             self.settings['dns_cache'] = {}
 
-    async def init(self):
-        await self.dns_cache_lookup.connect_db()
+        if 'head_prefilter' not in settings:
+            self.settings['head_prefilter'] = False
+
+        if 'head_timeout' not in settings:
+            self.settings['head_timeout'] = 5
+
+        if 'max_redirects' not in settings:
+            self.settings['max_redirects'] = 5
+
+        self.metrics = metrics or Metrics()
+        self.tracer = tracer
+        self.session_pool = session_pool or SessionPool(self.settings, self.metrics, self.tracer)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.redirect_cache = RedirectCache()
 
     async def close(self):
-        await self.dns_cache_lookup.close()
+        await self.session_pool.close()
 
     def _remove_port(self, host):
         if ":" in host:
@@ -113,6 +82,10 @@ class AsyncFetch():
 
         return host
 
+    def _exceeds_max_content_size(self, size: typing.Optional[int]) -> bool:
+        """Check if a body size is above the configured max content size"""
+        return size is not None and size >= self.settings['max_content_size']
+
     def _is_multi_media(self, content_type: str) -> bool:
         """Check if content is a multi media"""
         for bad_content_type in self.multimedia_content_types:
@@ -136,12 +109,8 @@ class AsyncFetch():
             return None
 
         headers = dict(response.headers)
-        logging.debug("Getting the html")
-        content_bytes: bytes = await response.read()
-        content: str = content_bytes.decode("utf-8", "ignore")
-        logging.debug("Done getting the html")
 
-        # Ignore media content
+        # Ignore media content, the content type is known before we read a single byte
         if self.settings["ignore_multimedia"] is True:
             content_type = response.headers.get("content-type", "")
 
@@ -151,69 +120,148 @@ class AsyncFetch():
                     url,
                 )
                 return None
+
         # Huge content types are problematic, it consumes memory,
         # especially if we're trying to guess its content and put it in parsers
         # This is why we're gonna return None if it exceeds a certain configurable amount
-        if len(content) >= self.settings['max_content_size']:
+        if self._exceeds_max_content_size(response.content_length):
             logging.debug(
-                "Skipping analyzing %s because it exceeds max content size of %s",
+                "Skipping %s because its Content-Length %s exceeds max content size of %s",
                 url,
+                response.content_length,
                 self.settings['max_content_size'],
             )
+            self.metrics.error(FetchErrorType.OVERSIZE.value)
+            response.close()
             return None
 
+        logging.debug("Getting the html")
+        content_bytes = bytearray()
+        async for chunk in response.content.iter_chunked(self.chunk_size):
+            content_bytes.extend(chunk)
+            self.metrics.inc("bytes", len(chunk))
+
+            # The Content-Length can be missing or lie, so we also stop reading as soon as we pass the limit
+            if self._exceeds_max_content_size(len(content_bytes)):
+                logging.debug(
+                    "Skipping analyzing %s because it exceeds max content size of %s",
+                    url,
+                    self.settings['max_content_size'],
+                )
+                self.metrics.error(FetchErrorType.OVERSIZE.value)
+                response.close()
+                return None
+
+        content: str = content_bytes.decode("utf-8", "ignore")
+        logging.debug("Done getting the html")
+
         return url, content, headers
 
-    #@retry(attempts = 3)
-    async def fetch(self, url):
+    def _head_allows_get(self, url: str, response: ClientResponse) -> bool:
+        """Decide from a HEAD response if the endpoint is worth a GET request"""
+        # Servers that don't implement HEAD tell us nothing about the endpoint
+        if response.status in (405, 501) or str(response.status)[0] == "3":
+            return True
+
+        if self.settings["status"] != -1 and response.status != self.settings["status"]:
+            logging.debug("HEAD gave status %s for url %s, skipping GET", response.status, url)
+            return False
+
+        if self.settings["ignore_multimedia"] is True and self._is_multi_media(response.headers.get("content-type", "")):
+            logging.debug("HEAD gave a multimedia content type for url %s, skipping GET", url)
+            return False
+
+        if self._exceeds_max_content_size(response.content_length):
+            logging.debug("HEAD gave a Content-Length of %s for url %s, skipping GET", response.content_length, url)
+            self.metrics.error(FetchErrorType.OVERSIZE.value)
+            return False
+
+        return True
+
+    def _start_trace(self, method: str, url: str) -> typing.Optional[dict]:
+        return self.tracer.start(method, url) if self.tracer else None
+
+    def _finish_trace(self, trace: typing.Optional[dict], status: typing.Optional[int], error: typing.Optional[Exception]):
+        if trace is not None:
+            self.tracer.finish(trace, status, self.classify_error(error).value if error else None)
+
+    async def _head_prefilter(self, session: ClientSession, url: str) -> bool:
+        """Send a HEAD request first so we only download bodies that can be a result"""
+        await self.rate_limiter.acquire(urlparse(url).netloc)
+
+        logging.debug("Sending a HEAD request to %s", url)
+        trace = self._start_trace("HEAD", url)
+        status = None
+        error = None
         try:
-            async with ClientSession(
-                connector=aiohttp.TCPConnector(
-                    ssl=False,
-                    enable_cleanup_closed=True,
-                    family=socket.AF_INET,
-                    force_close=True,
-                    use_dns_cache=False,
-                    resolver=AioHttpDnsResolver(self.settings['nameservers'])
-                    
-                ),
-                cookie_jar=aiohttp.DummyCookieJar(),
-                timeout=aiohttp.ClientTimeout(total=10,sock_connect=10,sock_read=10)
-            ) as session:
-                headers = {
-                    "User-Agent": self.settings['user_agent'],
-                    "Connection": "close",
-                }
-
-                logging.debug("Sending a GET request to %s", url)
+            async with session.head(
+                url,
+                ssl=False,
+                allow_redirects=False,
+                timeout=self.settings['head_timeout'],
+                headers=self.session_pool.headers(),
+                trace_request_ctx=trace
+            ) as response:
+                status = response.status
+                return self._head_allows_get(url, response)
+        except Exception as err:
+            error = err
+            raise
+        finally:
+            self._finish_trace(trace, status, error)
+
+    def _get_redirect_url(self, url: str, response: ClientResponse) -> typing.Optional[str]:
+        """Get where a redirect points to, None if it is missing or leaves the domain"""
+        redirect_url = response.headers.get("Location")
+        if redirect_url is None:
+            logging.error(
+                "A status %s gave no location header on domain %s",
+                response.status,
+                url,
+            )
+            return None
+
+        # Sometimes the Location is a relative path
+        redirect_url = urljoin(url, redirect_url)
+
+        if urlparse(url).netloc.replace("www.", "").encode('idna').decode() != urlparse(redirect_url).netloc.replace("www.", ""):
+            logging.debug("The URL %s and URL %s is not the same domain, skipping..", url, redirect_url)
+            return None
+
+        return redirect_url
+
+    async def _fetch(self, url):
+        session = await self.session_pool.get()
+        url = self.redirect_cache.apply(url)
+
+        if self.settings['head_prefilter'] and not await self._head_prefilter(session, url):
+            return None
+
+        for _ in range(0, self.settings['max_redirects'] + 1):
+            await self.rate_limiter.acquire(urlparse(url).netloc)
+
+            logging.debug("Sending a GET request to %s", url)
+            trace = self._start_trace("GET", url)
+            status = None
+            error = None
+            try:
                 async with session.get(
                     url,
                     ssl=False,
                     allow_redirects=False,
                     timeout=10,
-                    headers=headers
+                    headers=self.session_pool.headers(),
+                    trace_request_ctx=trace
                 ) as response:
+                    status = response.status
                     if str(response.status)[0] == "3":
-                        redirect_url = response.headers.get("Location")
+                        redirect_url = self._get_redirect_url(url, response)
                         if redirect_url is None:
-                            logging.error(
-                                "A status %s gave no location header on domain %s",
-                                response.status,
-                                url,
-                            )
-                            return ""
-
-                        # Sometimes the Location is a relative path
-                        if redirect_url[0] == "/":
-                            redirect_url = url + redirect_url
-
-                        if urlparse(url).netloc.replace("www.", "").encode('idna').decode() != urlparse(redirect_url).netloc.replace("www.", ""):
-                            logging.debug("The URL %s and URL %s is not the same domain, skipping..", url, redirect_url)
                             return None
 
-                        return await self.fetch(
-                            redirect_url
-                        )
+                        self.redirect_cache.observe(url, redirect_url)
+                        url = redirect_url
+                        continue
 
                     response_content = await self._process_response(
                         url, response
@@ -225,6 +273,42 @@ class AsyncFetch():
                         return {'url': response_content[0], 'content': response_content[1], 'headers': response_content[2]}
 
                     return None
+            except Exception as err:
+                error = err
+                raise
+            finally:
+                self._finish_trace(trace, status, error)
+
+        logging.debug("Giving up on %s after %s redirects", url, self.settings['max_redirects'])
+        return None
+
+    def classify_error(self, err: Exception) -> FetchErrorType:
+        """Bucket an exception from a request so callers can react on the kind of failure"""
+        if isinstance(err, asyncio.TimeoutError):
+            return FetchErrorType.TIMEOUT
+
+        if isinstance(err, (aiohttp.ClientConnectorCertificateError, aiohttp.ClientSSLError)):
+            return FetchErrorType.TLS
+
+        if isinstance(err, aiohttp.ClientConnectorError):
+            if isinstance(err.os_error, DnsResolveError):
+                return FetchErrorType.DNS
+
+            return FetchErrorType.CONNECT
+
+        if isinstance(err, (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError)):
+            return FetchErrorType.CONNECT
+
+        return FetchErrorType.OTHER
+
+    async def fetch_with_error(self, url) -> typing.Tuple[typing.Optional[dict], typing.Optional[FetchErrorType]]:
+        """Fetch a url and tell the caller what kind of error stopped it, if any"""
+        try:
+            return await self._fetch(url), None
         except Exception as err:
             logging.debug("Error on %s. Error: %s", url, err)
-            #raise err
+            return None, self.classify_error(err)
+
+    async def fetch(self, url):
+        fetch_result, _ = await self.fetch_with_error(url)
+        return fetch_result
@@ -0,0 +1,143 @@
+#!/bin/python3
+import asyncio
+import logging
+import resource
+import time
+import typing
+from aiohttp import web
+from jericho.plugin.async_engine import AsyncEngine
+
+
+class VirtualHostFarm:
+    """
+    One local aiohttp server that answers for thousands of virtual hosts. The Host header decides
+    how a host behaves: a catch-all that answers 200 on every path, a redirect, a body above
+    max_content_size or a dropped connection. The hosts are resolved through a --resolve-list style mapping
+    """
+
+    def __init__(
+        self,
+        hosts: int = 1000,
+        latency: float = 0.0,
+        redirect_ratio: float = 0.1,
+        oversize_ratio: float = 0.05,
+        drop_ratio: float = 0.05,
+        oversize_bytes: int = 2000000,
+    ):
+        self.hosts = hosts
+        self.latency = latency
+        self.redirect_ratio = redirect_ratio
+        self.oversize_ratio = oversize_ratio
+        self.drop_ratio = drop_ratio
+        self.oversize_body: bytes = b"a" * oversize_bytes
+        self.requests: int = 0
+        self.port: int = 0
+        self.runner: typing.Optional[web.AppRunner] = None
+
+    def get_hostname(self, index: int) -> str:
+        return f"host{index}.jericho.bench"
+
+    def get_behaviour(self, hostname: str) -> str:
+        """Spread the behaviours evenly over the hosts, a host always behaves the same"""
+        position = (int(hostname.split(".")[0][4:]) % 100) / 100
+
+        if position < self.drop_ratio:
+            return "drop"
+
+        if position < self.drop_ratio + self.oversize_ratio:
+            return "oversize"
+
+        if position < self.drop_ratio + self.oversize_ratio + self.redirect_ratio:
+            return "redirect"
+
+        return "ok"
+
+    def get_domains(self) -> typing.List[str]:
+        return [f"http://{self.get_hostname(index)}:{self.port}" for index in range(0, self.hosts)]
+
+    def get_resolve_list(self) -> typing.Dict[str, str]:
+        return {self.get_hostname(index): "127.0.0.1" for index in range(0, self.hosts)}
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests = self.requests + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        behaviour = self.get_behaviour(request.host.split(":")[0])
+
+        if behaviour == "drop":
+            request.transport.close()
+            return web.Response()
+
+        if behaviour == "oversize":
+            return web.Response(body=self.oversize_body, content_type="text/plain")
+
+        if behaviour == "redirect" and not request.path.startswith("/landing"):
+            raise web.HTTPFound(f"/landing{request.path}")
+
+        return web.Response(text=f"<html><body>{request.path}</body></html>", content_type="text/html")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self.handle)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", self.port, backlog=4096)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+
+        logging.info("Serving %s virtual hosts on port %s", self.hosts, self.port)
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+class Bench:
+    """Run AsyncEngine against a VirtualHostFarm and report its throughput, latency and memory"""
+
+    def __init__(self, farm: VirtualHostFarm, settings: dict, endpoints: int = 20):
+        self.farm = farm
+        self.settings = settings
+        self.endpoints = [
+            {"endpoint": f"/bench{index}.txt", "pattern": "bench"} for index in range(0, endpoints)
+        ]
+
+    async def run(self) -> dict:
+        await self.farm.start()
+
+        try:
+            async_engine = AsyncEngine(
+                nameservers=["127.0.0.1"],
+                settings={**self.settings, "dns_cache": self.farm.get_resolve_list()},
+            )
+
+            responses = 0
+            started = time.monotonic()
+            async for _ in async_engine.run(self.farm.get_domains(), self.endpoints):
+                responses = responses + 1
+            elapsed = time.monotonic() - started
+        finally:
+            await self.farm.close()
+
+        metrics = async_engine.metrics
+        total_seconds = metrics.histograms["total_seconds"]
+
+        return {
+            "hosts": self.farm.hosts,
+            "endpoints": len(self.endpoints),
+            "requests": int(metrics.get("requests")),
+            "responses": responses,
+            "seconds": round(elapsed, 2),
+            "requests_per_second": round(metrics.get("requests") / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(total_seconds.quantile(0.5) * 1000, 1),
+            "p99_ms": round(total_seconds.quantile(0.99) * 1000, 1),
+            "errors": {
+                dict(labels)["type"]: int(value)
+                for (name, labels), value in metrics.counters.items()
+                if name == "errors"
+            },
+            # The farm runs in the same process, so this is the peak of both
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
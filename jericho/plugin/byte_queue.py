@@ -0,0 +1,44 @@
+#!/bin/python3
+import asyncio
+import collections
+import typing
+
+
+class ByteQueue:
+    """
+    A FIFO queue that is bounded by the total size of its items instead of how many they are.
+    A response can be anything from a few bytes to the max content size, so counting items says
+    little about the memory it takes. put() blocks while the items don't fit, an item larger than
+    the whole budget is still let through when the queue is empty so it can't get stuck.
+    A max_bytes of 0 means unbounded
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.bytes: int = 0
+        self.peak_bytes: int = 0
+        self.items: typing.Deque[typing.Tuple[typing.Any, int]] = collections.deque()
+        self.condition = asyncio.Condition()
+
+    def _fits(self, size: int) -> bool:
+        return self.max_bytes <= 0 or self.bytes == 0 or self.bytes + size <= self.max_bytes
+
+    def qsize(self) -> int:
+        return len(self.items)
+
+    async def put(self, item: typing.Any, size: int = 0):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self._fits(size))
+            self.items.append((item, size))
+            self.bytes = self.bytes + size
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+            self.condition.notify_all()
+
+    async def get(self) -> typing.Any:
+        async with self.condition:
+            await self.condition.wait_for(lambda: len(self.items) > 0)
+            item, size = self.items.popleft()
+            self.bytes = self.bytes - size
+            self.condition.notify_all()
+
+        return item
@@ -0,0 +1,62 @@
+#!/bin/python3
+import logging
+import time
+import typing
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host after a number of connect errors or timeouts in a row.
+    After the cool down one request is let through, if it works the host is used again,
+    otherwise it stays open for another cool down. A cool down of 0 abandons the host for the rest of the run.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 300):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures: typing.Dict[str, int] = {}
+        self.opened_at: typing.Dict[str, float] = {}
+        self.probing: typing.Set[str] = set()
+        self.tripped_hosts: typing.Set[str] = set()
+        self.skipped_requests: int = 0
+
+    def is_open(self, host: str) -> bool:
+        """Check if requests to the host should be skipped"""
+        if host not in self.opened_at:
+            return False
+
+        cooled_down = self.cooldown > 0 and time.monotonic() - self.opened_at[host] >= self.cooldown
+        if cooled_down and host not in self.probing:
+            logging.debug("Letting one request through to %s after the cool down", host)
+            self.probing.add(host)
+            return False
+
+        self.skipped_requests = self.skipped_requests + 1
+        return True
+
+    def record(self, host: str, failed: bool):
+        """Record the outcome of a request to the host"""
+        self.probing.discard(host)
+
+        if not failed:
+            self.failures.pop(host, None)
+            self.opened_at.pop(host, None)
+            return
+
+        self.failures[host] = self.failures.get(host, 0) + 1
+        if self.failures[host] >= self.threshold:
+            if host not in self.opened_at:
+                logging.info("Circuit breaker tripped for %s after %s failures in a row", host, self.failures[host])
+            self.opened_at[host] = time.monotonic()
+            self.tripped_hosts.add(host)
+
+    def report(self):
+        if len(self.tripped_hosts) == 0:
+            return
+
+        logging.info(
+            "Circuit breaker tripped for %s hosts and skipped %s requests: %s",
+            len(self.tripped_hosts),
+            self.skipped_requests,
+            ", ".join(sorted(self.tripped_hosts)),
+        )
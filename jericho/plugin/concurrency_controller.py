@@ -0,0 +1,121 @@
+#!/bin/python3
+import asyncio
+import logging
+import resource
+import sys
+import typing
+
+
+class ConcurrencyController:
+    """
+    AIMD controller for the amount of requests in flight. Every window of finished
+    requests it adds a few slots while failures and latency stay healthy, and halves
+    the slots when timeouts or connect errors spike. It never goes above what the
+    file descriptor limit allows.
+    """
+
+    def __init__(
+        self,
+        initial: int = 100,
+        minimum: int = 10,
+        maximum: int = 1000,
+        adaptive: bool = True,
+        window: int = 100,
+    ):
+        self.maximum = max(1, min(maximum, self.split_fd_budget(self.fd_budget())["connections"]))
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = max(self.minimum, min(initial, self.maximum))
+        self.adaptive = adaptive
+        self.window = window
+        self.increase_step = max(1, self.maximum // 50)
+        self.max_failure_rate = 0.1
+        self.latency_tolerance = 2.0
+        self.baseline_latency: typing.Optional[float] = None
+        self.active = 0
+        self.completed = 0
+        self.failures = 0
+        self.latency_total = 0.0
+        self.condition: asyncio.Condition = asyncio.Condition()
+
+        logging.info(
+            "Concurrency starts at %s (min %s, max %s, adaptive: %s)",
+            self.limit,
+            self.minimum,
+            self.maximum,
+            self.adaptive,
+        )
+
+    @staticmethod
+    def fd_budget(reserved: int = 64) -> int:
+        """The file descriptors the sockets of a scan may use, the rest is kept for the databases, zmq and logs"""
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft_limit == resource.RLIM_INFINITY:
+            return sys.maxsize
+
+        return max(1, soft_limit - reserved)
+
+    @staticmethod
+    def split_fd_budget(budget: int, liveness: int = 0, prefetch: int = 0, baseline: int = 0) -> typing.Dict[str, int]:
+        """
+        Split the file descriptors between everything that has sockets open at the same time. A prefetch lookup
+        holds a UDP socket and a liveness check a UDP and then a TCP socket. A pooled connection, in use or idle,
+        holds one and another for its DNS lookup while it connects. The scan gets the connections that are left,
+        the 404 pages (baseline) get their own pool
+        """
+        prefetch = min(prefetch, max(1, budget // 8))
+        liveness = min(liveness, max(1, budget // 16))
+        baseline = min(baseline, max(1, budget // 32))
+        connections = max(1, (budget - prefetch - liveness * 2 - baseline * 2) // 2)
+
+        return {"connections": connections, "liveness": liveness, "prefetch": prefetch, "baseline": baseline}
+
+    async def acquire(self):
+        """Wait until there is a free slot"""
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < self.limit)
+            self.active = self.active + 1
+
+    async def release(self, latency: float, failed: bool):
+        """Give back a slot and record how the request went"""
+        async with self.condition:
+            self.active = self.active - 1
+            self._record(latency, failed)
+            self.condition.notify_all()
+
+    def _record(self, latency: float, failed: bool):
+        self.completed = self.completed + 1
+        self.latency_total = self.latency_total + latency
+        if failed:
+            self.failures = self.failures + 1
+
+        if self.completed < self.window:
+            return
+
+        failure_rate = self.failures / self.completed
+        average_latency = self.latency_total / self.completed
+        self.completed = 0
+        self.failures = 0
+        self.latency_total = 0.0
+
+        if not self.adaptive:
+            return
+
+        # The baseline follows the best latency we've seen but is allowed to drift up slowly
+        if self.baseline_latency is None:
+            self.baseline_latency = average_latency
+        self.baseline_latency = min(average_latency, self.baseline_latency * 1.1)
+
+        if failure_rate > self.max_failure_rate or average_latency > self.baseline_latency * self.latency_tolerance:
+            new_limit = max(self.minimum, self.limit // 2)
+        else:
+            new_limit = min(self.maximum, self.limit + self.increase_step)
+
+        if new_limit != self.limit:
+            logging.info(
+                "Changing concurrency from %s to %s (failure rate %.2f, average latency %.2fs)",
+                self.limit,
+                new_limit,
+                failure_rate,
+                average_latency,
+            )
+            self.limit = new_limit
@@ -0,0 +1,146 @@
+#!/bin/python3
+import asyncio
+import logging
+import time
+import typing
+import aiosqlite
+from jericho.plugin.metrics import Metrics
+
+
+class DatabaseWriter:
+    """
+    One task that owns one aiosqlite connection and writes the rows of a scan in batches. A commit is an fsync,
+    so instead of one transaction per row the rows are buffered and written with executemany in one transaction
+    when there are `batch_size` of them or the oldest waited `flush_interval` seconds. write() blocks while
+    `max_pending` rows wait so a slow disk slows the scan down instead of filling the memory. The WAL is
+    checkpointed every `checkpoint_interval` seconds so it doesn't grow while the readers keep it busy
+    """
+
+    def __init__(
+        self,
+        database: str,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        max_pending: int = 5000,
+        max_retries: int = 3,
+        pragmas: typing.List[str] = None,
+        checkpoint_interval: float = 60,
+        metrics: Metrics = None,
+    ):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.pragmas = pragmas or []
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpointed_at: float = time.monotonic()
+        self.metrics = metrics or Metrics()
+        self.db = None
+        self.pending: typing.Dict[str, list] = {}
+        self.pending_rows: int = 0
+        self.condition: typing.Optional[asyncio.Condition] = None
+        self.task: typing.Optional[asyncio.Task] = None
+        self.closing: bool = False
+        self.written_rows: int = 0
+        self.dropped_rows: int = 0
+        self.batches: int = 0
+
+    async def start(self):
+        self.db = await aiosqlite.connect(self.database)
+        for pragma in self.pragmas:
+            await self.db.execute(pragma)
+
+        self.condition = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._run())
+
+    async def write(self, statement: str, row: tuple):
+        """Queue a row for a statement, it is written with the next batch"""
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.pending_rows < self.max_pending or self.closing)
+            self.pending.setdefault(statement, []).append(row)
+            self.pending_rows = self.pending_rows + 1
+            if self.pending_rows >= self.batch_size:
+                self.condition.notify_all()
+
+    async def _run(self):
+        while True:
+            async with self.condition:
+                try:
+                    await asyncio.wait_for(
+                        self.condition.wait_for(lambda: self.pending_rows >= self.batch_size or self.closing),
+                        self.flush_interval,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+                # The rows that are pending when close() is seen make up the last batch
+                batch, self.pending, rows = self.pending, {}, self.pending_rows
+                self.pending_rows = 0
+                closing = self.closing
+                self.condition.notify_all()
+
+            if rows:
+                await self._flush(batch, rows)
+
+            if closing:
+                await self._checkpoint("TRUNCATE")
+                return
+
+            if self.checkpoint_interval and time.monotonic() - self.checkpointed_at >= self.checkpoint_interval:
+                await self._checkpoint("PASSIVE")
+
+    async def _flush(self, batch: typing.Dict[str, list], rows: int):
+        """Write every statement of a batch in one transaction, a batch that keeps failing is dropped"""
+        for attempt in range(1, self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                for statement, statement_rows in batch.items():
+                    await self.db.executemany(statement, statement_rows)
+                await self.db.commit()
+
+                self.metrics.observe("db_flush_seconds", time.monotonic() - started)
+                self.written_rows = self.written_rows + rows
+                self.batches = self.batches + 1
+                return
+            except Exception as err:
+                logging.warning("Could not write %s rows to the database (attempt %s): %s", rows, attempt, err)
+                await self.db.rollback()
+                await asyncio.sleep(0.1 * attempt)
+
+        logging.error("Dropped %s rows after %s failed attempts to write them", rows, self.max_retries)
+        self.dropped_rows = self.dropped_rows + rows
+
+    async def _checkpoint(self, mode: str):
+        """Copy the WAL into the database, PASSIVE never waits for the other connections"""
+        self.checkpointed_at = time.monotonic()
+        try:
+            async with self.db.execute(f"PRAGMA wal_checkpoint({mode})") as cursor:
+                busy, wal_pages, checkpointed_pages = await cursor.fetchone()
+            logging.debug("Checkpointed %s of %s WAL pages (busy: %s)", checkpointed_pages, wal_pages, busy)
+        except Exception as err:
+            logging.warning("Could not checkpoint the database: %s", err)
+
+    async def close(self):
+        """Write what is left and close the connection"""
+        if self.task is None:
+            return
+
+        async with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+
+        await self.task
+        await self.db.close()
+        self.task = None
+
+    def report(self):
+        histogram = self.metrics.histograms["db_flush_seconds"]
+        logging.info(
+            "Database writer: %s rows in %s batches, %s dropped, flush p50 %.1f ms p99 %.1f ms",
+            self.written_rows,
+            self.batches,
+            self.dropped_rows,
+            histogram.quantile(0.5) * 1000,
+            histogram.quantile(0.99) * 1000,
+        )
@@ -0,0 +1,158 @@
+#!/bin/python3
+import asyncio
+import ipaddress
+import logging
+import time
+import typing
+from collections import OrderedDict
+from jericho.repositories.dns_cache_lookup import DnsCacheLookup
+
+
+class DnsCache:
+    """
+    One DNS cache per engine that every resolver of the engine shares, so a domain is resolved once
+    instead of once per endpoint. Answers are kept for the TTL of their records, concurrent lookups
+    of the same name wait for a single query and the static hosts (e.g from --resolve-list) never expire.
+    Names that don't exist are remembered for `negative_ttl` seconds, the ones that a second nameserver
+    confirmed stay in `nxdomain` for the rest of the run so their queued work can be dropped.
+    With a DnsCacheLookup the answers that haven't expired are kept between runs.
+    At most `max_entries` answers and negative names are kept, the oldest one is dropped first
+    """
+
+    def __init__(
+        self,
+        static_hosts: dict = None,
+        default_ttl: float = 300,
+        max_entries: int = 100000,
+        negative_ttl: float = 60,
+        dns_cache_lookup: DnsCacheLookup = None,
+    ):
+        self.static_hosts = static_hosts or {}
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.dns_cache_lookup = dns_cache_lookup
+        self.entries: typing.Dict[typing.Tuple[str, typing.Any], typing.Tuple[list, float]] = OrderedDict()
+        self.in_flight: typing.Dict[typing.Tuple[str, typing.Any], asyncio.Task] = {}
+        self.negative: typing.Dict[str, float] = OrderedDict()
+        self.nxdomain: typing.Set[str] = set()
+        self.hits: int = 0
+        self.negative_hits: int = 0
+        self.lookups: int = 0
+        self.coalesced: int = 0
+        self.loaded: int = 0
+
+    def _get_expires_at(self, addresses: list, now: float) -> float:
+        """The addresses from aiodnsresolver know when their record expires in loop time"""
+        return min(
+            (getattr(address, "expires_at", now + self.default_ttl) for address in addresses),
+            default=now + self.default_ttl,
+        )
+
+    def _store(self, entries: OrderedDict, key: typing.Any, value: typing.Any):
+        """Insert at the end and drop the oldest entries past max_entries, both in O(1)"""
+        entries.pop(key, None)
+        entries[key] = value
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    async def _lookup(self, key: typing.Tuple[str, typing.Any], query: typing.Callable[[], typing.Awaitable[list]]) -> list:
+        self.lookups = self.lookups + 1
+        addresses = await query()
+
+        now = asyncio.get_running_loop().time()
+        expires_at = self._get_expires_at(addresses, now)
+        self._store(self.entries, key, (addresses, expires_at))
+
+        if self.dns_cache_lookup is not None:
+            self.dns_cache_lookup.save(key[0], [str(address) for address in addresses], time.time() + expires_at - now, key[1])
+
+        return addresses
+
+    def _lookup_done(self, key: typing.Tuple[str, typing.Any], task: asyncio.Task):
+        self.in_flight.pop(key, None)
+
+        # The waiters get the error, this only keeps asyncio quiet when they were all cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def get(
+        self,
+        host: str,
+        record_type: typing.Any,
+        query: typing.Callable[[], typing.Awaitable[list]],
+    ) -> list:
+        """Get the addresses of a host, query is only awaited when nothing is cached or in flight"""
+        if host in self.static_hosts:
+            return [self.static_hosts[host]]
+
+        key = (host, record_type)
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > asyncio.get_running_loop().time():
+            self.hits = self.hits + 1
+            return entry[0]
+
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(key, query))
+            task.add_done_callback(lambda done_task: self._lookup_done(key, done_task))
+            self.in_flight[key] = task
+        else:
+            self.coalesced = self.coalesced + 1
+
+        # One caller giving up shouldn't cancel the lookup for everyone else
+        return await asyncio.shield(task)
+
+    async def load(self):
+        """Load the answers of earlier runs that haven't expired, they are saved in loop time like the rest"""
+        if self.dns_cache_lookup is None:
+            return
+
+        await self.dns_cache_lookup.connect_db()
+        now = asyncio.get_running_loop().time()
+        wall_time = time.time()
+        # Only the answers that expire last are loaded, the ones that expire first are stored first and dropped first
+        for key, (addresses, expires_at) in (await self.dns_cache_lookup.load(self.max_entries)).items():
+            self._store(
+                self.entries, key, ([ipaddress.ip_address(address) for address in addresses], now + expires_at - wall_time)
+            )
+
+        self.loaded = len(self.entries)
+        logging.info("Loaded the DNS answers of %s domains from earlier scans", self.loaded)
+
+    async def close(self):
+        if self.dns_cache_lookup is not None:
+            await self.dns_cache_lookup.close()
+
+    def add_negative(self, host: str, confirmed: bool = False):
+        """Remember that a host doesn't exist"""
+        self._store(self.negative, host, asyncio.get_running_loop().time() + self.negative_ttl)
+        if confirmed:
+            self.nxdomain.add(host)
+
+    def is_negative(self, host: str) -> bool:
+        expires_at = self.negative.get(host)
+        if expires_at is None:
+            return False
+
+        if expires_at <= asyncio.get_running_loop().time():
+            del self.negative[host]
+            return False
+
+        self.negative_hits = self.negative_hits + 1
+        return True
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.negative = OrderedDict()
+
+    def report(self):
+        logging.info(
+            "DNS cache: %s lookups, %s answered from the cache, %s waited for a lookup in flight, "
+            "%s answered from the negative cache, %s domains do not exist",
+            self.lookups,
+            self.hits,
+            self.coalesced,
+            self.negative_hits,
+            len(self.nxdomain),
+        )
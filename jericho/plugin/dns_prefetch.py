@@ -0,0 +1,128 @@
+#!/bin/python3
+import asyncio
+import json
+import logging
+import os
+import typing
+from jericho.helpers import get_hostname, is_ip_address
+from jericho.plugin.dns_resolver import DnsRecordMissing
+
+
+class DnsPrefetch:
+    """
+    Resolves every unique host of the input with many lookups in flight at once, spread over the whole
+    nameserver list like massdns does. It stays up to `lookahead` domains ahead of the domain the producer
+    is at, so the answers are in the shared DNS cache before a worker connects and are not expired
+    by the time they are needed. A worker that gets to a host first waits for the same lookup.
+    Nothing is kept per host, a domain that is in the input twice is answered by the DNS cache.
+    With an `output` path the addresses of every resolved host and the hosts that are NXDOMAIN or SERVFAIL
+    are appended to it as one JSON object per line, in batches of `buffer_size`
+    """
+
+    def __init__(
+        self,
+        get_resolver: typing.Callable,
+        concurrency: int = 500,
+        lookahead: int = 5000,
+        timeout: float = 10,
+        output: str = None,
+        buffer_size: int = 1000,
+    ):
+        self.get_resolver = get_resolver
+        self.concurrency = concurrency
+        self.lookahead = lookahead
+        self.timeout = timeout
+        self.output = output
+        self.buffer_size = buffer_size
+        self.buffer: typing.List[str] = []
+        self.domains: int = 0
+        self.frontier: int = 0
+        self.frontier_moved: asyncio.Event = asyncio.Event()
+        self.resolved: int = 0
+        self.nxdomain: int = 0
+        self.servfail: int = 0
+
+    def get_hosts(self, domains: typing.Iterable[str]) -> typing.Iterator[typing.Tuple[int, str]]:
+        """The hosts that need a lookup with the index of their domain, in the order they are fetched"""
+        for position, domain in enumerate(domains):
+            host = get_hostname(domain)
+            if host and not is_ip_address(host):
+                yield position, host
+
+    def seen(self, position: int):
+        """Move the frontier forward, called by the producer with the domain index of every work item it queues"""
+        if position > self.frontier:
+            self.frontier = position
+            self.frontier_moved.set()
+
+    async def _wait_for_frontier(self, position: int):
+        while self.lookahead and position >= self.frontier + self.lookahead:
+            self.frontier_moved.clear()
+            await self.frontier_moved.wait()
+
+    async def _resolve(self, host: str):
+        try:
+            addresses = await asyncio.wait_for(self.get_resolver().resolve(host), self.timeout)
+        except DnsRecordMissing:
+            self.nxdomain = self.nxdomain + 1
+            self._record(host, "nxdomain")
+            return
+        # A malformed host (e.g an empty or too long label) fails its IDNA encoding with a UnicodeError
+        except (OSError, asyncio.TimeoutError, ValueError) as err:
+            logging.debug("Prefetch could not resolve %s: %s", host, err)
+            self.servfail = self.servfail + 1
+            self._record(host, "servfail")
+            return
+
+        if addresses:
+            self.resolved = self.resolved + 1
+            self._record(host, "resolved", [address["host"] for address in addresses])
+
+    def _record(self, host: str, status: str, addresses: typing.List[str] = None):
+        if self.output is None:
+            return
+
+        record = {"host": host, "status": status}
+        if addresses is not None:
+            record["addresses"] = addresses
+
+        self.buffer.append(json.dumps(record, separators=(",", ":")))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        # Every scan process of a workload appends to the same file, one write per flush keeps their lines apart
+        file = os.open(self.output, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(file, ("\n".join(self.buffer) + "\n").encode("utf-8"))
+        finally:
+            os.close(file)
+
+        self.buffer = []
+
+    async def _worker(self, hosts: typing.Iterator[typing.Tuple[int, str]]):
+        for position, host in hosts:
+            await self._wait_for_frontier(position)
+            await self._resolve(host)
+
+    async def run(self, domains: typing.List[str]):
+        """Resolve the hosts of the domains, the workers share one iterator so the hosts are taken in order"""
+        self.domains = len(domains)
+        hosts = self.get_hosts(domains)
+        logging.info("Prefetching DNS for %s domains", self.domains)
+        await asyncio.gather(*[self._worker(hosts) for _ in range(0, self.concurrency)])
+
+    def report(self):
+        self.flush()
+        if self.output is not None:
+            logging.info("Wrote the DNS prefetch results to %s", self.output)
+
+        logging.info(
+            "DNS prefetch: %s hosts resolved, %s NXDOMAIN, %s SERVFAIL or timed out",
+            self.resolved,
+            self.nxdomain,
+            self.servfail,
+        )
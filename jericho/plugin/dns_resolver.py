@@ -0,0 +1,171 @@
+#!/bin/python3
+import asyncio
+import contextvars
+import secrets
+import socket
+import logging
+import time
+import typing
+import aiohttp
+from aiodnsresolver import (
+    TYPES,
+    Resolver,
+    DnsError,
+    DnsRecordDoesNotExist,
+)
+from jericho.plugin.dns_cache import DnsCache
+from jericho.plugin.nameserver_health import NameserverHealth
+
+logging.getLogger("aiodnsresolver").setLevel(logging.CRITICAL)
+
+# The nameservers a query was sent to and when, so the one that answered can be credited
+ATTEMPTS: contextvars.ContextVar = contextvars.ContextVar("attempts", default=None)
+# A retest is sent to one nameserver only
+PINNED: contextvars.ContextVar = contextvars.ContextVar("pinned", default=None)
+
+# A name that doesn't exist, a nameserver that answers it with an address is lying
+PROBE_DOMAIN = "example.com"
+
+
+class DnsResolveError(OSError):
+    pass
+
+
+class DnsRecordMissing(DnsResolveError):
+    pass
+
+
+class AioHttpDnsResolver(aiohttp.abc.AbstractResolver):
+    def __init__(self, nameservers, dns_cache: DnsCache = None, nameserver_health: NameserverHealth = None):
+        """The DNS cache and the nameserver health are shared by every resolver of an engine"""
+        super().__init__()
+        self.resolver, self.clear_cache = Resolver(get_nameservers=self.get_nameservers)
+        self.nameservers = nameservers
+        self.dns_cache = dns_cache or DnsCache()
+        self.nameserver_health = nameserver_health or NameserverHealth(nameservers)
+        self.probes: typing.Set[asyncio.Task] = set()
+
+    def _start_probe(self, server: str, retest: bool = False):
+        task = asyncio.ensure_future(self._probe(server, retest))
+        self.probes.add(task)
+        task.add_done_callback(self.probes.discard)
+
+    def _record_failure(self, attempt: list):
+        server, started = attempt
+        # Getting asked for the next nameserver before the timeout means this one answered with an error
+        if time.monotonic() - started >= self.nameserver_health.timeout * 0.9:
+            self.nameserver_health.record_timeout(server)
+        else:
+            self.nameserver_health.record_error(server)
+
+    def _record_answers(self, attempts: list):
+        for server, started in attempts:
+            self.nameserver_health.record_answer(server, time.monotonic() - started)
+        attempts.clear()
+
+    async def get_nameservers(self, _, __):
+        timeout = self.nameserver_health.timeout
+        pinned = PINNED.get()
+        if pinned is not None:
+            yield (timeout, (pinned, 53))
+            return
+
+        for server in self.nameserver_health.due_for_retest():
+            self._start_probe(server, retest=True)
+
+        # A new round of a CNAME chain means the last nameserver that was asked answered
+        attempts = ATTEMPTS.get()
+        if attempts:
+            self._record_answers(attempts)
+
+        # One nameserver at a time so we know which one answered, or didn't
+        for server in self.nameserver_health.choose():
+            if self.nameserver_health.needs_probe(server):
+                self._start_probe(server)
+
+            if attempts is not None:
+                attempts.append([server, time.monotonic()])
+
+            yield (timeout, (server, 53))
+
+            if attempts:
+                self._record_failure(attempts.pop())
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        # Use ipv4 unless requested otherwise
+        # This is consistent with the default aiohttp + aiodns AsyncResolver
+        record_type = \
+            TYPES.AAAA if family == socket.AF_INET6 else \
+            TYPES.A
+
+        # Only A records are asked for (see the connector) so a name without them is as good as missing
+        if self.dns_cache.is_negative(host):
+            raise DnsRecordMissing(0, '{} does not exist'.format(host))
+
+        ip_addresses = await self.dns_cache.get(host, record_type, lambda: self._query(host, record_type))
+
+        return [{
+            'hostname': host,
+            'host': str(ip_address),
+            'port': port,
+            'family': family,
+            'proto': socket.IPPROTO_TCP,
+            'flags': socket.AI_NUMERICHOST,
+        } for ip_address in ip_addresses]
+
+    async def _query(self, host, record_type):
+        attempts = []
+        token = ATTEMPTS.set(attempts)
+        try:
+            addresses = await self.resolver(host, record_type)
+            self._record_answers(attempts)
+            return addresses
+        except DnsRecordDoesNotExist as does_not_exist:
+            answered_by = [server for server, _ in attempts]
+            self._record_answers(attempts)
+            self.dns_cache.add_negative(host, await self._confirm_missing(host, record_type, answered_by))
+            raise DnsRecordMissing(0, '{} does not exist'.format(host)) from does_not_exist
+        except DnsError as dns_error:
+            raise DnsResolveError(0, '{} failed to resolve'.format(host)) from dns_error
+        finally:
+            ATTEMPTS.reset(token)
+
+    async def _confirm_missing(self, host, record_type, answered_by: typing.List[str]) -> bool:
+        """Ask a second nameserver, one broken or lying nameserver shouldn't make us drop a domain"""
+        others = [server for server in self.nameserver_health.choose() if server not in answered_by]
+        if not others:
+            return True
+
+        token = PINNED.set(others[0])
+        try:
+            await self.resolver(host, record_type)
+            return False
+        except DnsRecordDoesNotExist:
+            return True
+        except DnsError:
+            return False
+        finally:
+            PINNED.reset(token)
+
+    async def _probe(self, server: str, retest: bool):
+        """Ask one nameserver for a name that doesn't exist, it should say so. A retest decides if it comes back"""
+        token = PINNED.set(server)
+        started = time.monotonic()
+        try:
+            await self.resolver(f"jericho-{secrets.token_hex(8)}.{PROBE_DOMAIN}", TYPES.A)
+            logging.debug("Nameserver %s answered a name that does not exist", server)
+            self.nameserver_health.record_bogus(server)
+        except DnsRecordDoesNotExist:
+            if retest:
+                self.nameserver_health.readmit(server, time.monotonic() - started)
+        except DnsError:
+            if retest:
+                self.nameserver_health.eject(server)
+        finally:
+            PINNED.reset(token)
+
+    async def close(self):
+        for probe in self.probes:
+            probe.cancel()
+        await asyncio.gather(*self.probes, return_exceptions=True)
+        await self.clear_cache()
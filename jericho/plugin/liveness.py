@@ -0,0 +1,140 @@
+#!/bin/python3
+import asyncio
+import logging
+import typing
+from urllib.parse import urlparse
+from jericho.helpers import add_missing_schemes_to_domain, is_ip_address
+
+# The state of a domain in Liveness.states
+UNKNOWN = 0
+ALIVE = 1
+DEAD = 2
+
+
+class Liveness:
+    """
+    Resolves a host and tries one TCP connect before any of its endpoints are fetched.
+    The check runs once per host and port, every endpoint of that host waits for the same result,
+    so a dead domain costs one lookup and one connect instead of one per endpoint.
+    The result is kept in one byte per input domain, the work items are endpoint major so a host comes
+    round again after every other domain. Only the checks that are running are kept by host and port.
+    """
+
+    def __init__(self, get_resolver: typing.Callable, timeout: float = 5, concurrency: int = 500, domains: int = 0):
+        self.get_resolver = get_resolver
+        self.timeout = timeout
+        self.semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+        self.states: bytearray = bytearray(domains)
+        self.checks: typing.Dict[str, asyncio.Future] = {}
+        self.alive: int = 0
+        self.unresolvable: int = 0
+        self.unreachable: int = 0
+        self.skipped_requests: int = 0
+
+    def _get_host_and_port(self, url: str) -> typing.Tuple[str, int]:
+        parsed_url = urlparse(add_missing_schemes_to_domain(url))
+        port = parsed_url.port or (443 if parsed_url.scheme == "https" else 80)
+        return parsed_url.hostname, port
+
+    async def _resolve(self, host: str, port: int) -> typing.Optional[str]:
+        if is_ip_address(host):
+            return host
+
+        try:
+            addresses = await asyncio.wait_for(self.get_resolver().resolve(host, port), self.timeout)
+        # A malformed host (e.g an empty or too long label) fails its IDNA encoding with a UnicodeError
+        except (OSError, asyncio.TimeoutError, ValueError) as err:
+            logging.debug("Liveness could not resolve %s: %s", host, err)
+            return None
+
+        if len(addresses) == 0:
+            return None
+
+        return addresses[0]["host"]
+
+    async def _check(self, host: str, port: int) -> bool:
+        async with self.semaphore:
+            ip_address = await self._resolve(host, port)
+            if ip_address is None:
+                self.unresolvable = self.unresolvable + 1
+                return False
+
+            try:
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip_address, port), self.timeout
+                )
+                writer.close()
+            except (OSError, asyncio.TimeoutError, ValueError) as err:
+                logging.debug("Liveness could not connect to %s:%s: %s", host, port, err)
+                self.unreachable = self.unreachable + 1
+                return False
+
+        self.alive = self.alive + 1
+        return True
+
+    async def _remember(self, check: typing.Awaitable[bool], domain_index: typing.Optional[int]) -> bool:
+        """Store the result before the check is done, so a worker that comes after it never starts it again"""
+        alive = await check
+        self._set_state(domain_index, ALIVE if alive else DEAD)
+        return alive
+
+    def _set_state(self, domain_index: typing.Optional[int], state: int):
+        if domain_index is not None and domain_index < len(self.states):
+            self.states[domain_index] = state
+
+    def _get_state(self, domain_index: typing.Optional[int]) -> int:
+        if domain_index is not None and domain_index < len(self.states):
+            return self.states[domain_index]
+
+        return UNKNOWN
+
+    async def is_alive(self, url: str, domain_index: int = None) -> bool:
+        """Check if the host of a url is reachable, with a domain index the result is remembered for the rest of the run"""
+        state = self._get_state(domain_index)
+        if state == UNKNOWN:
+            alive = await self._wait_for_check(url, domain_index)
+        else:
+            alive = state == ALIVE
+
+        if not alive:
+            self.skipped_requests = self.skipped_requests + 1
+
+        return alive
+
+    async def _wait_for_check(self, url: str, domain_index: typing.Optional[int]) -> bool:
+        try:
+            host, port = self._get_host_and_port(url)
+        except ValueError as err:
+            logging.debug("Liveness could not parse %s: %s", url, err)
+            host = None
+
+        if host is None:
+            self._set_state(domain_index, DEAD)
+            return False
+
+        key = f"{host}:{port}"
+        if key not in self.checks:
+            check = asyncio.ensure_future(self._remember(self._check(host, port), domain_index))
+            check.add_done_callback(lambda _: self.checks.pop(key, None))
+            self.checks[key] = check
+
+        # Shielded so a cancelled worker doesn't cancel the check for everyone else waiting on it
+        alive = await asyncio.shield(self.checks[key])
+        self._set_state(domain_index, ALIVE if alive else DEAD)
+        return alive
+
+    async def close(self):
+        """Cancel checks that are still running"""
+        running = list(self.checks.values())
+        for check in running:
+            check.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    def report(self):
+        logging.info(
+            "Liveness: %s hosts alive, %s did not resolve, %s unreachable, skipped %s requests",
+            self.alive,
+            self.unresolvable,
+            self.unreachable,
+            self.skipped_requests,
+        )
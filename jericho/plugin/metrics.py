@@ -0,0 +1,195 @@
+#!/bin/python3
+import logging
+import os
+import time
+import typing
+import aiohttp
+from aiohttp import web
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """A cumulative histogram in the shape Prometheus expects"""
+
+    def __init__(self, buckets: typing.Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts: typing.List[int] = [0] * len(buckets)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float):
+        self.count = self.count + 1
+        self.sum = self.sum + value
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] = self.counts[index] + 1
+
+    def quantile(self, quantile: float) -> float:
+        """Estimate a quantile from the buckets the same way histogram_quantile does in Prometheus"""
+        if self.count == 0:
+            return 0.0
+
+        rank = quantile * self.count
+        lower_bound = 0.0
+        lower_count = 0
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= rank:
+                if count == lower_count:
+                    return bound
+
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+
+            lower_bound = bound
+            lower_count = count
+
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Counters and latency histograms of a scan. They can be scraped in the
+    Prometheus text format while the scan runs and are written to a textfile when it is done.
+    The labels are put on every series so the scan processes of --processes can be told apart
+    """
+
+    counter_help = {
+        "requests": "Requests that got an answer or an error",
+        "bytes": "Bytes of response bodies downloaded",
+        "errors": "Failed requests by error type",
+        "skipped": "Requests that were not sent by reason",
+    }
+
+    histogram_help = {
+        "dns_seconds": "Time to resolve a host",
+        "connect_seconds": "Time to open a connection, including DNS and TLS",
+        "ttfb_seconds": "Time from sending a request until the response headers arrived",
+        "total_seconds": "Time of a request including redirects and reading the body",
+        "db_flush_seconds": "Time to write a batch of rows to the database",
+    }
+
+    def __init__(self, labels: typing.Dict[str, str] = None):
+        self.labels: typing.Dict[str, str] = labels or {}
+        self.started: float = time.monotonic()
+        self.counters: typing.Dict[typing.Tuple[str, typing.Tuple], float] = {}
+        self.histograms: typing.Dict[str, Histogram] = {
+            name: Histogram() for name in self.histogram_help
+        }
+        self.gauges: typing.Dict[str, typing.Tuple[str, typing.Callable[[], float]]] = {}
+
+    def inc(self, name: str, value: float = 1, labels: typing.Dict[str, str] = None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float):
+        self.histograms[name].observe(value)
+
+    def add_gauge(self, name: str, help_text: str, get_value: typing.Callable[[], float]):
+        """A gauge is read when the metrics are rendered, so it always shows the current value"""
+        self.gauges[name] = (help_text, get_value)
+
+    def error(self, error_type: str):
+        self.inc("errors", labels={"type": error_type})
+
+    def get(self, name: str, labels: typing.Dict[str, str] = None) -> float:
+        return self.counters.get((name, tuple(sorted((labels or {}).items()))), 0)
+
+    def requests_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.get("requests") / elapsed if elapsed > 0 else 0.0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Time the DNS, connect and first byte phases of every request in a session"""
+
+        async def on_request_start(session, context, params):
+            context.request_start = time.monotonic()
+
+        async def on_request_end(session, context, params):
+            self.observe("ttfb_seconds", time.monotonic() - context.request_start)
+
+        async def on_connection_create_start(session, context, params):
+            context.connect_start = time.monotonic()
+
+        async def on_connection_create_end(session, context, params):
+            self.observe("connect_seconds", time.monotonic() - context.connect_start)
+
+        async def on_dns_resolvehost_start(session, context, params):
+            context.dns_start = time.monotonic()
+
+        async def on_dns_resolvehost_end(session, context, params):
+            self.observe("dns_seconds", time.monotonic() - context.dns_start)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+
+        return trace_config
+
+    def _format_labels(self, labels: typing.Tuple = ()) -> str:
+        labels = tuple(self.labels.items()) + labels
+        if not labels:
+            return ""
+
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format"""
+        lines = []
+
+        for name, help_text in self.counter_help.items():
+            lines.append(f"# HELP jericho_{name}_total {help_text}")
+            lines.append(f"# TYPE jericho_{name}_total counter")
+            rows = [(key[1], value) for key, value in self.counters.items() if key[0] == name] or [((), 0)]
+            for labels, value in sorted(rows):
+                lines.append(f"jericho_{name}_total{self._format_labels(labels)} {value}")
+
+        lines.append("# HELP jericho_requests_per_second Requests per second since the scan started")
+        lines.append("# TYPE jericho_requests_per_second gauge")
+        lines.append(f"jericho_requests_per_second{self._format_labels()} {self.requests_per_second():.3f}")
+
+        for name, (help_text, get_value) in self.gauges.items():
+            lines.append(f"# HELP jericho_{name} {help_text}")
+            lines.append(f"# TYPE jericho_{name} gauge")
+            lines.append(f"jericho_{name}{self._format_labels()} {get_value()}")
+
+        for name, help_text in self.histogram_help.items():
+            histogram = self.histograms[name]
+            lines.append(f"# HELP jericho_{name} {help_text}")
+            lines.append(f"# TYPE jericho_{name} histogram")
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts + [histogram.count]):
+                lines.append(f"jericho_{name}_bucket{self._format_labels((('le', bound),))} {count}")
+            lines.append(f"jericho_{name}_sum{self._format_labels()} {histogram.sum:.6f}")
+            lines.append(f"jericho_{name}_count{self._format_labels()} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Write the metrics for the node exporter textfile collector, the rename makes it atomic"""
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(self.render())
+
+        os.replace(temporary_path, path)
+        logging.info("Wrote metrics to %s", path)
+
+    async def serve(self, host: str, port: int) -> web.AppRunner:
+        """Expose /metrics on a local port, the caller cleans up the returned runner"""
+
+        async def handle_metrics(request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logging.info("Serving metrics on http://%s:%s/metrics", host, port)
+
+        return runner
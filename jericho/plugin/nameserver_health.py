@@ -0,0 +1,168 @@
+#!/bin/python3
+import logging
+import random
+import time
+import typing
+
+
+class NameserverHealth:
+    """
+    Keeps the latency, timeouts and bogus answers of every nameserver so queries go to the fastest healthy ones.
+    A public resolver list has plenty of dead, slow and lying servers. A server that times out `eject_after` times
+    in a row or hijacks a name that doesn't exist is ejected, it gets re-tested after `retest_after` seconds and
+    the wait doubles every time it fails again. The scores of the last run are the starting point of the next one
+    """
+
+    def __init__(
+        self,
+        nameservers: typing.List[str],
+        scores: typing.Dict[str, dict] = None,
+        timeout: float = 0.5,
+        max_attempts: int = 5,
+        spread: int = 20,
+        eject_after: int = 3,
+        retest_after: float = 60,
+    ):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.spread = spread
+        self.eject_after = eject_after
+        self.retest_after = retest_after
+        self.servers: typing.Dict[str, dict] = {}
+        self.consecutive_timeouts: typing.Dict[str, int] = {}
+        self.ejected: typing.Dict[str, float] = {}
+        self.backoff: typing.Dict[str, float] = {}
+        self.probed: typing.Set[str] = set()
+        self.ranking: typing.List[str] = []
+        self.ranked_at: float = float("-inf")
+        self.next_pick: int = 0
+        self.ejections: int = 0
+
+        # Unknown servers are shuffled so the first queries are spread over the list
+        shuffled = list(dict.fromkeys(nameservers))
+        random.shuffle(shuffled)
+        for server in shuffled:
+            self.servers[server] = {"latency": None, "queries": 0, "timeouts": 0, "errors": 0, "bogus": 0}
+
+        for server, score in (scores or {}).items():
+            if server in self.servers:
+                self._load_score(server, score)
+
+    def _load_score(self, server: str, score: dict):
+        # Halve the old counts so a server that was bad a long time ago can recover
+        stats = self.servers[server]
+        stats["latency"] = score.get("latency")
+        stats["queries"] = (score.get("queries") or 0) // 2
+        stats["timeouts"] = (score.get("timeouts") or 0) // 2
+        stats["bogus"] = score.get("bogus") or 0
+
+        if stats["bogus"] or (stats["queries"] >= 5 and stats["timeouts"] * 2 > stats["queries"]):
+            self.eject(server)
+
+    def score(self, server: str) -> float:
+        """The expected seconds until an answer, an unknown server is assumed to be average so it gets tried"""
+        stats = self.servers[server]
+        latency = stats["latency"] if stats["latency"] is not None else self.timeout / 2
+        failures = stats["timeouts"] + stats["errors"] / 2
+        return latency + failures / (stats["queries"] + 1) * self.timeout
+
+    def _rank(self):
+        now = time.monotonic()
+        if now - self.ranked_at < 1:
+            return
+
+        self.ranking = sorted((server for server in self.servers if server not in self.ejected), key=self.score)
+        self.ranked_at = now
+
+    def choose(self) -> typing.List[str]:
+        """
+        The nameservers to try for one query in order. The first one rotates over the `spread` fastest servers
+        so a handful of servers don't get every query and start rate limiting us
+        """
+        self._rank()
+        healthy = [server for server in self.ranking[: self.spread + self.max_attempts] if server not in self.ejected]
+
+        # Everything is ejected, trying a bad server is better than not trying at all
+        if not healthy:
+            return list(self.servers)[: self.max_attempts]
+
+        first = healthy[self.next_pick % min(self.spread, len(healthy))]
+        self.next_pick = self.next_pick + 1
+
+        return [first] + [server for server in healthy if server != first][: self.max_attempts - 1]
+
+    def needs_probe(self, server: str) -> bool:
+        """Every server is checked once for bogus answers the first time it is used"""
+        if server in self.probed:
+            return False
+
+        self.probed.add(server)
+        return True
+
+    def due_for_retest(self) -> typing.List[str]:
+        """The ejected servers that waited long enough, they stay ejected until the retest passes"""
+        now = time.monotonic()
+        due = [server for server, retest_at in self.ejected.items() if retest_at <= now]
+        for server in due:
+            self.ejected[server] = float("inf")
+
+        return due
+
+    def record_answer(self, server: str, latency: float):
+        stats = self.servers[server]
+        stats["queries"] = stats["queries"] + 1
+        stats["latency"] = latency if stats["latency"] is None else stats["latency"] * 0.7 + latency * 0.3
+        self.consecutive_timeouts[server] = 0
+
+    def record_timeout(self, server: str):
+        stats = self.servers[server]
+        stats["queries"] = stats["queries"] + 1
+        stats["timeouts"] = stats["timeouts"] + 1
+        self.consecutive_timeouts[server] = self.consecutive_timeouts.get(server, 0) + 1
+        if self.consecutive_timeouts[server] >= self.eject_after and server not in self.ejected:
+            self.eject(server)
+
+    def record_error(self, server: str):
+        stats = self.servers[server]
+        stats["queries"] = stats["queries"] + 1
+        stats["errors"] = stats["errors"] + 1
+
+    def record_bogus(self, server: str):
+        self.servers[server]["bogus"] = self.servers[server]["bogus"] + 1
+        self.eject(server)
+
+    def eject(self, server: str):
+        self.backoff[server] = min(self.backoff.get(server, self.retest_after / 2) * 2, 3600)
+        self.ejected[server] = time.monotonic() + self.backoff[server]
+        self.ranked_at = float("-inf")
+        self.ejections = self.ejections + 1
+
+    def readmit(self, server: str, latency: float):
+        """The server passed its retest"""
+        self.ejected.pop(server, None)
+        self.record_answer(server, latency)
+        self.ranked_at = float("-inf")
+
+    def get_scores(self) -> typing.Dict[str, dict]:
+        """The stats of the servers that were used, to be saved for the next run"""
+        return {
+            server: {
+                "latency": stats["latency"],
+                "queries": stats["queries"],
+                "timeouts": stats["timeouts"],
+                "bogus": stats["bogus"],
+            }
+            for server, stats in self.servers.items()
+            if stats["queries"] or stats["bogus"]
+        }
+
+    def report(self):
+        latencies = [stats["latency"] for stats in self.servers.values() if stats["latency"] is not None]
+        logging.info(
+            "Nameservers: %s of %s healthy, %s ejections, %s gave bogus answers, the fastest answers in %.0f ms",
+            len(self.servers) - len(self.ejected),
+            len(self.servers),
+            self.ejections,
+            len([stats for stats in self.servers.values() if stats["bogus"]]),
+            min(latencies, default=0) * 1000,
+        )
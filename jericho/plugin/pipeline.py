@@ -0,0 +1,238 @@
+#!/bin/python3
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import typing
+from enum import Enum
+from concurrent.futures import ProcessPoolExecutor
+from jericho.helpers import permutate_url_paths
+from jericho.plugin.async_engine import AsyncEngine
+from jericho.plugin.async_fetch import AsyncFetch
+from jericho.plugin.session_pool import SessionPool
+from jericho.plugin.result_is_relevant import ResultRelevant
+from jericho.plugin.notifications import Notifications
+from jericho.plugin.byte_queue import ByteQueue
+
+
+class PipelineMessage(Enum):
+    STOP = 'STOP'
+
+
+# The ResultRelevant of a verify process, it is inherited through fork since its lookups can't be pickled
+verifier: typing.Optional[ResultRelevant] = None
+
+
+def set_verifier(result_relevant: ResultRelevant):
+    global verifier
+    verifier = result_relevant
+
+
+def check_with_not_found_page(url: str, content: str, pattern: str, not_found_content: str) -> bool:
+    return verifier.check_with_not_found_page(url, content, pattern, not_found_content)
+
+
+class Pipeline:
+    """
+    Streams a scan through fetch -> baseline -> verify -> persist -> notify stages.
+    Every stage has its own workers and hands over to the next through a queue bounded by the bytes of the bodies,
+    so a finding is verified and notified while the rest of the scan is still running.
+    The baseline stage fetches the 404 page of a candidate right away instead of in a second pass.
+    The verification is CPU bound, it runs in `verify_workers` processes so it isn't held back by the GIL.
+    A candidate that a stage fails on is still persisted, as not relevant
+    """
+
+    def __init__(
+        self,
+        async_engine: AsyncEngine,
+        result_relevant: ResultRelevant,
+        on_candidate: typing.Callable[[dict], typing.Awaitable],
+        on_result: typing.Callable[[dict], bool],
+        notifications: Notifications = None,
+        settings: dict = None,
+    ):
+        """
+        on_candidate is awaited for every fetched candidate after it has been verified,
+        on_result is called for every relevant candidate and returns if it was a new result
+        """
+        self.settings = settings or {}
+        self.async_engine = async_engine
+        self.result_relevant = result_relevant
+        self.on_candidate = on_candidate
+        self.on_result = on_result
+        self.notifications = notifications
+
+        self.queue_max_bytes: int = self.settings.get("pipeline_queue_max_bytes") or 16000000
+        self.baseline_workers: int = self.settings.get("baseline_workers") or 20
+        self.verify_workers: int = self.settings.get("verify_workers") or os.cpu_count() or 1
+        self.persist_workers: int = self.settings.get("persist_workers") or 1
+        self.notify_workers: int = self.settings.get("notify_workers") or 5
+
+        # The 404 pages are fetched under the same settings and rate budget as the scan, with their own share of the fds
+        not_found_settings = {**async_engine.settings, "max_connections": async_engine.fd_budget["baseline"]}
+        self.not_found_fetch = AsyncFetch(
+            not_found_settings,
+            SessionPool(
+                not_found_settings,
+                async_engine.metrics,
+                async_engine.tracer,
+                async_engine.dns_cache,
+                async_engine.nameserver_health,
+            ),
+            async_engine.rate_limiter,
+            async_engine.metrics,
+            async_engine.tracer,
+        )
+
+        self.started: float = 0.0
+        self.candidates: int = 0
+        self.results: int = 0
+        self.notified: int = 0
+        self.first_result_after: typing.Optional[float] = None
+        self.queues: typing.List[ByteQueue] = []
+
+        async_engine.metrics.add_gauge(
+            "pipeline_queue_bytes",
+            "Bytes of response bodies waiting between the pipeline stages",
+            lambda: sum(queue.bytes for queue in self.queues),
+        )
+
+    def _get_size(self, item: dict) -> int:
+        return len(item["content"]) + len(item.get("not_found_content", ""))
+
+    async def _source(self, links: typing.List[str], endpoints: list, outbox: ByteQueue):
+        """The fetch stage, the engine has its own workers"""
+        try:
+            async for url, content, headers, pattern in self.async_engine.run(links, endpoints):
+                if url is None:
+                    continue
+
+                self.candidates = self.candidates + 1
+                item = {"url": url, "content": content, "headers": headers, "pattern": pattern}
+                await outbox.put(item, self._get_size(item))
+        except Exception as err:
+            logging.exception("The scan stopped because of error: %s", err)
+        finally:
+            await outbox.put(PipelineMessage.STOP)
+
+    async def _stage(
+        self,
+        name: str,
+        workers: int,
+        handler: typing.Callable[[dict], typing.Awaitable],
+        inbox: ByteQueue,
+        outbox: typing.Optional[ByteQueue],
+        failed: typing.Optional[ByteQueue] = None,
+    ):
+        """
+        Run a stage with its workers until the previous stage is done.
+        The items the handler raises on go to the failed queue when there is one
+        """
+
+        async def stage_worker():
+            while True:
+                item = await inbox.get()
+                if item == PipelineMessage.STOP:
+                    # Leave it for the other workers of this stage
+                    await inbox.put(PipelineMessage.STOP)
+                    return
+
+                try:
+                    item = await handler(item)
+                except Exception as err:
+                    logging.exception("The %s stage failed on %s: %s", name, item.get("url"), err)
+                    if failed is None:
+                        continue
+
+                    item["relevant"] = False
+                    item.setdefault("not_found_content", "")
+                    await failed.put(item, self._get_size(item))
+                    continue
+
+                if item is not None and outbox is not None:
+                    await outbox.put(item, self._get_size(item))
+
+        await asyncio.gather(*[stage_worker() for _ in range(0, workers)])
+        logging.debug("The %s stage is done", name)
+
+        if outbox is not None:
+            await outbox.put(PipelineMessage.STOP)
+
+    async def _fetch_not_found_page(self, item: dict) -> dict:
+        item["not_found_url"] = permutate_url_paths([item["url"]])[0]
+        not_found_page = await self.not_found_fetch.fetch(item["not_found_url"])
+        item["not_found_content"] = not_found_page["content"] if not_found_page else ""
+        return item
+
+    async def _verify(self, item: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        item["relevant"] = await loop.run_in_executor(
+            self.executor,
+            check_with_not_found_page,
+            item["url"],
+            item["content"],
+            item["pattern"],
+            item["not_found_content"],
+        )
+        return item
+
+    async def _persist(self, item: dict) -> typing.Optional[dict]:
+        await self.on_candidate(item)
+
+        if not item["relevant"] or not self.on_result(item):
+            return None
+
+        self.results = self.results + 1
+        if self.first_result_after is None:
+            self.first_result_after = time.monotonic() - self.started
+
+        return item
+
+    async def _notify(self, item: dict) -> None:
+        if self.notifications:
+            logging.debug("Sending the notifications..")
+            await self.notifications.run_all(item["url"])
+            self.notified = self.notified + 1
+
+        return None
+
+    async def run(self, links: typing.List[str], endpoints: list):
+        self.started = time.monotonic()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.verify_workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=set_verifier,
+            initargs=(self.result_relevant,),
+        )
+
+        baseline_queue = ByteQueue(self.queue_max_bytes)
+        verify_queue = ByteQueue(self.queue_max_bytes)
+        persist_queue = ByteQueue(self.queue_max_bytes)
+        notify_queue = ByteQueue(self.queue_max_bytes)
+        self.queues = [baseline_queue, verify_queue, persist_queue, notify_queue]
+
+        try:
+            await asyncio.gather(
+                self._source(links, endpoints, baseline_queue),
+                self._stage(
+                    "baseline", self.baseline_workers, self._fetch_not_found_page, baseline_queue, verify_queue, persist_queue
+                ),
+                self._stage("verify", self.verify_workers, self._verify, verify_queue, persist_queue, persist_queue),
+                self._stage("persist", self.persist_workers, self._persist, persist_queue, notify_queue),
+                self._stage("notify", self.notify_workers, self._notify, notify_queue, None),
+            )
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+            await self.not_found_fetch.close()
+
+        self.report()
+
+    def report(self):
+        logging.info(
+            "Pipeline: %s candidates, %s results, %s notified, first result after %s seconds",
+            self.candidates,
+            self.results,
+            self.notified,
+            "-" if self.first_result_after is None else round(self.first_result_after, 2),
+        )
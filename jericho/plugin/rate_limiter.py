@@ -0,0 +1,139 @@
+#!/bin/python3
+import asyncio
+import logging
+import multiprocessing
+import time
+import typing
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        """A rate of 0 means the bucket never runs dry"""
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock: asyncio.Lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns the seconds waited"""
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens = self.tokens - 1
+                    return waited
+
+                delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited = waited + delay
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A token bucket kept in shared memory so several scan processes draw from one budget.
+    It has to be created before the processes are started.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        super().__init__(rate, capacity)
+        self.state = multiprocessing.Array("d", [self.capacity, time.monotonic()])
+
+    def is_full(self) -> bool:
+        with self.state.get_lock():
+            tokens = self.state[0] + (time.monotonic() - self.state[1]) * self.rate
+        return tokens >= self.capacity
+
+    async def acquire(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self.state.get_lock():
+                now = time.monotonic()
+                tokens = min(self.capacity, self.state[0] + (now - self.state[1]) * self.rate)
+                self.state[1] = now
+
+                if tokens >= 1:
+                    self.state[0] = tokens - 1
+                    return waited
+
+                self.state[0] = tokens
+
+            delay = (1 - tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited = waited + delay
+
+
+class RateLimiter:
+    """
+    A global requests per second budget plus one budget per host.
+    The same instance is meant to be shared by every AsyncEngine in a scan
+    so the 404 baseline pass counts against the same limits as the scan itself.
+    """
+
+    def __init__(
+        self,
+        max_requests: float = 0,
+        max_requests_per_host: float = 0,
+        global_bucket: TokenBucket = None,
+    ):
+        """A SharedTokenBucket can be given as global bucket to share the budget with other processes"""
+        self.max_requests = max_requests
+        self.max_requests_per_host = max_requests_per_host
+        self.global_bucket = global_bucket or TokenBucket(max_requests)
+        self.host_buckets: typing.Dict[str, TokenBucket] = {}
+        self.max_host_buckets = 10000
+        self.requests: int = 0
+        self.throttled_requests: int = 0
+        self.wait_time: float = 0.0
+
+    def _get_host_bucket(self, host: str) -> TokenBucket:
+        if host not in self.host_buckets:
+            if len(self.host_buckets) >= self.max_host_buckets:
+                self._prune()
+            self.host_buckets[host] = TokenBucket(self.max_requests_per_host)
+
+        return self.host_buckets[host]
+
+    def _prune(self):
+        """A full bucket behaves exactly like a new one, so those can be dropped"""
+        for host in [host for host, bucket in self.host_buckets.items() if bucket.is_full()]:
+            del self.host_buckets[host]
+
+    async def acquire(self, host: str) -> float:
+        """Wait for a token for the host and then for a global token"""
+        waited = 0.0
+        if self.max_requests_per_host > 0:
+            waited = waited + await self._get_host_bucket(host).acquire()
+
+        waited = waited + await self.global_bucket.acquire()
+
+        self.requests = self.requests + 1
+        if waited > 0:
+            self.throttled_requests = self.throttled_requests + 1
+            self.wait_time = self.wait_time + waited
+
+        return waited
+
+    def report(self):
+        logging.info(
+            "Rate limiter: %s of %s requests waited for a token, %.2f seconds in total",
+            self.throttled_requests,
+            self.requests,
+            self.wait_time,
+        )
@@ -0,0 +1,61 @@
+#!/bin/python3
+import logging
+import typing
+from urllib.parse import urlparse
+
+
+class RedirectCache:
+    """
+    Remembers origin wide redirects such as http -> https or example.com -> www.example.com.
+    A redirect only counts as origin wide when the path is kept, and it has to be seen a few times
+    before later urls on that origin are sent straight to the final origin.
+    At most `max_entries` origins are tracked and none is evicted, the work items are endpoint major
+    so an evicted origin would be forgotten before it comes round again. Once full, new origins are not cached.
+    """
+
+    def __init__(self, confirmations: int = 2, max_entries: int = 100000):
+        self.confirmations = confirmations
+        self.max_entries = max_entries
+        # The redirect origin of an unconfirmed origin and how many times in a row it was seen
+        self.observed: typing.Dict[str, typing.Tuple[str, int]] = {}
+        self.origins: typing.Dict[str, str] = {}
+        self.hits: int = 0
+
+    def _get_origin(self, url: str) -> str:
+        parsed_url = urlparse(url)
+        return f"{parsed_url.scheme}://{parsed_url.netloc}"
+
+    def _get_path(self, url: str) -> str:
+        return url[len(self._get_origin(url)):]
+
+    def apply(self, url: str) -> str:
+        """Rewrite a url to the origin its host always redirects to"""
+        origin = self._get_origin(url)
+        if origin not in self.origins:
+            return url
+
+        self.hits = self.hits + 1
+        return self.origins[origin] + self._get_path(url)
+
+    def observe(self, url: str, redirect_url: str):
+        """Record a redirect and cache it once it has been confirmed to be origin wide"""
+        origin = self._get_origin(url)
+        redirect_origin = self._get_origin(redirect_url)
+        if origin == redirect_origin or self._get_path(url) != self._get_path(redirect_url):
+            return
+
+        if origin in self.origins:
+            return
+
+        if origin not in self.observed and len(self.observed) + len(self.origins) >= self.max_entries:
+            return
+
+        observed_origin, times = self.observed.get(origin, (redirect_origin, 0))
+        times = times + 1 if observed_origin == redirect_origin else 1
+        if times < self.confirmations:
+            self.observed[origin] = (redirect_origin, times)
+            return
+
+        logging.debug("Caching the redirect from %s to %s", origin, redirect_origin)
+        self.observed.pop(origin, None)
+        self.origins[origin] = redirect_origin
@@ -0,0 +1,180 @@
+#!/bin/python3
+import json
+import logging
+import os
+import random
+import time
+import typing
+import aiohttp
+from urllib.parse import urlparse
+
+
+class RequestTracer:
+    """
+    Records when the phases of a sampled request happened, in milliseconds after the request started:
+    dns and connect are only there when the request needed a new connection, sent is when the request
+    was written, first_byte is when the response headers arrived and done is when the body was read.
+    The traces are appended as one compact JSON object per line
+    """
+
+    def __init__(self, path: str, sample_rate: float = 0.01, buffer_size: int = 100):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.buffer: typing.List[str] = []
+        self.traced: int = 0
+
+    def start(self, method: str, url: str) -> typing.Optional[dict]:
+        """Start a trace, it is None when the request isn't sampled"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+
+        return {
+            "time": round(time.time(), 3),
+            "method": method,
+            "url": url,
+            "host": urlparse(url).netloc,
+            "start": time.monotonic(),
+        }
+
+    def _mark(self, trace: typing.Optional[dict], phase: str):
+        if trace is not None:
+            trace[phase] = round((time.monotonic() - trace["start"]) * 1000, 1)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """The trace is handed to aiohttp through trace_request_ctx"""
+
+        async def on_dns_resolvehost_end(session, context, params):
+            self._mark(context.trace_request_ctx, "dns")
+
+        async def on_connection_create_end(session, context, params):
+            self._mark(context.trace_request_ctx, "connect")
+
+        async def on_request_headers_sent(session, context, params):
+            self._mark(context.trace_request_ctx, "sent")
+
+        async def on_request_end(session, context, params):
+            self._mark(context.trace_request_ctx, "first_byte")
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_request_headers_sent.append(on_request_headers_sent)
+        trace_config.on_request_end.append(on_request_end)
+
+        return trace_config
+
+    def finish(self, trace: typing.Optional[dict], status: int = None, error: str = None):
+        if trace is None:
+            return
+
+        self._mark(trace, "done")
+        del trace["start"]
+        if status is not None:
+            trace["status"] = status
+
+        if error is not None:
+            trace["error"] = error
+
+        self.buffer.append(json.dumps(trace, separators=(",", ":")))
+        self.traced = self.traced + 1
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        # Every scan process of a workload appends to the same file, one write per flush keeps their lines apart
+        file = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(file, ("\n".join(self.buffer) + "\n").encode("utf-8"))
+        finally:
+            os.close(file)
+
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.traced:
+            logging.info("Wrote %s request traces to %s", self.traced, self.path)
+
+
+def get_phases(trace: dict) -> typing.Dict[str, float]:
+    """Turn the timestamps of a trace into how long every phase took"""
+    phases = {}
+    previous = 0.0
+    for phase, timestamp_name in (
+        ("dns", "dns"),
+        ("connect", "connect"),
+        ("send", "sent"),
+        ("wait", "first_byte"),
+        ("body", "done"),
+    ):
+        if timestamp_name in trace:
+            phases[phase] = round(max(trace[timestamp_name] - previous, 0.0), 1)
+            previous = trace[timestamp_name]
+
+    return phases
+
+
+def percentile(values: typing.List[float], percent: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+def summarize_traces(path: str, limit: int = 10) -> dict:
+    """Get the time spent per phase and the hosts with the slowest requests"""
+    phases: typing.Dict[str, typing.List[float]] = {}
+    hosts: typing.Dict[str, dict] = {}
+    errors: typing.Dict[str, int] = {}
+    traces = 0
+
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+
+            trace = json.loads(line)
+            traces = traces + 1
+
+            if trace.get("error"):
+                errors[trace["error"]] = errors.get(trace["error"], 0) + 1
+
+            host = hosts.setdefault(trace["host"], {"requests": 0, "total": 0.0, "phases": {}})
+            host["requests"] = host["requests"] + 1
+            host["total"] = host["total"] + trace.get("done", 0.0)
+
+            for phase, took in get_phases(trace).items():
+                phases.setdefault(phase, []).append(took)
+                host["phases"][phase] = host["phases"].get(phase, 0.0) + took
+
+    worst_hosts = sorted(
+        (
+            {
+                "host": name,
+                "requests": host["requests"],
+                "average": host["total"] / host["requests"],
+                "slowest_phase": max(host["phases"], key=host["phases"].get) if host["phases"] else None,
+            }
+            for name, host in hosts.items()
+        ),
+        key=lambda host: host["average"],
+        reverse=True,
+    )[:limit]
+
+    return {
+        "traces": traces,
+        "errors": errors,
+        "phases": {
+            phase: {
+                "p50": percentile(values, 50),
+                "p99": percentile(values, 99),
+                "max": max(values),
+                "total": sum(values),
+            }
+            for phase, values in phases.items()
+        },
+        "worst_hosts": worst_hosts,
+    }
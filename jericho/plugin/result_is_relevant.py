@@ -53,6 +53,22 @@ class ResultRelevant:
         # The 404 page is always saved when we save potential results
         _, cache_content = self.cache_lookup.find_url(url)
 
+        return self._compare_with_not_found_page(url, output, pattern, cache_content)
+
+    def check_with_not_found_page(self, url: str, output: str, pattern: str, not_found_content: str) -> bool:
+        """
+        The same as check but the 404 page is given, it doesn't touch the database
+        so it can run in a worker thread. Duplicates are the callers responsibility
+        """
+        logging.debug("Running investigation on %s", url)
+        if not self.investigate.run(url, output, pattern):
+            logging.debug("Content analysis failed")
+            return False
+
+        return self._compare_with_not_found_page(url, output, pattern, not_found_content)
+
+    def _compare_with_not_found_page(self, url: str, output: str, pattern: str, cache_content: str) -> bool:
+        """Check that the result doesn't look like the 404 page"""
         # Check if the content type of the result is the same as the "not found" page
         not_found_page_content_analysis = self.output_verifier.find_content_type(
             cache_content
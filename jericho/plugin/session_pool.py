@@ -0,0 +1,158 @@
+#!/bin/python3
+import heapq
+import socket
+import logging
+import typing
+import aiohttp
+from aiohttp import ClientSession
+from jericho.plugin.dns_resolver import AioHttpDnsResolver
+from jericho.plugin.dns_cache import DnsCache
+from jericho.plugin.nameserver_health import NameserverHealth
+from jericho.plugin.metrics import Metrics
+from jericho.plugin.request_tracer import RequestTracer
+from jericho.plugin.concurrency_controller import ConcurrencyController
+
+
+class PooledTCPConnector(aiohttp.TCPConnector):
+    """
+    aiohttp only counts the connections in use against `limit`, the idle keep-alive ones come on top of it.
+    A scan over thousands of hosts would keep a socket open for every host it talked to in the last
+    `keepalive_timeout` seconds, so the oldest idle connections are closed once the ones in use and the idle
+    ones together go over the limit
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Every release counts, the connections taken from the pool again are only subtracted when we recount
+        self.pooled: int = 0
+
+    def _release(self, key, protocol, *args, **kwargs):
+        super()._release(key, protocol, *args, **kwargs)
+        self.pooled = self.pooled + 1
+        if self.limit and len(self._acquired) + self.pooled > self.limit:
+            self._close_idle()
+
+    def _close_idle(self):
+        idle = [(use_time, key, protocol) for key, conns in self._conns.items() for protocol, use_time in conns]
+        # Go a bit below the limit so the idle connections aren't recounted on every release
+        excess = max(0, len(self._acquired) + len(idle) - self.limit * 9 // 10)
+        for use_time, key, protocol in heapq.nsmallest(excess, idle, key=lambda connection: connection[0]):
+            self._conns[key].remove((protocol, use_time))
+            if not self._conns[key]:
+                del self._conns[key]
+
+            if key.is_ssl and not self._cleanup_closed_disabled:
+                self._cleanup_closed_transports.append(protocol.transport)
+            protocol.close()
+
+        self.pooled = len(idle) - excess
+
+
+class SessionPool:
+    """
+    One long-lived ClientSession per engine. The connector keeps idle sockets
+    around for `keepalive_timeout` seconds so the ~230 endpoints probed against
+    a host reuse the same connection instead of doing a new handshake each time.
+    """
+
+    def __init__(
+        self,
+        settings: dict,
+        metrics: Metrics = None,
+        tracer: RequestTracer = None,
+        dns_cache: DnsCache = None,
+        nameserver_health: NameserverHealth = None
+    ):
+        self.settings = settings
+        self.metrics = metrics
+        self.tracer = tracer
+        self.dns_cache = dns_cache or DnsCache(settings.get('dns_cache'))
+        self.nameserver_health = nameserver_health
+        self.session: typing.Optional[ClientSession] = None
+        self.resolver: typing.Optional[AioHttpDnsResolver] = None
+
+        if 'keep_alive' not in settings:
+            self.settings['keep_alive'] = True
+
+        # Every open socket counts, in use or idle, so the pool can't run out of file descriptors
+        if 'max_connections' not in settings:
+            self.settings['max_connections'] = ConcurrencyController.split_fd_budget(
+                ConcurrencyController.fd_budget()
+            )["connections"]
+
+        if 'max_connections_per_host' not in settings:
+            self.settings['max_connections_per_host'] = 6
+
+        if 'keepalive_timeout' not in settings:
+            self.settings['keepalive_timeout'] = 15
+
+        if 'nameservers' not in settings:
+            self.settings['nameservers'] = ['8.8.8.8', '8.8.4.4']
+
+    def _create_connector(self) -> aiohttp.TCPConnector:
+        """Build the shared connector, hostile targets can opt out of keep-alive through settings"""
+        keep_alive = self.settings['keep_alive']
+        return PooledTCPConnector(
+            ssl=False,
+            enable_cleanup_closed=True,
+            family=socket.AF_INET,
+            force_close=not keep_alive,
+            limit=self.settings['max_connections'],
+            limit_per_host=self.settings['max_connections_per_host'],
+            keepalive_timeout=self.settings['keepalive_timeout'] if keep_alive else None,
+            use_dns_cache=False,
+            resolver=self.get_resolver()
+        )
+
+    def get_resolver(self) -> AioHttpDnsResolver:
+        """The resolver is shared with everything else in the engine that needs to resolve hosts"""
+        if self.resolver is None:
+            self.resolver = AioHttpDnsResolver(self.settings['nameservers'], self.dns_cache, self.nameserver_health)
+
+        return self.resolver
+
+    def headers(self) -> dict:
+        """The default headers for every request that goes through the pool"""
+        headers = {"User-Agent": self.settings.get('user_agent', 'Jericho')}
+
+        if not self.settings['keep_alive']:
+            headers["Connection"] = "close"
+
+        return headers
+
+    def _trace_configs(self) -> typing.List[aiohttp.TraceConfig]:
+        trace_configs = []
+        if self.metrics:
+            trace_configs.append(self.metrics.trace_config())
+
+        if self.tracer:
+            trace_configs.append(self.tracer.trace_config())
+
+        return trace_configs
+
+    async def get(self) -> ClientSession:
+        """Get the shared session, it is created on first use since it needs a running loop"""
+        if self.session is None or self.session.closed:
+            logging.debug(
+                "Creating a session pool (keep alive: %s, per host limit: %s)",
+                self.settings['keep_alive'],
+                self.settings['max_connections_per_host'],
+            )
+            self.session = ClientSession(
+                connector=self._create_connector(),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=10,sock_connect=10,sock_read=10),
+                trace_configs=self._trace_configs()
+            )
+
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+        if self.resolver is not None:
+            await self.resolver.close()
+
+        self.session = None
+        self.resolver = None
@@ -1,51 +1,121 @@
 #!/bin/python3
 import logging
+import time
 import typing
 import aiosqlite
 import asyncio
-from sqlalchemy import delete
-from jericho.models import Base
-from jericho.models import JerichoDnsCacheLookup
 from pathlib import Path
 
 
 class DnsCacheLookup:
-    def __init__(self):
+    """
+    The DNS answers of earlier scans. They are loaded in one query when a scan starts and the new answers are
+    written back in batches of `batch_size`, or every `flush_interval` seconds, in one transaction each
+    """
+
+    def __init__(
+        self, database: str = None, batch_size: int = 1000, flush_interval: float = 5, pragmas: typing.List[str] = None
+    ):
+        self.database = database or f"{str(Path.home())}/jericho/jericho.db"
+        self.pragmas = pragmas or []
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
         self.db = None
+        self.pending: typing.List[typing.Tuple[str, int, typing.List[str], int, float]] = []
+        self.flushed_at: float = time.monotonic()
+        self.flushing: typing.Optional[asyncio.Task] = None
 
     async def connect_db(self):
         "connect to the database"
-        self.db = await aiosqlite.connect(f"{str(Path.home())}/jericho/jericho.db")
+        self.db = await aiosqlite.connect(self.database)
+        for pragma in self.pragmas:
+            await self.db.execute(pragma)
+
+    async def load(
+        self, limit: int = None
+    ) -> typing.Dict[typing.Tuple[str, int], typing.Tuple[typing.List[str], float]]:
+        """
+        Get the answers that haven't expired by domain and record type, the ones that expire first come first.
+        With a limit only the `limit` domains that expire last are loaded, the expired ones are deleted
+        """
+        await self.db.execute(
+            "DELETE FROM jericho_dns_cache_lookup WHERE expires_at IS NULL OR expires_at <= ?", (time.time(),)
+        )
+        await self.db.commit()
+
+        answers: typing.Dict[typing.Tuple[str, int], typing.Tuple[typing.List[str], float]] = {}
+        query = "SELECT domain, record_type, ip_address, expires_at FROM jericho_dns_cache_lookup"
+        parameters: tuple = ()
+        if limit is not None:
+            query = (
+                f"{query} WHERE (domain, record_type) IN (SELECT domain, record_type FROM jericho_dns_cache_lookup "
+                "GROUP BY domain, record_type ORDER BY MAX(expires_at) DESC LIMIT ?)"
+            )
+            parameters = (limit,)
+
+        async with self.db.execute(f"{query} ORDER BY expires_at", parameters) as cursor:
+            async for domain, record_type, ip_address, expires_at in cursor:
+                ip_addresses, _ = answers.setdefault((domain, record_type), ([], expires_at))
+                ip_addresses.append(ip_address)
+
+        return answers
 
     async def find_ip(self, domain: str) -> typing.Optional[str]:
         """Check if a domain exist and if so get the content"""
-        attempt = 0
-        while True:
-            try:
-                async with self.db.execute("SELECT * FROM jericho_dns_cache_lookup WHERE domain=?", (domain, )) as cursor:
-                    rows = await cursor.fetchall()
-                    if len(rows) == 0:
-                        return None
-
-                    return rows[0][1]
-            except Exception as error:
-                logging.debug("Could not find ip because of error %s - attempt %s", error, attempt)
-                attempt = attempt + 1
-                await asyncio.sleep(1)
-
-    async def save(self, domain: str, ip_address: str) -> bool:
-        """Save the ip address of a domain"""
-        attempt = 0
-        while True:
-            try:
-                # Using aiosqlite for inserts because we are in an event loop right now and should therefore optimize the speed
-                await self.db.execute("INSERT OR IGNORE INTO jericho_dns_cache_lookup(domain, ip_address) VALUES(?, ?)", (domain, ip_address, ))
-                await self.db.commit()
-                return True
-            except Exception as error:
-                logging.debug("Could not save ip address of domain %s because of error %s", domain, error, attempt)
-                await self.db.rollback()
-                attempt = attempt + 1
+        async with self.db.execute(
+            "SELECT ip_address FROM jericho_dns_cache_lookup WHERE domain=? AND expires_at > ?", (domain, time.time())
+        ) as cursor:
+            row = await cursor.fetchone()
+
+        return row[0] if row else None
+
+    def save(self, domain: str, ip_addresses: typing.List[str], expires_at: float, record_type: int = 1):
+        """Queue the answer of a domain, expires_at is a unix timestamp"""
+        if self.db is None:
+            return
+
+        self.pending.append((domain, int(record_type), ip_addresses, max(0, round(expires_at - time.time())), expires_at))
+
+        batch_is_due = len(self.pending) >= self.batch_size or time.monotonic() - self.flushed_at >= self.flush_interval
+        if batch_is_due and (self.flushing is None or self.flushing.done()):
+            self.flushing = asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> bool:
+        """Replace the saved answers of the queued domains in one transaction"""
+        # The last answer of a domain wins
+        rows = list({(row[0], row[1]): row for row in self.pending}.values())
+        self.pending = []
+        self.flushed_at = time.monotonic()
+        if not rows:
+            return True
+
+        try:
+            await self.db.executemany(
+                "DELETE FROM jericho_dns_cache_lookup WHERE domain=? AND record_type=?",
+                [(domain, record_type) for domain, record_type, _, _, _ in rows],
+            )
+            await self.db.executemany(
+                "INSERT INTO jericho_dns_cache_lookup(domain, record_type, ip_address, ttl, expires_at) VALUES(?, ?, ?, ?, ?)",
+                [
+                    (domain, record_type, ip_address, ttl, expires_at)
+                    for domain, record_type, ip_addresses, ttl, expires_at in rows
+                    for ip_address in ip_addresses
+                ],
+            )
+            await self.db.commit()
+            return True
+        except Exception as error:
+            logging.warning("Could not save the DNS answers of %s domains because of error %s", len(rows), error)
+            await self.db.rollback()
+            return False
 
     async def close(self):
-        await self.db.close()
\ No newline at end of file
+        if self.db is None:
+            return
+
+        if self.flushing is not None:
+            await self.flushing
+
+        await self.flush()
+        await self.db.close()
+        self.db = None
@@ -1,7 +1,13 @@
 #!/bin/python3
 import logging
-from sqlalchemy import delete
-from jericho.models import JerichoDnsServers
+import time
+import typing
+from sqlalchemy import delete, or_
+from sqlalchemy.sql import func
+from jericho.helpers import chunks
+from jericho.models import JerichoDnsServers, JerichoProgress
+
+UPDATED_AT_KEY = "dns_servers_updated_at"
 
 
 class DnsServerLookup:
@@ -39,5 +45,78 @@ class DnsServerLookup:
             self.session.rollback()
             return False
 
+    def replace_all(self, servers: typing.List[str]) -> bool:
+        """
+        Replace the list in one transaction with bulk statements. The servers that are still on it keep their
+        rows and with them their scores. The time of the update is saved so the list is only downloaded when it is old
+        """
+        try:
+            new_servers = set(servers)
+            kept_servers = set()
+            stale_ids = []
+            for server_id, server in self.session.query(JerichoDnsServers.id, JerichoDnsServers.server):
+                if server in new_servers and server not in kept_servers:
+                    kept_servers.add(server)
+                else:
+                    stale_ids.append(server_id)
+
+            for stale_ids_chunk in chunks(stale_ids, 500):
+                self.session.execute(delete(JerichoDnsServers).where(JerichoDnsServers.id.in_(stale_ids_chunk)))
+
+            self.session.bulk_insert_mappings(
+                JerichoDnsServers,
+                [{"server": server} for server in dict.fromkeys(servers) if server not in kept_servers],
+            )
+            self.session.merge(JerichoProgress(key=UPDATED_AT_KEY, value=str(time.time())))
+            self.session.commit()
+            return True
+        except Exception as err:
+            logging.warning("Could not replace the dns servers because of error %s", err)
+            self.session.rollback()
+            return False
+
+    def get_age(self) -> typing.Optional[float]:
+        """Seconds since the list was replaced, None if it never was"""
+        updated_at = self.session.get(JerichoProgress, UPDATED_AT_KEY)
+        if updated_at is None:
+            return None
+
+        return time.time() - float(updated_at.value)
+
+    def get_scores(self) -> typing.Dict[str, dict]:
+        """The latency, timeouts and bogus answers the last scans saw for every dns server"""
+        return {
+            server.server: {
+                "latency": server.latency,
+                "queries": server.queries,
+                "timeouts": server.timeouts,
+                "bogus": server.bogus,
+            }
+            for server in self.session.query(JerichoDnsServers).filter(
+                or_(JerichoDnsServers.queries > 0, JerichoDnsServers.bogus > 0)
+            ).all()
+        }
+
+    def save_scores(self, scores: typing.Dict[str, dict]) -> bool:
+        """Save the scores of a scan, servers that are not in the table (e.g from --nameservers) are skipped"""
+        try:
+            for server in self.session.query(JerichoDnsServers).all():
+                score = scores.get(server.server)
+                if score is None:
+                    continue
+
+                server.latency = score["latency"]
+                server.queries = score["queries"]
+                server.timeouts = score["timeouts"]
+                server.bogus = score["bogus"]
+                server.time_checked = func.now()
+
+            self.session.commit()
+            return True
+        except Exception as err:
+            logging.warning("Could not save the dns server scores because of error %s", err)
+            self.session.rollback()
+            return False
+
     def commit(self):
         self.session.commit()
@@ -0,0 +1,188 @@
+#!/bin/python3
+"""
+Microbenchmarks for the code every candidate goes through after it is fetched:
+Investigate.run, OutputVerifier.find_content_type/verify and Diff.check.
+
+Run it with: python -m tests.benchmarks.bench_verifier
+Save a baseline of this machine with --save, compare against it with --check.
+The timings are machine specific so the baseline isn't committed, --check fails without one
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import typing
+from jericho.enums.pattern_types import PatternTypes
+from jericho.plugin.diff import Diff
+from jericho.plugin.investigate import Investigate
+from jericho.plugin.output_verifier import OutputVerifier
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "verifier.json")
+SIZES = {"1kb": 1000, "64kb": 64000, "1mb": 1000000}
+STRING_PATTERN = "DB_PASSWORD"
+
+
+def read_asset(name: str) -> str:
+    with open(os.path.join(ASSETS, name), encoding="utf-8", errors="ignore") as file:
+        return file.read()
+
+
+def repeat_to_size(unit: typing.Callable[[int], str], size: int, head: str = "", tail: str = "") -> str:
+    """Repeat the generated rows until the document is the requested size"""
+    rows = []
+    length = len(head) + len(tail)
+    index = 0
+    while length < size:
+        row = unit(index)
+        rows.append(row)
+        length = length + len(row)
+        index = index + 1
+
+    return head + "".join(rows) + tail
+
+
+def generate_documents(size: int) -> typing.Dict[str, str]:
+    html_body = read_asset("html_example_1.html")
+    return {
+        "json": "{" + repeat_to_size(lambda index: f'"key{index}": {{"value": {index}, "name": "name {index}"}},', size)[:-1] + "}",
+        "yml": repeat_to_size(lambda index: f"key{index}:\n  value: {index}\n  name: name {index}\n", size),
+        "xml": repeat_to_size(
+            lambda index: f"<item><value>{index}</value><name>name {index}</name></item>\n",
+            size,
+            head='<?xml version="1.0" encoding="utf-8" ?>\n<items>\n',
+            tail="</items>\n",
+        ),
+        "html": repeat_to_size(lambda index: html_body[(index * 4096) % len(html_body):][:4096], size),
+        "env": repeat_to_size(lambda index: f"KEY_{index}=value{index}\n", size),
+        "text": repeat_to_size(lambda index: f"This is line {index} of a plain text document\n", size),
+    }
+
+
+def get_corpus() -> typing.Dict[str, str]:
+    """The HTML/XML/text in tests/assets plus generated documents of every type and size"""
+    corpus = {}
+    for name in sorted(os.listdir(ASSETS)):
+        if os.path.isfile(os.path.join(ASSETS, name)):
+            corpus[f"assets/{name}"] = read_asset(name)
+
+    for size_name, size in SIZES.items():
+        for document_type, document in generate_documents(size).items():
+            corpus[f"{document_type}/{size_name}"] = document
+
+    return corpus
+
+
+def time_call(call: typing.Callable, budget: float, max_calls: int) -> typing.Tuple[float, int]:
+    """Call until the budget is spent, return the seconds per call"""
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        call()
+        calls = calls + 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= budget or calls >= max_calls:
+            return elapsed / calls, calls
+
+
+def measure(call: typing.Callable, budget: float, max_calls: int, rounds: int = 3) -> dict:
+    """
+    Time a call in a few rounds after a warm up call and keep the fastest round,
+    the slower rounds are noise from the machine. Then trace the allocations of one more call
+    """
+    per_call, calls = time_call(call, 0, 1)
+
+    # Calls that are slower than the budget (e.g YAML parsing of a big document) aren't repeated
+    if per_call < budget:
+        timings = [time_call(call, budget / rounds, max_calls) for _ in range(0, rounds)]
+        per_call = min(seconds for seconds, _ in timings)
+        calls = calls + sum(round_calls for _, round_calls in timings)
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "us": round(per_call * 1000000, 1),
+        "peak_kb": round((peak - before) / 1024, 1),
+        "calls": calls,
+    }
+
+
+def get_cases(corpus: typing.Dict[str, str]) -> typing.Iterator[typing.Tuple[str, typing.Callable]]:
+    output_verifier = OutputVerifier()
+    investigate = Investigate()
+    diff = Diff()
+    not_found_page = read_asset("sample.html")
+    patterns = [pattern.value for pattern in PatternTypes] + [STRING_PATTERN]
+
+    for name, document in corpus.items():
+        url = f"https://example.com/{name}"
+        yield f"{name} find_content_type", lambda document=document: output_verifier.find_content_type(document)
+        yield f"{name} diff", lambda document=document: diff.check(document, not_found_page)
+
+        for pattern in patterns:
+            if pattern != STRING_PATTERN:
+                yield f"{name} verify {pattern}", lambda document=document, pattern=pattern: output_verifier.verify(document, pattern)
+
+            yield f"{name} investigate {pattern}", lambda document=document, pattern=pattern, url=url: investigate.run(url, document, pattern)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", type=str, default="", help="Only run the cases that contain this string")
+    parser.add_argument("--budget", type=float, default=0.05, help="Seconds to time every case for, default 0.05")
+    parser.add_argument("--max-calls", type=int, default=1000, help="The most calls to time a case with, default 1000")
+    parser.add_argument("--baseline", type=str, default=BASELINE, help="The baseline file to compare against or save to")
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Exit with 1 if a case is slower than the baseline allows")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="How many times slower than the baseline a case may be, default 2")
+    parser.add_argument("--min-us", type=float, default=10, help="Cases faster than this many microseconds are too noisy to fail on, default 10")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    elif args.check:
+        print(f"There is no baseline in {args.baseline}, save one on this machine first with --save")
+        return 2
+
+    results = {}
+    regressions = []
+    print(f"{'case':<60} {'us/call':>12} {'peak kb':>10} {'baseline':>10}")
+    for case, call in get_cases(get_corpus()):
+        if args.filter not in case:
+            continue
+
+        result = measure(call, args.budget, args.max_calls)
+        results[case] = result
+
+        compared = ""
+        if case in baseline and baseline[case]["us"]:
+            ratio = result["us"] / baseline[case]["us"]
+            compared = f"{ratio:.2f}x"
+            if ratio > args.tolerance and result["us"] > args.min_us:
+                regressions.append(case)
+                compared = compared + " !"
+
+        print(f"{case:<60} {result['us']:>12} {result['peak_kb']:>10} {compared:>10}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump({**baseline, **results}, file, indent=2, sort_keys=True)
+        print(f"Saved {len(results)} cases to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} cases are more than {args.tolerance}x slower than the baseline")
+
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/bin/python3
+import asyncio
+import logging
+import multiprocessing
+import resource
+from jericho.plugin.async_engine import AsyncEngine
+from jericho.plugin.bench import VirtualHostFarm
+from jericho.enums.fetch_error_types import FetchErrorType
+
+
+class MockAsyncFetch:
+    def __init__(self, missing=(), refusing=()):
+        self.missing = missing
+        self.refusing = refusing
+        self.fetched = []
+
+    async def close(self):
+        pass
+
+    async def fetch_with_error(self, url):
+        self.fetched.append(url)
+        if url in self.missing:
+            return None, None
+
+        if any(url.startswith(host) for host in self.refusing):
+            return None, FetchErrorType.CONNECT
+
+        return {"url": url, "content": f"content {url}", "headers": {}}, None
+
+
+async def collect(async_engine, links, endpoints=None):
+    return [row async for row in async_engine.run(links, endpoints)]
+
+
+def test_run_with_endpoints():
+    loop = asyncio.new_event_loop()
+    async_engine = AsyncEngine(nameservers=[], settings={"workers": 3, "max_workers": 3, "liveness_check": False})
+    async_engine.async_fetch = MockAsyncFetch(missing=["https://b.com/.env"])
+
+    res = loop.run_until_complete(
+        collect(
+            async_engine,
+            ["https://a.com", "https://b.com"],
+            [{"endpoint": "/.env", "pattern": "TEXT"}, {"endpoint": "/.git/config", "pattern": "[core]"}],
+        )
+    )
+    loop.close()
+
+    assert sorted(res) == [
+        ("https://a.com/.env", "content https://a.com/.env", {}, "TEXT"),
+        ("https://a.com/.git/config", "content https://a.com/.git/config", {}, "[core]"),
+        ("https://b.com/.git/config", "content https://b.com/.git/config", {}, "[core]"),
+    ]
+    assert async_engine.finished_requests == 4
+
+
+def test_run_with_plain_urls():
+    loop = asyncio.new_event_loop()
+    async_engine = AsyncEngine(nameservers=[], settings={"workers": 2, "max_workers": 2})
+    async_engine.async_fetch = MockAsyncFetch()
+
+    res = loop.run_until_complete(
+        collect(async_engine, ["https://a.com/nonexistant404.env"])
+    )
+    loop.close()
+
+    assert res == [("https://a.com/nonexistant404.env", "content https://a.com/nonexistant404.env", {})]
+
+
+def test_run_with_no_links():
+    loop = asyncio.new_event_loop()
+    async_engine = AsyncEngine(nameservers=[], settings={"workers": 2, "max_workers": 2})
+    async_engine.async_fetch = MockAsyncFetch()
+
+    assert loop.run_until_complete(collect(async_engine, [])) == []
+    loop.close()
+
+
+def test_run_skips_host_after_circuit_breaker_trips():
+    loop = asyncio.new_event_loop()
+    async_engine = AsyncEngine(
+        nameservers=[],
+        settings={"workers": 1, "max_workers": 1, "liveness_check": False, "circuit_breaker_threshold": 2},
+    )
+    async_engine.async_fetch = MockAsyncFetch(refusing=["https://b.com"])
+
+    res = loop.run_until_complete(
+        collect(
+            async_engine,
+            ["https://b.com"],
+            [{"endpoint": f"/{i}", "pattern": "TEXT"} for i in range(0, 10)],
+        )
+    )
+    loop.close()
+
+    assert res == []
+    assert async_engine.async_fetch.fetched == ["https://b.com/0", "https://b.com/1"]
+    assert async_engine.circuit_breaker.tripped_hosts == {"b.com"}
+
+
+def test_response_queue_is_bounded_by_bytes():
+    async def consume_slowly(async_engine, links):
+        rows = []
+        async for row in async_engine.run(links):
+            rows.append(row)
+            await asyncio.sleep(0.001)
+        return rows
+
+    loop = asyncio.new_event_loop()
+    async_engine = AsyncEngine(
+        nameservers=[],
+        settings={"workers": 10, "max_workers": 10, "liveness_check": False, "response_queue_max_bytes": 100},
+    )
+    async_engine.async_fetch = MockAsyncFetch()
+
+    links = [f"https://a{index}.com/.env" for index in range(0, 50)]
+    res = loop.run_until_complete(consume_slowly(async_engine, links))
+
+    assert len(res) == 50
+    # Every body is about 30 bytes, so only 3 of them fit at once
+    assert 0 < async_engine.response_queue.peak_bytes <= 100
+    assert async_engine.response_queue.bytes == 0
+
+
+def test_run_drops_the_requests_of_domains_that_do_not_exist():
+    loop = asyncio.new_event_loop()
+    async_engine = AsyncEngine(
+        nameservers=[],
+        settings={"workers": 1, "max_workers": 1, "liveness_check": False, "dns_prefetch": False},
+    )
+    async_engine.async_fetch = MockAsyncFetch()
+    async_engine.dns_cache.nxdomain.add("expired.com")
+
+    res = loop.run_until_complete(
+        collect(
+            async_engine,
+            ["https://a.com", "https://expired.com"],
+            [{"endpoint": f"/{i}", "pattern": "TEXT"} for i in range(0, 3)],
+        )
+    )
+    loop.close()
+
+    assert len(res) == 3
+    assert async_engine.async_fetch.fetched == ["https://a.com/0", "https://a.com/1", "https://a.com/2"]
+    assert async_engine.nxdomain_skipped == 3
+    assert async_engine.metrics.get("skipped", {"reason": "nxdomain"}) == 3
+
+
+def test_run_survives_malformed_hosts():
+    loop = asyncio.new_event_loop()
+    async_engine = AsyncEngine(
+        nameservers=["127.0.0.1"],
+        settings={"workers": 2, "max_workers": 2, "min_workers": 1, "dns_prefetch": False, "dns_cache": {"alive.example": "127.0.0.1"}},
+    )
+    async_engine.async_fetch = MockAsyncFetch()
+
+    async def run():
+        server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        res = await collect(
+            async_engine,
+            ["http://bad..com", f"http://{'a' * 70}.com", f"http://alive.example:{port}"],
+            [{"endpoint": "/.env", "pattern": "TEXT"}],
+        )
+        server.close()
+        await server.wait_closed()
+        return res, port
+
+    res, port = loop.run_until_complete(run())
+    loop.close()
+
+    assert [row[0] for row in res] == [f"http://alive.example:{port}/.env"]
+    assert async_engine.finished_requests == 3
+    assert async_engine.liveness.unresolvable == 2
+
+
+def serve_farm(farm, ports):
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(farm.start())
+    ports.put(farm.port)
+    loop.run_forever()
+
+
+def test_run_within_a_low_fd_limit(caplog):
+    # The farm has its own process so its sockets don't count against the limit of the scan
+    farm = VirtualHostFarm(hosts=600, redirect_ratio=0, oversize_ratio=0, drop_ratio=0)
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve_farm, args=(farm, ports), daemon=True)
+    server.start()
+    farm.port = ports.get(timeout=10)
+
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (256, hard_limit))
+    try:
+        async_engine = AsyncEngine(nameservers=["127.0.0.1"], settings={"dns_cache": farm.get_resolve_list()})
+        with caplog.at_level(logging.DEBUG):
+            res = asyncio.new_event_loop().run_until_complete(
+                collect(async_engine, farm.get_domains(), [{"endpoint": "/.env"}, {"endpoint": "/.git/config"}])
+            )
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft_limit, hard_limit))
+        server.terminate()
+
+    assert len(res) == 1200
+    assert "Too many open files" not in caplog.text
+    assert not [name for name, _ in async_engine.metrics.counters if name == "errors"]
@@ -0,0 +1,165 @@
+#!/bin/python3
+import asyncio
+import aiohttp
+from aiohttp import web
+from jericho.plugin.async_fetch import AsyncFetch
+from jericho.plugin.dns_resolver import DnsRecordMissing
+from jericho.enums.fetch_error_types import FetchErrorType
+
+
+class MockContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read_chunks = 0
+
+    async def iter_chunked(self, _):
+        for chunk in self.chunks:
+            self.read_chunks = self.read_chunks + 1
+            yield chunk
+
+
+class MockResponse:
+    def __init__(self, chunks, headers=None, status=200, content_length=None):
+        self.status = status
+        self.headers = headers or {}
+        self.content_length = content_length
+        self.content = MockContent(chunks)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def process(settings, response):
+    loop = asyncio.new_event_loop()
+    async_fetch = AsyncFetch(settings)
+    res = loop.run_until_complete(
+        async_fetch._process_response("https://example.com/.env", response)
+    )
+    loop.close()
+    return res
+
+
+def test_process_response_reads_body():
+    response = MockResponse([b"DB_", b"PASSWORD=1"], headers={"content-type": "text/plain"})
+    assert process({}, response) == (
+        "https://example.com/.env",
+        "DB_PASSWORD=1",
+        {"content-type": "text/plain"},
+    )
+
+
+def test_process_response_wrong_status():
+    response = MockResponse([b"not found"], status=404)
+    assert process({"status": 200}, response) is None
+    assert response.content.read_chunks == 0
+
+
+def test_process_response_multimedia_is_not_read():
+    response = MockResponse([b"\x00"], headers={"content-type": "video/mp4"})
+    assert process({}, response) is None
+    assert response.content.read_chunks == 0
+
+
+def test_process_response_content_length_too_large():
+    response = MockResponse([b"a"], content_length=2000000000)
+    assert process({"max_content_size": 1000}, response) is None
+    assert response.content.read_chunks == 0
+    assert response.closed is True
+
+
+def test_process_response_stops_reading_at_max_content_size():
+    response = MockResponse([b"a" * 600, b"a" * 600, b"a" * 600])
+    assert process({"max_content_size": 1000}, response) is None
+    assert response.content.read_chunks == 2
+    assert response.closed is True
+
+
+def test_head_allows_get_matching_status():
+    async_fetch = AsyncFetch({"status": 200})
+    response = MockResponse([], headers={"content-type": "text/plain"})
+    assert async_fetch._head_allows_get("https://example.com/.env", response) is True
+
+
+def test_head_allows_get_wrong_status():
+    async_fetch = AsyncFetch({"status": 200})
+    response = MockResponse([], status=404)
+    assert async_fetch._head_allows_get("https://example.com/.env", response) is False
+
+
+def test_head_allows_get_head_not_supported():
+    async_fetch = AsyncFetch({"status": 200})
+    response = MockResponse([], status=405)
+    assert async_fetch._head_allows_get("https://example.com/.env", response) is True
+
+
+def test_head_allows_get_redirect():
+    async_fetch = AsyncFetch({"status": 200})
+    response = MockResponse([], status=301)
+    assert async_fetch._head_allows_get("https://example.com/.env", response) is True
+
+
+def test_head_allows_get_multimedia():
+    async_fetch = AsyncFetch({"status": 200})
+    response = MockResponse([], headers={"content-type": "image/png"})
+    assert async_fetch._head_allows_get("https://example.com/.env", response) is False
+
+
+def test_classify_error_timeout():
+    async_fetch = AsyncFetch({})
+    assert async_fetch.classify_error(asyncio.TimeoutError()) == FetchErrorType.TIMEOUT
+
+
+def test_classify_error_dns():
+    async_fetch = AsyncFetch({})
+    err = aiohttp.ClientConnectorError(None, DnsRecordMissing(0, "example.com does not exist"))
+    assert async_fetch.classify_error(err) == FetchErrorType.DNS
+
+
+def test_classify_error_connect():
+    async_fetch = AsyncFetch({})
+    err = aiohttp.ClientConnectorError(None, ConnectionRefusedError(111, "Connection refused"))
+    assert async_fetch.classify_error(err) == FetchErrorType.CONNECT
+
+
+def test_classify_error_other():
+    async_fetch = AsyncFetch({})
+    assert async_fetch.classify_error(ValueError()) == FetchErrorType.OTHER
+
+
+def test_fetch_follows_redirects_up_to_max_redirects():
+    requests = []
+
+    async def handler(request):
+        requests.append(request.path)
+        if request.path == "/loop":
+            raise web.HTTPFound("/loop")
+        if request.path == "/start":
+            raise web.HTTPFound("done")
+        return web.Response(text="done")
+
+    async def fetch_all():
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+
+        async_fetch = AsyncFetch({"max_redirects": 3})
+        res = [
+            await async_fetch.fetch(f"http://127.0.0.1:{port}/start"),
+            await async_fetch.fetch(f"http://127.0.0.1:{port}/loop"),
+        ]
+        await async_fetch.session_pool.close()
+        await runner.cleanup()
+        return port, res
+
+    loop = asyncio.new_event_loop()
+    port, res = loop.run_until_complete(fetch_all())
+    loop.close()
+
+    assert res[0]["url"] == f"http://127.0.0.1:{port}/done"
+    assert res[1] is None
+    assert requests == ["/start", "/done", "/loop", "/loop", "/loop", "/loop"]
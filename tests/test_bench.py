@@ -0,0 +1,28 @@
+#!/bin/python3
+import asyncio
+from jericho.plugin.bench import VirtualHostFarm, Bench
+
+
+def test_get_behaviour():
+    farm = VirtualHostFarm(hosts=100, redirect_ratio=0.1, oversize_ratio=0.05, drop_ratio=0.05)
+    behaviours = [farm.get_behaviour(farm.get_hostname(index)) for index in range(0, 100)]
+
+    assert behaviours.count("drop") == 5
+    assert behaviours.count("oversize") == 5
+    assert behaviours.count("redirect") == 10
+    assert behaviours.count("ok") == 80
+    assert farm.get_behaviour("host105.jericho.bench") == farm.get_behaviour("host5.jericho.bench")
+
+
+def test_run():
+    farm = VirtualHostFarm(hosts=100, redirect_ratio=0.1, oversize_ratio=0.05, drop_ratio=0.05, oversize_bytes=2000)
+    settings = {"max_content_size": 1000, "workers": 10, "max_workers": 10, "liveness_check": False}
+
+    res = asyncio.new_event_loop().run_until_complete(Bench(farm, settings, endpoints=2).run())
+
+    assert res["requests"] == 200
+    # Every host answers but the ones that drop and the ones with an oversize body, redirects are followed
+    assert res["responses"] == 180
+    assert res["errors"] == {"oversize": 10, "connect": 10}
+    assert res["p99_ms"] >= res["p50_ms"] > 0
+    assert res["peak_rss_mb"] > 0
@@ -0,0 +1,44 @@
+#!/bin/python3
+import asyncio
+from jericho.plugin.byte_queue import ByteQueue
+
+
+def test_put_blocks_when_full():
+    async def run():
+        queue = ByteQueue(max_bytes=100)
+        await queue.put("a", 60)
+
+        blocked_put = asyncio.ensure_future(queue.put("b", 60))
+        await asyncio.sleep(0.01)
+        blocked = not blocked_put.done()
+
+        first = await queue.get()
+        await asyncio.wait_for(blocked_put, 1)
+
+        return blocked, first, queue.bytes, queue.peak_bytes
+
+    blocked, first, queued_bytes, peak_bytes = asyncio.new_event_loop().run_until_complete(run())
+
+    assert blocked is True
+    assert first == "a"
+    assert queued_bytes == 60
+    assert peak_bytes == 60
+
+
+def test_item_larger_than_the_budget_fits_in_an_empty_queue():
+    async def run():
+        queue = ByteQueue(max_bytes=10)
+        await asyncio.wait_for(queue.put("a", 1000), 1)
+        return queue.bytes, await queue.get(), queue.bytes
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == (1000, "a", 0)
+
+
+def test_unbounded():
+    async def run():
+        queue = ByteQueue()
+        for index in range(0, 100):
+            await asyncio.wait_for(queue.put(index, 1000000), 1)
+        return queue.qsize(), queue.bytes
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == (100, 100000000)
@@ -0,0 +1,43 @@
+#!/bin/python3
+import time
+from jericho.plugin.circuit_breaker import CircuitBreaker
+
+
+def test_trips_after_threshold():
+    circuit_breaker = CircuitBreaker(threshold=3)
+    for _ in range(0, 2):
+        circuit_breaker.record("example.com", True)
+    assert circuit_breaker.is_open("example.com") is False
+
+    circuit_breaker.record("example.com", True)
+    assert circuit_breaker.is_open("example.com") is True
+    assert circuit_breaker.is_open("other.com") is False
+    assert circuit_breaker.tripped_hosts == {"example.com"}
+    assert circuit_breaker.skipped_requests == 1
+
+
+def test_success_resets_failures():
+    circuit_breaker = CircuitBreaker(threshold=2)
+    circuit_breaker.record("example.com", True)
+    circuit_breaker.record("example.com", False)
+    circuit_breaker.record("example.com", True)
+    assert circuit_breaker.is_open("example.com") is False
+
+
+def test_no_cooldown_abandons_host():
+    circuit_breaker = CircuitBreaker(threshold=1, cooldown=0)
+    circuit_breaker.record("example.com", True)
+    circuit_breaker.opened_at["example.com"] = time.monotonic() - 10000
+    assert circuit_breaker.is_open("example.com") is True
+
+
+def test_cooldown_lets_one_request_through():
+    circuit_breaker = CircuitBreaker(threshold=1, cooldown=60)
+    circuit_breaker.record("example.com", True)
+    circuit_breaker.opened_at["example.com"] = time.monotonic() - 61
+
+    assert circuit_breaker.is_open("example.com") is False
+    assert circuit_breaker.is_open("example.com") is True
+
+    circuit_breaker.record("example.com", False)
+    assert circuit_breaker.is_open("example.com") is False
@@ -0,0 +1,76 @@
+#!/bin/python3
+import asyncio
+from jericho.plugin.concurrency_controller import ConcurrencyController
+
+
+def record_window(concurrency_controller, latency, failed):
+    for _ in range(0, concurrency_controller.window):
+        concurrency_controller._record(latency, failed)
+
+
+def test_limit_is_bounded_by_fd_budget():
+    concurrency_controller = ConcurrencyController(initial=10, maximum=10 ** 9)
+    assert concurrency_controller.maximum == ConcurrencyController.split_fd_budget(ConcurrencyController.fd_budget())["connections"]
+
+
+def test_split_fd_budget():
+    assert ConcurrencyController.split_fd_budget(960, liveness=500, prefetch=500, baseline=20) == {
+        "connections": 340,
+        "liveness": 60,
+        "prefetch": 120,
+        "baseline": 20,
+    }
+    assert ConcurrencyController.split_fd_budget(960) == {
+        "connections": 480,
+        "liveness": 0,
+        "prefetch": 0,
+        "baseline": 0,
+    }
+
+
+def test_increase_when_healthy():
+    concurrency_controller = ConcurrencyController(initial=100, minimum=10, maximum=500, window=10)
+    record_window(concurrency_controller, 0.1, False)
+    assert concurrency_controller.limit == 110
+
+
+def test_decrease_on_failures():
+    concurrency_controller = ConcurrencyController(initial=100, minimum=10, maximum=500, window=10)
+    record_window(concurrency_controller, 0.1, True)
+    assert concurrency_controller.limit == 50
+
+
+def test_decrease_on_latency_spike():
+    concurrency_controller = ConcurrencyController(initial=100, minimum=10, maximum=500, window=10)
+    record_window(concurrency_controller, 0.1, False)
+    record_window(concurrency_controller, 1.0, False)
+    assert concurrency_controller.limit == 55
+
+
+def test_never_below_minimum():
+    concurrency_controller = ConcurrencyController(initial=20, minimum=15, maximum=500, window=10)
+    record_window(concurrency_controller, 0.1, True)
+    assert concurrency_controller.limit == 15
+
+
+def test_not_adaptive():
+    concurrency_controller = ConcurrencyController(initial=100, maximum=500, adaptive=False, window=10)
+    record_window(concurrency_controller, 0.1, True)
+    assert concurrency_controller.limit == 100
+
+
+def test_acquire_waits_for_release():
+    loop = asyncio.new_event_loop()
+    concurrency_controller = ConcurrencyController(initial=1, minimum=1, maximum=1)
+
+    async def acquire_twice():
+        await concurrency_controller.acquire()
+        waiting = asyncio.ensure_future(concurrency_controller.acquire())
+        await asyncio.sleep(0)
+        blocked = not waiting.done()
+        await concurrency_controller.release(0.1, False)
+        await waiting
+        return blocked, concurrency_controller.active
+
+    assert loop.run_until_complete(acquire_twice()) == (True, 1)
+    loop.close()
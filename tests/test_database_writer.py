@@ -0,0 +1,80 @@
+import asyncio
+import sqlite3
+from sqlalchemy import create_engine
+
+from jericho.models import *
+from jericho.helpers import get_sqlite_pragmas
+from jericho.plugin.database_writer import DatabaseWriter
+
+INSERT_HTML = "INSERT OR IGNORE INTO jericho_html(workload_uuid, endpoint, content, pattern, headers) VALUES(?, ?, ?, ?, ?)"
+
+
+def create_database(tmp_path) -> str:
+    database = str(tmp_path / "jericho.db")
+    Base.metadata.create_all(create_engine(f"sqlite:///{database}"))
+    return database
+
+
+def test_write_in_batches(tmp_path):
+    database = create_database(tmp_path)
+    database_writer = DatabaseWriter(database, batch_size=10, flush_interval=60)
+
+    async def run():
+        await database_writer.start()
+        for number in range(25):
+            await database_writer.write(INSERT_HTML, ("uuid", f"http://example.com/{number}", "content", "TEXT", "{}"))
+            await asyncio.sleep(0)
+        await database_writer.close()
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+    rows = sqlite3.connect(database).execute("SELECT COUNT(*) FROM jericho_html").fetchone()[0]
+    assert rows == 25
+    assert database_writer.written_rows == 25
+    # The rows written while a batch is flushed go in the next one
+    assert database_writer.batches <= 3
+    assert database_writer.metrics.histograms["db_flush_seconds"].count == database_writer.batches
+
+
+def test_write_after_flush_interval(tmp_path):
+    database = create_database(tmp_path)
+    database_writer = DatabaseWriter(database, batch_size=100, flush_interval=0.05)
+
+    async def run():
+        await database_writer.start()
+        await database_writer.write(INSERT_HTML, ("uuid", "http://example.com", "content", "TEXT", "{}"))
+        await asyncio.sleep(0.2)
+        written = database_writer.written_rows
+        await database_writer.close()
+        return written
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == 1
+
+
+def test_drop_batch_that_keeps_failing(tmp_path):
+    database_writer = DatabaseWriter(create_database(tmp_path), max_retries=2)
+
+    async def run():
+        await database_writer.start()
+        await database_writer.write("INSERT INTO table_that_does_not_exist VALUES(?)", (1,))
+        await database_writer.close()
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+    assert database_writer.written_rows == 0
+    assert database_writer.dropped_rows == 1
+
+
+def test_connection_runs_sqlite_pragmas(tmp_path):
+    database = create_database(tmp_path)
+    database_writer = DatabaseWriter(database, pragmas=get_sqlite_pragmas({}))
+
+    async def run():
+        await database_writer.start()
+        await database_writer.write(INSERT_HTML, ("uuid", "http://example.com", "content", "TEXT", "{}"))
+        await database_writer.close()
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+    assert sqlite3.connect(database).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert database_writer.written_rows == 1
@@ -0,0 +1,163 @@
+#!/bin/python3
+import asyncio
+import ipaddress
+import time
+from sqlalchemy import create_engine
+from jericho.models import Base
+from jericho.plugin.dns_cache import DnsCache
+from jericho.repositories.dns_cache_lookup import DnsCacheLookup
+
+
+class MockAddress(ipaddress.IPv4Address):
+    def __init__(self, address, expires_at):
+        super().__init__(address)
+        self.expires_at = expires_at
+
+
+class MockNameserver:
+    def __init__(self, ttl=300, fail=False):
+        self.ttl = ttl
+        self.fail = fail
+        self.queries = 0
+
+    async def query(self):
+        self.queries = self.queries + 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise OSError("failed to resolve")
+
+        return [MockAddress("1.2.3.4", asyncio.get_running_loop().time() + self.ttl)]
+
+
+def test_get_is_cached_and_coalesced():
+    dns_cache = DnsCache()
+    nameserver = MockNameserver()
+
+    async def run():
+        concurrent = await asyncio.gather(*[dns_cache.get("a.com", "A", nameserver.query) for _ in range(0, 10)])
+        cached = await dns_cache.get("a.com", "A", nameserver.query)
+        return concurrent, cached
+
+    concurrent, cached = asyncio.new_event_loop().run_until_complete(run())
+
+    assert nameserver.queries == 1
+    assert all(str(addresses[0]) == "1.2.3.4" for addresses in concurrent)
+    assert str(cached[0]) == "1.2.3.4"
+    assert dns_cache.lookups == 1
+    assert dns_cache.coalesced == 9
+    assert dns_cache.hits == 1
+
+
+def test_get_respects_the_ttl():
+    dns_cache = DnsCache()
+    nameserver = MockNameserver(ttl=0.05)
+
+    async def run():
+        await dns_cache.get("a.com", "A", nameserver.query)
+        await dns_cache.get("a.com", "A", nameserver.query)
+        await asyncio.sleep(0.1)
+        await dns_cache.get("a.com", "A", nameserver.query)
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+    assert nameserver.queries == 2
+
+
+def test_get_static_hosts():
+    dns_cache = DnsCache({"a.com": "127.0.0.1"})
+    nameserver = MockNameserver()
+
+    res = asyncio.new_event_loop().run_until_complete(dns_cache.get("a.com", "A", nameserver.query))
+
+    assert res == ["127.0.0.1"]
+    assert nameserver.queries == 0
+
+
+def test_get_errors_are_not_cached():
+    dns_cache = DnsCache()
+    nameserver = MockNameserver(fail=True)
+
+    async def run():
+        errors = 0
+        for _ in range(0, 2):
+            try:
+                await dns_cache.get("a.com", "A", nameserver.query)
+            except OSError:
+                errors = errors + 1
+        return errors
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == 2
+    assert nameserver.queries == 2
+    assert dns_cache.in_flight == {}
+
+
+def test_negative():
+    dns_cache = DnsCache(negative_ttl=0.05)
+
+    async def run():
+        dns_cache.add_negative("expired.com")
+        dns_cache.add_negative("gone.com", confirmed=True)
+        negative = dns_cache.is_negative("expired.com")
+        await asyncio.sleep(0.06)
+        return negative, dns_cache.is_negative("expired.com")
+
+    assert asyncio.new_event_loop().run_until_complete(run()) == (True, False)
+    assert dns_cache.nxdomain == {"gone.com"}
+    assert dns_cache.negative_hits == 1
+
+
+def test_answers_are_kept_between_runs(tmp_path):
+    database = str(tmp_path / "jericho.db")
+    Base.metadata.create_all(create_engine(f"sqlite:///{database}"))
+    nameserver = MockNameserver(ttl=300)
+
+    async def run():
+        dns_cache = DnsCache(dns_cache_lookup=DnsCacheLookup(database))
+        await dns_cache.load()
+        addresses = await dns_cache.get("a.com", 1, nameserver.query)
+        await dns_cache.close()
+        return dns_cache.loaded, str(addresses[0])
+
+    loop = asyncio.new_event_loop()
+
+    assert loop.run_until_complete(run()) == (0, "1.2.3.4")
+    assert loop.run_until_complete(run()) == (1, "1.2.3.4")
+    assert nameserver.queries == 1
+
+
+def test_oldest_entries_are_dropped_past_max_entries():
+    dns_cache = DnsCache(max_entries=3)
+    nameserver = MockNameserver(ttl=300)
+
+    async def run():
+        for index in range(0, 5):
+            await dns_cache.get(f"{index}.com", "A", nameserver.query)
+            dns_cache.add_negative(f"{index}.missing.com")
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+    # Nothing has expired, the cap still holds
+    assert [host for host, _ in dns_cache.entries] == ["2.com", "3.com", "4.com"]
+    assert list(dns_cache.negative) == ["2.missing.com", "3.missing.com", "4.missing.com"]
+
+
+def test_load_keeps_the_answers_that_expire_last(tmp_path):
+    database = str(tmp_path / "jericho.db")
+    Base.metadata.create_all(create_engine(f"sqlite:///{database}"))
+
+    async def run():
+        dns_cache_lookup = DnsCacheLookup(database)
+        await dns_cache_lookup.connect_db()
+        for index in range(0, 5):
+            dns_cache_lookup.save(f"{index}.com", ["1.2.3.4"], time.time() + 300 - index, 1)
+        await dns_cache_lookup.close()
+
+        dns_cache = DnsCache(max_entries=3, dns_cache_lookup=DnsCacheLookup(database))
+        await dns_cache.load()
+        await dns_cache.close()
+        return dns_cache
+
+    dns_cache = asyncio.new_event_loop().run_until_complete(run())
+
+    assert dns_cache.loaded == 3
+    assert [host for host, _ in dns_cache.entries] == ["2.com", "1.com", "0.com"]
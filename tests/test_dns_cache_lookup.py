@@ -1,27 +1,52 @@
-import unittest
-import pytest
-import uuid
+import asyncio
+import time
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 from jericho.models import *
 from jericho.repositories.dns_cache_lookup import DnsCacheLookup
-from sqlalchemy.ext.declarative import declarative_base
 
 
-engine = create_engine("sqlite:///:memory:", echo=True)
-Base.metadata.create_all(engine)
+def create_database(tmp_path) -> str:
+    database = str(tmp_path / "jericho.db")
+    Base.metadata.create_all(create_engine(f"sqlite:///{database}"))
+    return database
 
-Session = sessionmaker(bind=engine)
-session = Session()
 
+def test_save_result(tmp_path):
+    dns_cache_lookup = DnsCacheLookup(create_database(tmp_path))
 
-async def test_save_result():
-    dns_cache_lookup = DnsCacheLookup(session)
-    await dns_cache_lookup.connect_db()
+    async def run():
+        await dns_cache_lookup.connect_db()
+        dns_cache_lookup.save("example.com", ["1.2.3.4"], time.time() + 300)
+        saved = await dns_cache_lookup.flush()
+        find = await dns_cache_lookup.find_ip("example.com")
+        await dns_cache_lookup.close()
+        return saved, find
 
-    save = await dns_cache_lookup.save("https://example.com", "1.2.3.4")
-    assert save is True
-    find = await dns_cache_lookup.find_ip("https://example.com") == '1.2.3.4'
-    assert find == True
-    await dns_cache_lookup.close()
\ No newline at end of file
+    assert asyncio.new_event_loop().run_until_complete(run()) == (True, "1.2.3.4")
+
+
+def test_load_skips_expired_answers(tmp_path):
+    database = create_database(tmp_path)
+
+    async def save():
+        dns_cache_lookup = DnsCacheLookup(database, batch_size=2)
+        await dns_cache_lookup.connect_db()
+        dns_cache_lookup.save("a.com", ["1.1.1.1"], time.time() + 300)
+        dns_cache_lookup.save("a.com", ["1.1.1.1", "1.1.1.2"], time.time() + 300)
+        dns_cache_lookup.save("expired.com", ["2.2.2.2"], time.time() - 1)
+        await dns_cache_lookup.close()
+
+    async def load():
+        dns_cache_lookup = DnsCacheLookup(database)
+        await dns_cache_lookup.connect_db()
+        answers = await dns_cache_lookup.load()
+        await dns_cache_lookup.close()
+        return answers
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(save())
+    answers = loop.run_until_complete(load())
+
+    assert list(answers) == [("a.com", 1)]
+    assert answers[("a.com", 1)][0] == ["1.1.1.1", "1.1.1.2"]
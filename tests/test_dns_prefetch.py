@@ -0,0 +1,110 @@
+#!/bin/python3
+import asyncio
+import json
+from jericho.plugin.dns_prefetch import DnsPrefetch
+from jericho.plugin.dns_resolver import DnsRecordMissing, DnsResolveError
+
+
+class MockResolver:
+    def __init__(self):
+        self.lookups = []
+
+    async def resolve(self, host, port=0):
+        self.lookups.append(host)
+        if host == "expired.example":
+            raise DnsRecordMissing(0, f"{host} does not exist")
+
+        if host == "broken.example":
+            raise DnsResolveError(0, f"{host} failed to resolve")
+
+        if host == "bad..example":
+            raise UnicodeError("label empty or too long")
+
+        return [{"hostname": host, "host": "127.0.0.1", "port": port}]
+
+
+def test_run():
+    resolver = MockResolver()
+    dns_prefetch = DnsPrefetch(lambda: resolver, concurrency=2)
+
+    asyncio.new_event_loop().run_until_complete(
+        dns_prefetch.run(
+            [
+                "http://alive.example",
+                "https://alive.example",
+                "expired.example",
+                "http://broken.example:8080",
+                "http://127.0.0.1",
+            ]
+        )
+    )
+
+    # The second lookup of a domain is answered by the DNS cache of the engine
+    assert sorted(resolver.lookups) == ["alive.example", "alive.example", "broken.example", "expired.example"]
+    assert dns_prefetch.resolved == 2
+    assert dns_prefetch.nxdomain == 1
+    assert dns_prefetch.servfail == 1
+
+
+def test_lookahead():
+    resolver = MockResolver()
+    dns_prefetch = DnsPrefetch(lambda: resolver, concurrency=10, lookahead=2)
+    domains = [f"http://host{index}.example" for index in range(0, 6)]
+
+    async def run():
+        task = asyncio.ensure_future(dns_prefetch.run(domains))
+        await asyncio.sleep(0.01)
+        before = list(resolver.lookups)
+
+        dns_prefetch.seen(4)
+        await asyncio.wait_for(task, 1)
+
+        return before
+
+    before = asyncio.new_event_loop().run_until_complete(run())
+
+    assert before == ["host0.example", "host1.example"]
+    assert len(resolver.lookups) == 6
+
+
+def test_frontier_only_moves_forward():
+    dns_prefetch = DnsPrefetch(lambda: MockResolver())
+
+    dns_prefetch.seen(3)
+    assert dns_prefetch.frontier == 3
+
+    # The second endpoint starts over at the first domain
+    dns_prefetch.seen(1)
+    assert dns_prefetch.frontier == 3
+
+
+def test_run_survives_malformed_hosts():
+    resolver = MockResolver()
+    dns_prefetch = DnsPrefetch(lambda: resolver, concurrency=1)
+
+    asyncio.new_event_loop().run_until_complete(
+        dns_prefetch.run(["http://bad..example", "http://[broken", "http://alive.example"])
+    )
+
+    assert resolver.lookups == ["bad..example", "alive.example"]
+    assert dns_prefetch.servfail == 1
+    assert dns_prefetch.resolved == 1
+
+
+def test_results_are_written_to_the_output(tmp_path):
+    output = str(tmp_path / "dns.jsonl")
+    dns_prefetch = DnsPrefetch(lambda: MockResolver(), concurrency=1, output=output, buffer_size=2)
+
+    asyncio.new_event_loop().run_until_complete(
+        dns_prefetch.run(["http://alive.example", "expired.example", "http://broken.example"])
+    )
+    dns_prefetch.report()
+
+    with open(output, encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+
+    assert records == [
+        {"host": "alive.example", "status": "resolved", "addresses": ["127.0.0.1"]},
+        {"host": "expired.example", "status": "nxdomain"},
+        {"host": "broken.example", "status": "servfail"},
+    ]
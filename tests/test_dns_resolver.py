@@ -0,0 +1,33 @@
+#!/bin/python3
+import asyncio
+from jericho.plugin.dns_resolver import AioHttpDnsResolver, ATTEMPTS
+from jericho.plugin.nameserver_health import NameserverHealth
+
+
+def test_get_nameservers_records_the_failed_attempts():
+    nameserver_health = NameserverHealth(["10.0.0.1", "10.0.0.2"], timeout=0.05, eject_after=1)
+
+    async def run():
+        resolver = AioHttpDnsResolver(["10.0.0.1", "10.0.0.2"], nameserver_health=nameserver_health)
+        attempts = []
+        ATTEMPTS.set(attempts)
+        nameservers = resolver.get_nameservers(None, "example.com")
+
+        first = await nameservers.__anext__()
+        await asyncio.sleep(0.05)
+        second = await nameservers.__anext__()
+        resolver._record_answers(attempts)
+        await nameservers.aclose()
+
+        for probe in resolver.probes:
+            probe.cancel()
+
+        return first[1][0], second[1][0]
+
+    first, second = asyncio.new_event_loop().run_until_complete(run())
+
+    assert first != second
+    assert nameserver_health.servers[first]["timeouts"] == 1
+    assert first in nameserver_health.ejected
+    assert nameserver_health.servers[second]["queries"] == 1
+    assert nameserver_health.servers[second]["latency"] is not None
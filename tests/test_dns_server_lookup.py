@@ -31,3 +31,22 @@ def test_delete_all():
     dns_server_lookup.delete_all()
 
     assert dns_server_lookup.get_all() == []
+
+
+def test_replace_all_keeps_the_scores():
+    dns_server_lookup = DnsServerLookup(session)
+    dns_server_lookup.delete_all()
+    dns_server_lookup.replace_all(["8.8.8.8", "8.8.4.4"])
+    dns_server_lookup.save_scores({"8.8.8.8": {"latency": 0.02, "queries": 4, "timeouts": 1, "bogus": 0}})
+
+    dns_server_lookup.replace_all(["8.8.8.8", "1.1.1.1"])
+
+    assert sorted(dns_server_lookup.get_all()) == ["1.1.1.1", "8.8.8.8"]
+    assert dns_server_lookup.get_scores() == {"8.8.8.8": {"latency": 0.02, "queries": 4, "timeouts": 1, "bogus": 0}}
+
+
+def test_get_age():
+    dns_server_lookup = DnsServerLookup(session)
+    dns_server_lookup.replace_all(["8.8.8.8"])
+
+    assert 0 <= dns_server_lookup.get_age() < 5
@@ -9,7 +9,11 @@ from jericho.helpers import (
     split_array_by,
     is_not_same_domain,
     get_endpoint,
-    permutate_url_paths
+    permutate_url_paths,
+    get_sqlite_pragmas,
+    create_database_engine,
+    get_hostname,
+    is_ip_address,
 )
 
 
@@ -54,13 +58,40 @@ def test_get_domain_from_endpoint():
 
 
 def test_merge_domains_with_endpoints():
-    arr1 = [{"endpoint": "/phpinfo.php"}, {"endpoint": "/test.php"}]
+    arr1 = [{"endpoint": "/phpinfo.php", "pattern": "phpinfo()"}, {"endpoint": "/test.php", "pattern": "TEXT"}]
     arr2 = [f"https://{i}" for i in range(0, 20)]
-    test = merge_domains_with_endpoints(arr1, arr2)
+    test = list(merge_domains_with_endpoints(arr1, arr2))
 
     assert len(test) == 40
-    assert test[0:20] == [f"https://{i}/phpinfo.php" for i in range(0, 20)]
-    assert test[20:40] == [f"https://{i}/test.php" for i in range(0, 20)]
+    assert [item["endpoint"] for item in test[0:20]] == [f"https://{i}/phpinfo.php" for i in range(0, 20)]
+    assert [item["endpoint"] for item in test[20:40]] == [f"https://{i}/test.php" for i in range(0, 20)]
+    assert test[0] == {
+        "endpoint": "https://0/phpinfo.php", "pattern": "phpinfo()", "raw_endpoint": "/phpinfo.php", "domain_index": 0
+    }
+    assert [item["domain_index"] for item in test[20:40]] == list(range(0, 20))
+
+
+def test_merge_domains_with_endpoints_more_endpoints_than_domains():
+    arr1 = [{"endpoint": "/a"}, {"endpoint": "/b"}, {"endpoint": "/c"}]
+    arr2 = ["https://one.com", "https://two.com"]
+    test = [item["endpoint"] for item in merge_domains_with_endpoints(arr1, arr2)]
+
+    assert test == [
+        "https://one.com/a",
+        "https://one.com/b",
+        "https://one.com/c",
+        "https://two.com/a",
+        "https://two.com/b",
+        "https://two.com/c",
+    ]
+
+
+def test_merge_domains_with_endpoints_is_lazy():
+    arr1 = [{"endpoint": "/.env"}]
+    arr2 = [f"https://{i}" for i in range(0, 1000000)]
+    test = merge_domains_with_endpoints(arr1, arr2)
+
+    assert next(test)["endpoint"] == "https://0/.env"
 
 
 def test_chunks():
@@ -114,4 +145,26 @@ def test_get_endpoint():
 
 
 def test_permutate_url_paths():
-    assert permutate_url_paths(["https://google.com/found/result.php", "https://bing.com/robots.txt"]) == ["https://google.com/found/nonexistant404result.php", "https://bing.com/nonexistant404robots.txt"]
\ No newline at end of file
+    assert permutate_url_paths(["https://google.com/found/result.php", "https://bing.com/robots.txt"]) == ["https://google.com/found/nonexistant404result.php", "https://bing.com/nonexistant404robots.txt"]
+
+
+def test_create_database_engine_runs_sqlite_pragmas(tmp_path):
+    pragmas = get_sqlite_pragmas({"sqlite_synchronous": "off", "sqlite_busy_timeout": 1000})
+    engine = create_database_engine(f"sqlite:///{tmp_path}/jericho.db", pragmas)
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 0
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1000
+
+
+def test_get_hostname():
+    assert get_hostname("example.com") == "example.com"
+    assert get_hostname("https://Example.com:8443/.env") == "example.com"
+    assert get_hostname("http://[broken") is None
+
+
+def test_is_ip_address():
+    assert is_ip_address("127.0.0.1")
+    assert is_ip_address("::1")
+    assert not is_ip_address("example.com")
@@ -0,0 +1,68 @@
+#!/bin/python3
+import asyncio
+from jericho.plugin.liveness import Liveness
+
+
+class MockResolver:
+    def __init__(self):
+        self.lookups = 0
+
+    async def resolve(self, host, port=0):
+        self.lookups = self.lookups + 1
+        if host == "dead.example":
+            raise OSError(0, f"{host} does not exist")
+
+        return [{"hostname": host, "host": "127.0.0.1", "port": port}]
+
+
+def test_is_alive():
+    loop = asyncio.new_event_loop()
+    resolver = MockResolver()
+    liveness = Liveness(lambda: resolver, timeout=2)
+
+    async def check():
+        server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        closed_server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+        closed_port = closed_server.sockets[0].getsockname()[1]
+        closed_server.close()
+        await closed_server.wait_closed()
+
+        res = await asyncio.gather(
+            liveness.is_alive(f"http://alive.example:{port}/.env"),
+            liveness.is_alive(f"http://alive.example:{port}/.git/config"),
+            liveness.is_alive(f"http://127.0.0.1:{port}/.env"),
+            liveness.is_alive("http://dead.example/.env"),
+            liveness.is_alive(f"http://alive.example:{closed_port}/.env"),
+        )
+        server.close()
+        await server.wait_closed()
+        await liveness.close()
+        return res
+
+    assert loop.run_until_complete(check()) == [True, True, True, False, False]
+    loop.close()
+
+    assert resolver.lookups == 3
+    assert liveness.alive == 2
+    assert liveness.unresolvable == 1
+    assert liveness.unreachable == 1
+    assert liveness.skipped_requests == 2
+
+
+def test_state_is_kept_per_domain():
+    resolver = MockResolver()
+    liveness = Liveness(lambda: resolver, timeout=2, domains=5)
+
+    async def check():
+        # Endpoint major like merge_domains_with_endpoints, every host comes round again after the others
+        for endpoint in ["/.env", "/.git/config", "/phpinfo.php"]:
+            for domain_index in range(0, 5):
+                await liveness.is_alive(f"http://dead.example:{domain_index + 1}{endpoint}", domain_index)
+        await liveness.close()
+
+    asyncio.new_event_loop().run_until_complete(check())
+
+    assert resolver.lookups == 5
+    assert liveness.skipped_requests == 15
+    assert liveness.checks == {}
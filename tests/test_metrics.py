@@ -0,0 +1,108 @@
+#!/bin/python3
+import asyncio
+import aiohttp
+from aiohttp import web
+from jericho.plugin.metrics import Metrics, Histogram
+
+
+def test_histogram_is_cumulative():
+    histogram = Histogram(buckets=(0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert histogram.counts == [1, 2]
+    assert histogram.count == 3
+    assert histogram.sum == 5.55
+
+
+def test_render():
+    metrics = Metrics()
+    metrics.inc("requests")
+    metrics.inc("requests")
+    metrics.inc("bytes", 1024)
+    metrics.error("dns")
+    metrics.error("oversize")
+    metrics.observe("total_seconds", 0.2)
+
+    res = metrics.render()
+
+    assert "jericho_requests_total 2" in res
+    assert "jericho_bytes_total 1024" in res
+    assert 'jericho_errors_total{type="dns"} 1' in res
+    assert 'jericho_errors_total{type="oversize"} 1' in res
+    assert 'jericho_total_seconds_bucket{le="0.1"} 0' in res
+    assert 'jericho_total_seconds_bucket{le="0.25"} 1' in res
+    assert 'jericho_total_seconds_bucket{le="+Inf"} 1' in res
+    assert "jericho_total_seconds_count 1" in res
+    assert "jericho_dns_seconds_count 0" in res
+
+
+def test_render_with_labels():
+    metrics = Metrics({"process": "1"})
+    metrics.error("tls")
+
+    res = metrics.render()
+
+    assert 'jericho_errors_total{process="1",type="tls"} 1' in res
+    assert 'jericho_total_seconds_bucket{process="1",le="+Inf"} 0' in res
+    assert 'jericho_requests_total{process="1"} 0' in res
+
+
+def test_write_textfile(tmp_path):
+    metrics = Metrics()
+    metrics.inc("requests")
+    metrics.write_textfile(str(tmp_path / "metrics.prom"))
+
+    assert "jericho_requests_total 1" in (tmp_path / "metrics.prom").read_text()
+    assert [file.name for file in tmp_path.iterdir()] == ["metrics.prom"]
+
+
+def test_serve_and_trace():
+    async def handle(request):
+        return web.Response(text="hello")
+
+    async def run():
+        metrics = Metrics()
+
+        app = web.Application()
+        app.router.add_get("/", handle)
+        target = web.AppRunner(app)
+        await target.setup()
+        site = web.TCPSite(target, "127.0.0.1", 0)
+        await site.start()
+        target_port = site._server.sockets[0].getsockname()[1]
+
+        metrics_server = await metrics.serve("127.0.0.1", 0)
+        metrics_port = metrics_server.addresses[0][1]
+
+        async with aiohttp.ClientSession(trace_configs=[metrics.trace_config()]) as session:
+            async with session.get(f"http://127.0.0.1:{target_port}/") as response:
+                await response.read()
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{metrics_port}/metrics") as response:
+                body = await response.text()
+
+        await metrics_server.cleanup()
+        await target.cleanup()
+
+        return metrics, body
+
+    metrics, body = asyncio.new_event_loop().run_until_complete(run())
+
+    assert metrics.histograms["connect_seconds"].count == 1
+    assert metrics.histograms["ttfb_seconds"].count == 1
+    assert "jericho_ttfb_seconds_count 1" in body
+
+
+def test_render_gauge():
+    metrics = Metrics()
+    queued = {"bytes": 10}
+    metrics.add_gauge("queue_bytes", "Bytes in the queue", lambda: queued["bytes"])
+    queued["bytes"] = 20
+
+    res = metrics.render()
+
+    assert "# TYPE jericho_queue_bytes gauge" in res
+    assert "jericho_queue_bytes 20" in res
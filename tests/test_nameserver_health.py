@@ -0,0 +1,40 @@
+#!/bin/python3
+from jericho.plugin.nameserver_health import NameserverHealth
+
+
+def test_choose_prefers_the_fastest_healthy_servers():
+    nameserver_health = NameserverHealth(["slow", "fast", "dead", "new"], max_attempts=3, spread=1)
+    nameserver_health.record_answer("slow", 0.4)
+    nameserver_health.record_answer("fast", 0.01)
+    for _ in range(0, 3):
+        nameserver_health.record_timeout("dead")
+
+    assert nameserver_health.choose() == ["fast", "new", "slow"]
+    assert "dead" in nameserver_health.ejected
+
+
+def test_retest():
+    nameserver_health = NameserverHealth(["a", "b"], retest_after=0)
+    nameserver_health.record_bogus("a")
+
+    assert nameserver_health.due_for_retest() == ["a"]
+    assert "a" not in nameserver_health.choose()
+
+    nameserver_health.readmit("a", 0.02)
+
+    assert "a" not in nameserver_health.ejected
+    assert nameserver_health.servers["a"]["bogus"] == 1
+
+
+def test_scores_are_loaded():
+    nameserver_health = NameserverHealth(
+        ["a", "b"],
+        scores={
+            "a": {"latency": 0.02, "queries": 10, "timeouts": 0, "bogus": 0},
+            "b": {"latency": 0.1, "queries": 10, "timeouts": 8, "bogus": 0},
+        },
+    )
+
+    assert nameserver_health.choose() == ["a"]
+    assert "b" in nameserver_health.ejected
+    assert nameserver_health.get_scores()["a"] == {"latency": 0.02, "queries": 5, "timeouts": 0, "bogus": 0}
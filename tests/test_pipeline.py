@@ -0,0 +1,133 @@
+#!/bin/python3
+import asyncio
+from jericho.plugin.pipeline import Pipeline
+from jericho.plugin.rate_limiter import RateLimiter
+from jericho.plugin.metrics import Metrics
+
+
+class MockAsyncEngine:
+    def __init__(self, rows, fail=False):
+        self.rows = rows
+        self.fail = fail
+        self.settings = {}
+        self.rate_limiter = RateLimiter()
+        self.metrics = Metrics()
+        self.tracer = None
+        self.dns_cache = None
+        self.nameserver_health = None
+        self.fd_budget = {"baseline": 20}
+
+    async def run(self, links, endpoints=None):
+        for row in self.rows:
+            yield row
+
+        if self.fail:
+            raise Exception("The scan broke")
+
+
+class MockNotFoundFetch:
+    def __init__(self):
+        self.fetched = []
+
+    async def close(self):
+        pass
+
+    async def fetch(self, url):
+        self.fetched.append(url)
+        if "unreachable" in url:
+            raise OSError("The 404 page could not be fetched")
+
+        return {"url": url, "content": "not found", "headers": {}}
+
+
+class MockResultRelevant:
+    def check_with_not_found_page(self, url, output, pattern, not_found_content):
+        if "broken" in url:
+            raise ValueError("The verification broke")
+
+        return not_found_content == "not found" and pattern in output
+
+
+class MockNotifications:
+    def __init__(self):
+        self.sent = []
+
+    async def run_all(self, url):
+        self.sent.append(url)
+
+
+def create_pipeline(rows, fail=False):
+    candidates = []
+    results = []
+    notifications = MockNotifications()
+
+    async def on_candidate(candidate):
+        candidates.append(candidate)
+
+    def on_result(candidate):
+        results.append(candidate["url"])
+        return True
+
+    pipeline = Pipeline(
+        async_engine=MockAsyncEngine(rows, fail),
+        result_relevant=MockResultRelevant(),
+        on_candidate=on_candidate,
+        on_result=on_result,
+        notifications=notifications,
+        settings={"baseline_workers": 2, "verify_workers": 2, "notify_workers": 2},
+    )
+    pipeline.not_found_fetch = MockNotFoundFetch()
+
+    return pipeline, candidates, results, notifications
+
+
+def test_run():
+    loop = asyncio.new_event_loop()
+    pipeline, candidates, results, notifications = create_pipeline(
+        [
+            ("https://a.com/.env", "DB_PASSWORD=1", {}, "DB_PASSWORD"),
+            (None, None, None, None),
+            ("https://b.com/.env", "<html></html>", {}, "DB_PASSWORD"),
+        ]
+    )
+
+    loop.run_until_complete(pipeline.run(["a.com", "b.com"], []))
+
+    assert sorted(candidate["url"] for candidate in candidates) == ["https://a.com/.env", "https://b.com/.env"]
+    assert all(candidate["not_found_content"] == "not found" for candidate in candidates)
+    assert len(pipeline.not_found_fetch.fetched) == 2
+    assert results == ["https://a.com/.env"]
+    assert notifications.sent == ["https://a.com/.env"]
+    assert pipeline.candidates == 2
+    assert pipeline.results == 1
+    assert pipeline.first_result_after is not None
+
+
+def test_run_stops_when_the_scan_fails():
+    loop = asyncio.new_event_loop()
+    pipeline, candidates, results, _ = create_pipeline(
+        [("https://a.com/.env", "DB_PASSWORD=1", {}, "DB_PASSWORD")], fail=True
+    )
+
+    loop.run_until_complete(pipeline.run(["a.com"], []))
+
+    assert len(candidates) == 1
+    assert results == ["https://a.com/.env"]
+
+
+def test_candidates_that_fail_a_stage_are_persisted_as_not_relevant():
+    loop = asyncio.new_event_loop()
+    pipeline, candidates, results, notifications = create_pipeline(
+        [
+            ("https://unreachable.com/.env", "DB_PASSWORD=1", {}, "DB_PASSWORD"),
+            ("https://broken.com/.env", "DB_PASSWORD=1", {}, "DB_PASSWORD"),
+            ("https://a.com/.env", "DB_PASSWORD=1", {}, "DB_PASSWORD"),
+        ]
+    )
+
+    loop.run_until_complete(pipeline.run(["unreachable.com", "broken.com", "a.com"], []))
+
+    relevant = {candidate["url"]: candidate["relevant"] for candidate in candidates}
+    assert relevant == {"https://unreachable.com/.env": False, "https://broken.com/.env": False, "https://a.com/.env": True}
+    assert results == ["https://a.com/.env"]
+    assert notifications.sent == ["https://a.com/.env"]
@@ -0,0 +1,78 @@
+#!/bin/python3
+import asyncio
+from jericho.plugin.rate_limiter import TokenBucket, SharedTokenBucket, RateLimiter
+
+
+def test_token_bucket_unlimited():
+    loop = asyncio.new_event_loop()
+    bucket = TokenBucket(0)
+    assert loop.run_until_complete(bucket.acquire()) == 0.0
+    loop.close()
+
+
+def test_token_bucket_waits_when_empty():
+    loop = asyncio.new_event_loop()
+    bucket = TokenBucket(20, capacity=1)
+
+    async def acquire_three():
+        return [await bucket.acquire() for _ in range(0, 3)]
+
+    waits = loop.run_until_complete(acquire_three())
+    loop.close()
+
+    assert waits[0] == 0.0
+    assert waits[1] > 0
+    assert waits[2] > 0
+
+
+def test_rate_limiter_per_host():
+    loop = asyncio.new_event_loop()
+    rate_limiter = RateLimiter(max_requests_per_host=1)
+
+    async def acquire_hosts():
+        return [
+            await rate_limiter.acquire("a.com"),
+            await rate_limiter.acquire("b.com"),
+        ]
+
+    assert loop.run_until_complete(acquire_hosts()) == [0.0, 0.0]
+    loop.close()
+    assert rate_limiter.requests == 2
+    assert rate_limiter.throttled_requests == 0
+
+
+def test_rate_limiter_prune():
+    rate_limiter = RateLimiter(max_requests_per_host=1)
+    rate_limiter.max_host_buckets = 2
+    rate_limiter._get_host_bucket("a.com")
+    rate_limiter._get_host_bucket("b.com")
+    rate_limiter._get_host_bucket("c.com")
+
+    assert list(rate_limiter.host_buckets.keys()) == ["c.com"]
+
+
+def test_shared_token_bucket_waits_when_empty():
+    loop = asyncio.new_event_loop()
+    bucket = SharedTokenBucket(20, capacity=1)
+
+    async def acquire_three():
+        return [await bucket.acquire() for _ in range(0, 3)]
+
+    waits = loop.run_until_complete(acquire_three())
+    loop.close()
+
+    assert waits[0] == 0.0
+    assert waits[1] > 0
+    assert waits[2] > 0
+
+
+def test_rate_limiter_with_shared_global_bucket():
+    loop = asyncio.new_event_loop()
+    bucket = SharedTokenBucket(1)
+    rate_limiter = RateLimiter(1, global_bucket=bucket)
+
+    loop.run_until_complete(rate_limiter.acquire("a.com"))
+    loop.close()
+
+    assert rate_limiter.global_bucket is bucket
+    assert bucket.state[0] < 1
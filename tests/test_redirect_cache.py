@@ -0,0 +1,53 @@
+#!/bin/python3
+from jericho.plugin.redirect_cache import RedirectCache
+
+
+def test_apply_unknown_origin():
+    redirect_cache = RedirectCache()
+    assert redirect_cache.apply("http://example.com/.env") == "http://example.com/.env"
+
+
+def test_origin_redirect_is_cached_after_confirmations():
+    redirect_cache = RedirectCache(confirmations=2)
+    redirect_cache.observe("http://example.com/.env", "https://www.example.com/.env")
+    assert redirect_cache.apply("http://example.com/.git/config") == "http://example.com/.git/config"
+
+    redirect_cache.observe("http://example.com/phpinfo.php", "https://www.example.com/phpinfo.php")
+    assert redirect_cache.apply("http://example.com/.git/config?a=1") == "https://www.example.com/.git/config?a=1"
+    assert redirect_cache.hits == 1
+
+
+def test_path_redirect_is_not_cached():
+    redirect_cache = RedirectCache(confirmations=1)
+    redirect_cache.observe("http://example.com/.env", "https://example.com/login")
+    assert redirect_cache.apply("http://example.com/.env") == "http://example.com/.env"
+
+
+def test_same_origin_redirect_is_not_cached():
+    redirect_cache = RedirectCache(confirmations=1)
+    redirect_cache.observe("https://example.com/admin", "https://example.com/admin/")
+    assert redirect_cache.origins == {}
+
+
+def test_origins_are_kept_while_hosts_cycle():
+    redirect_cache = RedirectCache(confirmations=2, max_entries=3)
+    # Endpoint major like merge_domains_with_endpoints, more hosts than max_entries
+    for endpoint in ["/.env", "/.git/config", "/phpinfo.php"]:
+        for index in range(0, 5):
+            url = f"http://{index}.example.com{endpoint}"
+            if redirect_cache.apply(url) == url:
+                redirect_cache.observe(url, f"https://{index}.example.com{endpoint}")
+
+    assert list(redirect_cache.origins) == ["http://0.example.com", "http://1.example.com", "http://2.example.com"]
+    assert redirect_cache.observed == {}
+    assert redirect_cache.hits == 3
+
+
+def test_redirect_to_another_origin_starts_over():
+    redirect_cache = RedirectCache(confirmations=2)
+    redirect_cache.observe("http://example.com/.env", "https://example.com/.env")
+    redirect_cache.observe("http://example.com/.git/config", "https://www.example.com/.git/config")
+    assert redirect_cache.origins == {}
+
+    redirect_cache.observe("http://example.com/phpinfo.php", "https://www.example.com/phpinfo.php")
+    assert redirect_cache.origins == {"http://example.com": "https://www.example.com"}
@@ -0,0 +1,97 @@
+#!/bin/python3
+import asyncio
+import json
+from aiohttp import web
+from jericho.plugin.async_fetch import AsyncFetch
+from jericho.plugin.request_tracer import RequestTracer, get_phases, summarize_traces
+
+
+def test_start_is_sampled():
+    assert RequestTracer("/dev/null", sample_rate=0).start("GET", "http://a.com/") is None
+    assert RequestTracer("/dev/null", sample_rate=1).start("GET", "http://a.com/")["host"] == "a.com"
+
+
+def test_finish_and_flush(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    tracer = RequestTracer(path, sample_rate=1, buffer_size=2)
+
+    tracer.finish(tracer.start("GET", "http://a.com/"), status=200)
+    assert not (tmp_path / "traces.jsonl").exists()
+
+    tracer.finish(tracer.start("GET", "http://b.com/"), error="timeout")
+    tracer.finish(None)
+    tracer.close()
+
+    traces = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert [trace["host"] for trace in traces] == ["a.com", "b.com"]
+    assert traces[0]["status"] == 200
+    assert traces[1]["error"] == "timeout"
+    assert "start" not in traces[0]
+    assert "done" in traces[0]
+
+
+def test_get_phases():
+    assert get_phases({"dns": 5.0, "connect": 15.0, "sent": 16.0, "first_byte": 100.0, "done": 110.0}) == {
+        "dns": 5.0,
+        "connect": 10.0,
+        "send": 1.0,
+        "wait": 84.0,
+        "body": 10.0,
+    }
+    assert get_phases({"sent": 1.0, "first_byte": 3.0, "done": 4.0}) == {"send": 1.0, "wait": 2.0, "body": 1.0}
+
+
+def test_summarize_traces(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    path.write_text(
+        "\n".join(
+            json.dumps(trace)
+            for trace in [
+                {"host": "slow.com", "sent": 1.0, "first_byte": 900.0, "done": 901.0, "status": 200},
+                {"host": "fast.com", "dns": 1.0, "connect": 2.0, "sent": 3.0, "first_byte": 5.0, "done": 6.0},
+                {"host": "fast.com", "done": 10000.0, "error": "timeout"},
+            ]
+        )
+        + "\n"
+    )
+
+    res = summarize_traces(str(path))
+
+    assert res["traces"] == 3
+    assert res["errors"] == {"timeout": 1}
+    assert res["worst_hosts"][0]["host"] == "fast.com"
+    assert res["worst_hosts"][1] == {"host": "slow.com", "requests": 1, "average": 901.0, "slowest_phase": "wait"}
+    assert res["phases"]["wait"]["max"] == 899.0
+
+
+def test_fetch_is_traced(tmp_path):
+    async def handle_redirect(request):
+        raise web.HTTPFound("/ok")
+
+    async def handle_ok(request):
+        return web.Response(text="ok")
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/redirect", handle_redirect)
+        app.router.add_get("/ok", handle_ok)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        tracer = RequestTracer(str(tmp_path / "traces.jsonl"), sample_rate=1)
+        async_fetch = AsyncFetch({"nameservers": ["127.0.0.1"]}, tracer=tracer)
+        await async_fetch.fetch(f"http://127.0.0.1:{port}/redirect")
+        await async_fetch.session_pool.close()
+        await runner.cleanup()
+        tracer.close()
+
+    asyncio.new_event_loop().run_until_complete(run())
+
+    traces = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert [trace["status"] for trace in traces] == [302, 200]
+    assert "connect" in traces[0]
+    assert "connect" not in traces[1]
+    assert all("sent" in trace and "first_byte" in trace for trace in traces)
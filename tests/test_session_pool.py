@@ -0,0 +1,72 @@
+#!/bin/python3
+import asyncio
+from jericho.plugin.session_pool import SessionPool
+from jericho.plugin.concurrency_controller import ConcurrencyController
+from jericho.plugin.bench import VirtualHostFarm
+
+
+def test_headers_keep_alive():
+    session_pool = SessionPool({"user_agent": "Jericho"})
+    assert session_pool.headers() == {"User-Agent": "Jericho"}
+
+
+def test_headers_close_after_each_request():
+    session_pool = SessionPool({"user_agent": "Jericho", "keep_alive": False})
+    assert session_pool.headers() == {"User-Agent": "Jericho", "Connection": "close"}
+
+
+def test_get_reuses_session():
+    session_pool = SessionPool({})
+
+    async def get_twice():
+        first = await session_pool.get()
+        second = await session_pool.get()
+        force_close = first.connector.force_close
+        limit_per_host = first.connector.limit_per_host
+        await session_pool.close()
+        return first is second, force_close, limit_per_host
+
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(get_twice()) == (True, False, 6)
+    loop.close()
+
+
+def test_get_force_close_when_keep_alive_disabled():
+    session_pool = SessionPool({"keep_alive": False})
+
+    async def get_force_close():
+        session = await session_pool.get()
+        force_close = session.connector.force_close
+        await session_pool.close()
+        return force_close
+
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(get_force_close()) is True
+    loop.close()
+
+
+def test_max_connections_is_bounded_by_fd_budget():
+    session_pool = SessionPool({})
+    fd_budget = ConcurrencyController.split_fd_budget(ConcurrencyController.fd_budget())
+    assert session_pool.settings["max_connections"] == fd_budget["connections"]
+
+
+def test_idle_connections_count_against_the_limit():
+    farm = VirtualHostFarm(hosts=5, redirect_ratio=0, oversize_ratio=0, drop_ratio=0)
+    session_pool = SessionPool({"max_connections": 3, "dns_cache": farm.get_resolve_list()})
+
+    async def fetch_every_host():
+        await farm.start()
+        session = await session_pool.get()
+        for domain in farm.get_domains():
+            async with session.get(f"{domain}/index.html") as response:
+                await response.read()
+
+        idle = sum(len(connections) for connections in session.connector._conns.values())
+        await session_pool.close()
+        await farm.close()
+        return idle
+
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(fetch_every_host()) <= 3
+    loop.close()